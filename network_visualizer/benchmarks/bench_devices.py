@@ -0,0 +1,56 @@
+# Router longest-prefix lookups and switch forwarding
+from collections import namedtuple
+import numpy as np
+import pytest
+from core.devices import Router, Switch
+from core.mactable import int_to_mac
+from core.routing import int_to_ip
+
+BATCH = 4096 # Packets handled per benchmarked call
+ROUTE_TABLE_SIZES = (10, 1000, 100000)
+CAM_SIZES = (16, 1024, 8192)
+PORTS = 48
+
+Frame = namedtuple("Frame", ["src", "dst"])
+
+def _router(routes, rng):
+    # A default route, plus /16 to /28 prefixes at random addresses
+    table = {"0.0.0.0/0": "upstream"}
+    lengths = rng.integers(16, 29, routes)
+    addresses = rng.integers(0, 1 << 32, routes, dtype=np.uint64)
+    for i, (address, length) in enumerate(zip(addresses.tolist(), lengths.tolist())):
+        table[f"{int_to_ip(address)}/{length}"] = f"hop{i % 64}"
+    return Router("Router", "10.0.0.1", "00:00:00:00:00:01", table)
+
+@pytest.mark.parametrize("routes", ROUTE_TABLE_SIZES)
+@pytest.mark.parametrize("cached", (True, False), ids=("cached", "uncached"))
+def bench_route_packet(throughput, routes, cached):
+    rng = np.random.default_rng(0)
+    router = _router(routes, rng)
+    destinations = [int_to_ip(address) for address in rng.integers(0, 1 << 32, BATCH, dtype=np.uint64).tolist()]
+    route = router.route_packet
+    cache = router.routing_table._cache
+    def route_batch():
+        if not cached:
+            cache.clear() # Every lookup walks the prefix tables
+        return [route(dst) for dst in destinations]
+    throughput(route_batch, packets=BATCH)
+
+@pytest.mark.parametrize("stations", CAM_SIZES)
+def bench_forward_frame(throughput, stations):
+    # Every station has been learned; a tenth of the frames go to unknown
+    # destinations and are flooded
+    rng = np.random.default_rng(0)
+    switch = Switch("Switch", "10.0.0.2", "00:00:00:00:00:02", ports=[f"port{i}" for i in range(PORTS)], cam_size=max(stations, 1024))
+    macs = [int_to_mac(0x020000000000 + i) for i in range(stations)]
+    for i, mac in enumerate(macs):
+        switch.learn_mac(mac, f"port{i % PORTS}")
+    unknown = [int_to_mac(0x060000000000 + i) for i in range(BATCH)]
+    src = rng.integers(0, stations, BATCH).tolist()
+    dst = rng.integers(0, stations, BATCH).tolist()
+    frames = [(Frame(macs[s], unknown[i] if i % 10 == 0 else macs[d]), f"port{s % PORTS}")
+              for i, (s, d) in enumerate(zip(src, dst))]
+    forward = switch.forward_frame
+    def forward_batch():
+        return [forward(frame, in_port) for frame, in_port in frames]
+    throughput(forward_batch, packets=BATCH)
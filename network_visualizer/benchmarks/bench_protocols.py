@@ -0,0 +1,49 @@
+# Encapsulation, decapsulation and Scapy packet construction
+import pytest
+from core.protocols import decapsulate_packet, encapsulate_packet
+from core.simulation import build_packet
+
+BATCH = 100 # Packets handled per benchmarked call
+PAYLOAD_SIZES = (0, 64, 512, 1400)
+PROTOCOLS = ("TCP", "UDP", "ICMP")
+
+def _message(size):
+    return "x" * size
+
+@pytest.mark.parametrize("protocol", PROTOCOLS)
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def bench_encapsulate(throughput, size, protocol):
+    message = _message(size)
+    def encapsulate():
+        return [encapsulate_packet(message, protocol) for _ in range(BATCH)]
+    throughput(encapsulate, packets=BATCH)
+
+@pytest.mark.parametrize("size", (0, 512, 1400))
+def bench_encapsulate_scapy(throughput, size):
+    message = _message(size)
+    def encapsulate():
+        return [encapsulate_packet(message, "TCP", backend="scapy") for _ in range(BATCH)]
+    throughput(encapsulate, packets=BATCH)
+
+@pytest.mark.parametrize("protocol", PROTOCOLS)
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def bench_decapsulate(throughput, size, protocol):
+    frames = [bytes(encapsulate_packet(_message(size), protocol)[0]) for _ in range(BATCH)]
+    def decapsulate():
+        return [decapsulate_packet(frame) for frame in frames]
+    throughput(decapsulate, packets=BATCH)
+
+@pytest.mark.parametrize("size", (0, 512, 1400))
+def bench_decapsulate_scapy(throughput, size):
+    packets = [encapsulate_packet(_message(size), "TCP", backend="scapy")[0] for _ in range(BATCH)]
+    def decapsulate():
+        return [decapsulate_packet(packet) for packet in packets]
+    throughput(decapsulate, packets=BATCH)
+
+@pytest.mark.parametrize("protocol", PROTOCOLS)
+@pytest.mark.parametrize("size", PAYLOAD_SIZES)
+def bench_build_packet(throughput, size, protocol):
+    message = _message(size)
+    def build():
+        return [build_packet(message, protocol) for _ in range(BATCH)]
+    throughput(build, packets=BATCH)
@@ -0,0 +1,23 @@
+# Static topology frame time of NetworkVisualizer under an offscreen Qt platform
+import pytest
+from core.devices import Client, Switch
+
+TOPOLOGY_SIZES = (4, 50, 500)
+
+@pytest.fixture
+def visualizer(qapp, request):
+    from gui.visualization import NetworkVisualizer
+    size = request.param
+    devices = [Client(f"Host{i}", f"10.0.{i // 256}.{i % 256}", f"02:00:00:00:{i // 256:02x}:{i % 256:02x}") for i in range(size - 1)]
+    core = Switch("Core", "10.1.0.1", "02:00:00:01:00:00")
+    devices.append(core)
+    # A star around a core switch with a ring through the hosts
+    connections = [(host, core) for host in devices[:-1]]
+    connections += [(a, b) for a, b in zip(devices[:-2], devices[1:-1])]
+    viz = NetworkVisualizer(devices, connections, layout_seed=0, layout_cache_dir=None)
+    yield viz
+    viz.deleteLater()
+
+@pytest.mark.parametrize("visualizer", TOPOLOGY_SIZES, indirect=True)
+def bench_draw_network(throughput, visualizer):
+    throughput(visualizer.draw_network, packets=1, unit="frames", memory=False)
@@ -0,0 +1,35 @@
+# Logical step simulations and headless scenario runs
+import pytest
+from core.devices import Client, Server
+from core.scheduler import EventScheduler
+from core.simulation import run_scenario, simulate_tcp_handshake
+from core.topology import build_topology
+
+FLOW_PACKETS = 200 # Packets per flow in the scenario benchmark
+TOPOLOGY_SIZES = (4, 32, 256)
+
+def bench_tcp_handshake(throughput):
+    client = Client("Client", "192.168.1.100", "00:11:22:33:44:01")
+    server = Server("Server", "192.168.1.10", "00:11:22:33:44:04")
+    def handshake():
+        return simulate_tcp_handshake(client, server, EventScheduler(record=False))
+    throughput(handshake, packets=3)
+
+def _chain(size):
+    # Client, size - 2 switches in a line, Server
+    names = ["Client"] + [f"Switch{i}" for i in range(size - 2)] + ["Server"]
+    devices = [{"name": name, "type": "switch" if name.startswith("Switch") else name.lower(),
+                "ip": f"10.0.{i // 256}.{i % 256}", "mac": f"02:00:00:00:{i // 256:02x}:{i % 256:02x}"}
+               for i, name in enumerate(names)]
+    links = [{"a": a, "b": b, "latency": 0.0001, "bandwidth": 1e9} for a, b in zip(names, names[1:])]
+    return build_topology(devices, links)
+
+@pytest.mark.parametrize("size", TOPOLOGY_SIZES)
+def bench_run_scenario(throughput, size):
+    # Packets per second through the scheduler and the links, counted per
+    # packet delivered end to end
+    topology = _chain(size)
+    flows = [{"src": "Client", "dst": "Server", "protocol": "UDP", "count": FLOW_PACKETS, "interval": 0.001, "message": "x" * 512}]
+    def run():
+        return run_scenario(topology, flows, seed=0)
+    throughput(run, packets=FLOW_PACKETS, memory=False)
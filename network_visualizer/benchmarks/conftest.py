@@ -0,0 +1,160 @@
+# Shared fixtures for the packet pipeline and renderer benchmarks
+import json
+import os
+import struct
+import sys
+import time
+import tracemalloc
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Import core/ and gui/ like main.py does
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+BASELINE_TOLERANCE = 0.3 # Allowed relative change before a benchmark is flagged
+MEMORY_SLACK = 64 # Bytes per packet ignored by the memory check (allocator noise)
+MEMORY_ROUNDS = 20 # Calls kept alive while measuring memory per packet
+REFERENCE_OPS = 200000 # Iterations of the reference workload
+REFERENCE_ROUNDS = 7 # Its fastest round is taken as this host's speed
+REFERENCE_KEY = "_reference" # Baseline entry holding the host speed it was recorded at
+
+def pytest_addoption(parser):
+    group = parser.getgroup("baseline")
+    group.addoption("--baseline-save", action="store_true", help="Write measured throughput and memory to baseline.json")
+    group.addoption("--baseline-tolerance", type=float, default=BASELINE_TOLERANCE,
+                    help="Relative slowdown or memory growth that counts as a regression")
+    group.addoption("--baseline-check", action="store_true",
+                    help="Fail on regressions against baseline.json (by default they are only reported)")
+
+def pytest_configure(config):
+    config._baseline_results = {}
+    config._baseline_regressions = {}
+    config._reference_speed = None
+
+def reference_speed(config):
+    # Operations per second of a fixed pure-Python workload (dict stores,
+    # struct packing, integer arithmetic), measured once per session.
+    # Throughput is compared to the baseline relative to this speed, so a
+    # faster or slower host, or a busy one, does not read as a change.
+    if config._reference_speed is None:
+        best = min(_time_reference() for _ in range(REFERENCE_ROUNDS))
+        config._reference_speed = REFERENCE_OPS / best
+    return config._reference_speed
+
+def _time_reference():
+    pack = struct.Struct("!HH").pack
+    table = {}
+    total = 0
+    start = time.perf_counter()
+    for i in range(REFERENCE_OPS):
+        table[i & 1023] = pack(i & 0xFFFF, total & 0xFFFF)
+        total += len(table[i & 1023]) ^ i
+    return time.perf_counter() - start
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if config.getoption("--baseline-save") and config._baseline_results:
+        baseline = _load_baseline()
+        baseline.update({name: {key: round(value, 1) for key, value in measured.items()}
+                         for name, measured in config._baseline_results.items()})
+        baseline[REFERENCE_KEY] = {"ops_per_second": round(reference_speed(config), 1)}
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+            f.write("\n")
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config._baseline_results
+    if not results:
+        return
+    terminalreporter.section("throughput and memory per packet")
+    width = max(len(name) for name in results)
+    for name, measured in sorted(results.items()):
+        rate = next((f"{value:>14,.0f} {key.replace('_', '/').replace('/per/', '/')}" for key, value in measured.items()
+                     if key.endswith("_per_second")), "")
+        memory = f"{measured['bytes_per_packet']:>10,.0f} B/packet" if "bytes_per_packet" in measured else ""
+        terminalreporter.write_line(f"{name:<{width}} {rate:<28} {memory}")
+    regressions = config._baseline_regressions
+    if regressions:
+        terminalreporter.section("baseline regressions (reported only; --baseline-check fails on them)")
+        for name, found in sorted(regressions.items()):
+            terminalreporter.write_line(f"{name}: {'; '.join(found)}")
+
+def _load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)
+
+@pytest.fixture(scope="session")
+def baseline():
+    return _load_baseline()
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication(sys.argv)
+
+class Throughput:
+    # Runs a benchmark whose every call handles `packets` packets, then
+    # records packets per second and the memory each packet keeps alive
+    # (tracemalloc peak over MEMORY_ROUNDS calls whose results are held)
+    # in the benchmark's extra_info, and compares both against baseline.json:
+    # throughput scaled by the host's reference speed, memory as measured.
+    def __init__(self, request, benchmark, baseline):
+        self.request = request
+        self.benchmark = benchmark
+        self.baseline = baseline
+
+    def __call__(self, func, *args, packets=1, unit="packets", memory=True):
+        result = self.benchmark(func, *args)
+        info = self.benchmark.extra_info
+        stats = self.benchmark.stats
+        measured = {}
+        if stats is not None: # None under --benchmark-disable
+            measured[f"{unit}_per_second"] = packets / stats.stats.median
+        if memory:
+            measured["bytes_per_packet"] = self._memory(func, args) / packets
+        info.update(measured)
+        self.request.config._baseline_results[self.request.node.name] = measured
+        self._compare(measured)
+        return result
+
+    def _memory(self, func, args):
+        func(*args) # Warm caches and lazy imports outside the measurement
+        tracemalloc.start()
+        try:
+            kept = [func(*args) for _ in range(MEMORY_ROUNDS)]
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del kept
+        return peak / MEMORY_ROUNDS
+
+    def _compare(self, measured):
+        if self.request.config.getoption("--baseline-save"):
+            return
+        config = self.request.config
+        expected = self.baseline.get(self.request.node.name)
+        if not expected:
+            return
+        tolerance = config.getoption("--baseline-tolerance")
+        recorded_speed = self.baseline.get(REFERENCE_KEY, {}).get("ops_per_second")
+        scale = reference_speed(config) / recorded_speed if recorded_speed else 1.0
+        regressions = []
+        for key, value in measured.items():
+            if key not in expected:
+                continue
+            if key == "bytes_per_packet":
+                if value > expected[key] * (1 + tolerance) + MEMORY_SLACK:
+                    regressions.append(f"{key} {value:.0f} > baseline {expected[key]:.0f}")
+            elif value < expected[key] * scale * (1 - tolerance):
+                regressions.append(f"{key} {value:.0f} < baseline {expected[key] * scale:.0f} (scaled by host speed {scale:.2f})")
+        if not regressions:
+            return
+        if config.getoption("--baseline-check"):
+            pytest.fail("Regression against baseline.json: " + "; ".join(regressions), pytrace=False)
+        config._baseline_regressions[self.request.node.name] = regressions
+
+@pytest.fixture
+def throughput(request, benchmark, baseline):
+    return Throughput(request, benchmark, baseline)
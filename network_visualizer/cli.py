@@ -0,0 +1,134 @@
+# Headless batch runner: simulates a traffic scenario on a topology without any GUI imports
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from core.link import build_links
+from core.metrics import REGISTRY, MetricsRegistry
+from core.scheduler import EventScheduler
+from core.simulation import replay_capture, run_scenario
+from core.tcp import TransferSet
+from core.topology import load_topology
+from core.trace import TraceRecorder
+
+def load_scenario(path):
+    with open(path) as f:
+        scenario = json.load(f)
+    if "flows" not in scenario and "transfers" not in scenario:
+        raise ValueError(f"Scenario {path} has no 'flows' or 'transfers' list")
+    return scenario
+
+def trace_path(path, seed, seeds):
+    # One trace per seed: "run.nvtrace" becomes "run-seed3.nvtrace" when several seeds run
+    if seeds == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-seed{seed}{ext}"
+
+def run_seed(topology_path, scenario_path, seed, capture_path=None, realtime=False, speed=1.0, link_stats=False, metrics=False, timing=False, trace=None):
+    # Returns the result rows and, with metrics, a frozen copy of this seed's
+    # metrics (the registry is reset per seed, so pool workers that run
+    # several seeds report each one once). `trace` is a file to record the
+    # run's events to.
+    if metrics:
+        REGISTRY.reset()
+        REGISTRY.enable(timing)
+    with REGISTRY.span("run"):
+        results, scheduler, links = _run(topology_path, scenario_path, seed, capture_path, realtime, speed, trace)
+    REGISTRY.callback("scheduler_events_total", lambda: scheduler.processed, "Events processed by the scheduler")
+    if link_stats:
+        results += [row for link in links for row in link.statistics(scheduler.now)]
+    for row in results:
+        row["seed"] = seed
+    return results, REGISTRY.freeze() if metrics else None
+
+def _run(topology_path, scenario_path, seed, capture_path, realtime, speed, trace):
+    topology = load_topology(topology_path)
+    scheduler = EventScheduler(record=False)
+    links = build_links(topology, seed)
+    recorder = TraceRecorder(trace, topology, links, seed=seed) if trace else None
+    try:
+        if capture_path:
+            results = replay_capture(topology, capture_path, realtime=realtime, speed=speed, seed=seed, scheduler=scheduler, links=links)["flows"]
+        else:
+            # Packet flows and TCP transfers share the clock and the links
+            scenario = load_scenario(scenario_path)
+            transfers = TransferSet(topology, scheduler, links, first_flow=len(scenario.get("flows", []))) # Flow ids follow the scenario's
+            for transfer in scenario.get("transfers", []):
+                transfers.add(transfer)
+            results = run_scenario(topology, scenario.get("flows", []), seed=seed, duration=scenario.get("duration"),
+                                   scheduler=scheduler, links=links, trace=recorder)
+            results += transfers.statistics()
+    finally:
+        if recorder is not None:
+            recorder.close()
+    return results, scheduler, links
+
+def write_results(rows, output, fmt):
+    if fmt == "csv":
+        # Flow and transfer rows have different columns; take their union in first-seen order
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row)) or ["seed"]
+        writer = csv.DictWriter(output, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, output, indent=2)
+        output.write("\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a network simulation scenario headlessly and write per-flow statistics.")
+    parser.add_argument("topology", help="Topology file (JSON, JSON Lines, YAML or GraphML)")
+    parser.add_argument("scenario", nargs="?", help="Traffic scenario file (JSON with a 'flows' list)")
+    parser.add_argument("--capture", help="Replay a pcap/pcapng capture instead of a scenario")
+    parser.add_argument("--realtime", action="store_true", help="Pace capture replay to its timestamps (default: as fast as possible)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor with --realtime (default: 1.0)")
+    parser.add_argument("--links", action="store_true", help="Append per-link queue and utilization rows")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--format", choices=["json", "csv"], help="Output format (default: from the output extension, else json)")
+    parser.add_argument("--seed", type=int, default=0, help="First random seed (default: 0)")
+    parser.add_argument("--seeds", type=int, default=1, help="Number of consecutive seeds to run (default: 1)")
+    parser.add_argument("--metrics", help="Write counters and latency histograms to this file")
+    parser.add_argument("--metrics-format", choices=["prometheus", "json"], help="Metrics format (default: json for .json files, else Prometheus text)")
+    parser.add_argument("--timing", action="store_true", help="Also record timing spans for sending and forwarding packets and the whole run (needs --metrics)")
+    parser.add_argument("--trace", help="Record hops, queueing, drops, collisions and header snapshots to this trace file (one per seed)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes for multiple seeds (default: CPU count)")
+    args = parser.parse_args(argv)
+    if not args.scenario and not args.capture:
+        parser.error("a scenario file or --capture is required")
+
+    if args.timing and not args.metrics:
+        parser.error("--timing needs --metrics")
+
+    seeds = range(args.seed, args.seed + args.seeds)
+    metrics = bool(args.metrics)
+    traces = [trace_path(args.trace, seed, args.seeds) if args.trace else None for seed in seeds]
+    if args.seeds == 1 or args.jobs == 1:
+        results = [run_seed(args.topology, args.scenario, seed, args.capture, args.realtime, args.speed, args.links, metrics, args.timing, traces[i])
+                   for i, seed in enumerate(seeds)]
+    else:
+        count = len(seeds)
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(run_seed, [args.topology] * count, [args.scenario] * count, seeds,
+                                    [args.capture] * count, [args.realtime] * count, [args.speed] * count, [args.links] * count,
+                                    [metrics] * count, [args.timing] * count, traces))
+    rows = [row for seed_rows, _ in results for row in seed_rows]
+    if metrics:
+        # Counters and histograms are summed over seeds
+        total = MetricsRegistry(enabled=True)
+        for _, seed_metrics in results:
+            total.merge(seed_metrics)
+        total.write(args.metrics, args.metrics_format)
+
+    fmt = args.format or ("csv" if args.output and args.output.endswith(".csv") else "json")
+    if args.output:
+        with open(args.output, "w", newline="") as output:
+            write_results(rows, output, fmt)
+    else:
+        write_results(rows, sys.stdout, fmt)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
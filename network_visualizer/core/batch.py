@@ -0,0 +1,142 @@
+# Vectorized batch encapsulation for bulk message workloads
+import numpy as np
+
+from core.codec import (DEFAULT_PORTS, ETHER_LEN, ETHERTYPE_IPV4, IP_PROTO, IPV4_LEN, L4_LEN,
+                        mac_to_bytes, tcp_flags_to_int)
+from core.protocols import ENCRYPTED_PREFIX
+from core.routing import ip_to_int
+
+_COMMON_FIELDS = [
+    ("eth_dst", "u1", 6), ("eth_src", "u1", 6), ("ethertype", ">u2"),
+    ("ver_ihl", "u1"), ("tos", "u1"), ("total_len", ">u2"), ("ident", ">u2"), ("frag", ">u2"),
+    ("ttl", "u1"), ("proto", "u1"), ("ip_csum", ">u2"), ("ip_src", ">u4"), ("ip_dst", ">u4"),
+]
+
+# One packed structured dtype per protocol; a record is the exact on-wire header
+HEADER_DTYPES = {
+    "TCP": np.dtype(_COMMON_FIELDS + [
+        ("sport", ">u2"), ("dport", ">u2"), ("seq", ">u4"), ("ack", ">u4"),
+        ("data_offset", "u1"), ("flags", "u1"), ("window", ">u2"), ("l4_csum", ">u2"), ("urgent", ">u2"),
+    ]),
+    "UDP": np.dtype(_COMMON_FIELDS + [("sport", ">u2"), ("dport", ">u2"), ("udp_len", ">u2"), ("l4_csum", ">u2")]),
+    "ICMP": np.dtype(_COMMON_FIELDS + [("icmp_type", "u1"), ("code", "u1"), ("l4_csum", ">u2"), ("icmp_id", ">u2"), ("icmp_seq", ">u2")]),
+}
+
+def _ip_array(values):
+    if isinstance(values, (str, int)):
+        return ip_to_int(values) if isinstance(values, str) else values
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iu":
+        return values.astype(np.uint32, copy=False)
+    return np.fromiter((ip_to_int(v) if isinstance(v, str) else v for v in values), np.uint32)
+
+def _mac_array(values):
+    if isinstance(values, str):
+        return np.frombuffer(mac_to_bytes(values), np.uint8)
+    if isinstance(values, np.ndarray):
+        return values
+    return np.frombuffer(b"".join(mac_to_bytes(v) for v in values), np.uint8).reshape(-1, 6)
+
+def _fold(total):
+    # Ones' complement fold of 16-bit word sums, then complement
+    total = total.astype(np.uint64)
+    for _ in range(3):
+        total = (total & 0xFFFF) + (total >> 16)
+    return (~total & 0xFFFF).astype(np.uint16)
+
+def _word_sum(raw, start, stop):
+    # Sum the big-endian 16-bit words of raw[:, start:stop] per row
+    return np.ascontiguousarray(raw[:, start:stop]).view(">u2").sum(axis=1, dtype=np.uint64)
+
+def _payload_sums(blob, lengths, starts):
+    # 16-bit word sums of every variable-length payload in one pass: even
+    # bytes (relative to each payload's start) are the high byte of a word
+    if not blob.size:
+        return np.zeros(len(lengths), np.uint64)
+    segment = np.repeat(np.arange(len(lengths)), lengths)
+    relative = np.arange(blob.size) - np.repeat(starts, lengths)
+    weighted = blob * np.where(relative & 1, 1, 256)
+    return np.bincount(segment, weights=weighted, minlength=len(lengths)).astype(np.uint64)
+
+def encapsulate_batch(messages, protocol="UDP", src_macs="00:00:00:00:00:00", dst_macs="FF:FF:FF:FF:FF:FF",
+                      src_ips="192.168.1.100", dst_ips="192.168.1.1", sports=None, dports=None, flags="S"):
+    # Encapsulates a whole batch at once. Address and port arguments take a
+    # scalar for the whole batch or one value per message. Returns a
+    # contiguous uint8 buffer of back-to-back frames and an offsets array of
+    # len(messages) + 1 entries; frame i is buffer[offsets[i]:offsets[i + 1]].
+    if protocol not in HEADER_DTYPES:
+        raise ValueError("Unsupported protocol")
+    count = len(messages)
+    dtype = HEADER_DTYPES[protocol]
+    header_len = dtype.itemsize
+    l4_len = L4_LEN[protocol]
+
+    if protocol == "ICMP":
+        payloads = [] # ICMP frames carry no application payload in this model
+        lengths = np.zeros(count, np.int64)
+    else:
+        prefix = ENCRYPTED_PREFIX.encode() if protocol == "TCP" else b""
+        payloads = [prefix + (m.encode() if isinstance(m, str) else bytes(m)) for m in messages]
+        lengths = np.fromiter(map(len, payloads), np.int64, count)
+    blob = np.frombuffer(b"".join(payloads), np.uint8)
+    payload_starts = np.zeros(count, np.int64)
+    np.cumsum(lengths[:-1], out=payload_starts[1:])
+
+    headers = np.zeros(count, dtype)
+    headers["eth_dst"] = _mac_array(dst_macs)
+    headers["eth_src"] = _mac_array(src_macs)
+    headers["ethertype"] = ETHERTYPE_IPV4
+    headers["ver_ihl"] = 0x45
+    headers["total_len"] = IPV4_LEN + l4_len + lengths
+    headers["ident"] = np.arange(1, count + 1) & 0xFFFF
+    headers["ttl"] = 64
+    headers["proto"] = IP_PROTO[protocol]
+    headers["ip_src"] = _ip_array(src_ips)
+    headers["ip_dst"] = _ip_array(dst_ips)
+    if protocol == "ICMP":
+        headers["icmp_type"] = 8
+    else:
+        default_sport, default_dport = DEFAULT_PORTS[protocol]
+        headers["sport"] = default_sport if sports is None else sports
+        headers["dport"] = default_dport if dports is None else dports
+        if protocol == "TCP":
+            headers["data_offset"] = (l4_len // 4) << 4
+            headers["flags"] = tcp_flags_to_int(flags)
+            headers["window"] = 8192
+        else:
+            headers["udp_len"] = l4_len + lengths
+
+    raw = headers.view(np.uint8).reshape(count, header_len)
+    l4_start = ETHER_LEN + IPV4_LEN
+    headers["ip_csum"] = _fold(_word_sum(raw, ETHER_LEN, l4_start))
+    l4_sum = _word_sum(raw, l4_start, header_len)
+    if protocol != "ICMP":
+        # Pseudo header: source and destination address words, protocol, L4 length
+        src = headers["ip_src"].astype(np.uint64)
+        dst = headers["ip_dst"].astype(np.uint64)
+        l4_sum += (src >> 16) + (src & 0xFFFF) + (dst >> 16) + (dst & 0xFFFF)
+        l4_sum += IP_PROTO[protocol] + l4_len + lengths.astype(np.uint64)
+        l4_sum += _payload_sums(blob, lengths, payload_starts)
+    l4_csum = _fold(l4_sum)
+    if protocol == "UDP":
+        l4_csum[l4_csum == 0] = 0xFFFF
+    headers["l4_csum"] = l4_csum
+
+    frame_lengths = header_len + lengths
+    offsets = np.zeros(count + 1, np.int64)
+    np.cumsum(frame_lengths, out=offsets[1:])
+    buffer = np.empty(offsets[-1], np.uint8)
+    # Interleave header and payload bytes with a single mask: each frame is
+    # header_len header bytes followed by its payload bytes
+    runs = np.empty(2 * count, np.int64)
+    runs[0::2] = header_len
+    runs[1::2] = lengths
+    is_header = np.repeat(np.tile(np.array([True, False]), count), runs)
+    buffer[is_header] = raw.ravel()
+    buffer[~is_header] = blob
+    return buffer, offsets
+
+def iter_frames(buffer, offsets):
+    # Zero-copy memoryviews over the frames of a batch, ready for decapsulate_packet
+    view = memoryview(buffer)
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        yield view[start:end]
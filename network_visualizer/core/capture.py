@@ -0,0 +1,119 @@
+# Memory-mapped pcap / pcapng reader
+import mmap
+import struct
+
+LINKTYPE_ETHERNET = 1
+
+_PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6), b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9), b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_IDB = 1
+_PCAPNG_SPB = 3
+_PCAPNG_EPB = 6
+_PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+_OPT_IF_TSRESOL = 9
+
+class CaptureReader:
+    # Iterates (timestamp, frame, linktype) over a capture file without
+    # reading it into memory: the file is mmapped and every frame is a
+    # memoryview slice of the mapping, so frames are only valid until the
+    # reader is closed. Use as a context manager.
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty file
+            self._file.close()
+            raise ValueError(f"{path} is not a pcap or pcapng capture") from None
+        self._view = memoryview(self._map)
+        magic = bytes(self._view[:4])
+        if magic in _PCAP_MAGIC:
+            self.format = "pcap"
+        elif len(self._view) >= 4 and struct.unpack("<I", magic)[0] == _PCAPNG_SHB:
+            self.format = "pcapng"
+        else:
+            self.close()
+            raise ValueError(f"{path} is not a pcap or pcapng capture")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            self._file.close()
+            try:
+                self._map.close()
+            except BufferError:
+                pass # Frames are still referenced; the mapping goes away with the last of them
+
+    def __iter__(self):
+        return self._iter_pcap() if self.format == "pcap" else self._iter_pcapng()
+
+    def _iter_pcap(self):
+        view = self._view
+        endian, resolution = _PCAP_MAGIC[bytes(view[:4])]
+        linktype = struct.unpack_from(endian + "I", view, 20)[0]
+        record = struct.Struct(endian + "IIII")
+        position, end = 24, len(view)
+        while position + 16 <= end:
+            seconds, fraction, captured, _ = record.unpack_from(view, position)
+            position += 16
+            if position + captured > end:
+                break # Truncated final record
+            yield seconds + fraction * resolution, view[position:position + captured], linktype
+            position += captured
+
+    def _iter_pcapng(self):
+        view = self._view
+        end = len(view)
+        position = 0
+        endian = "<"
+        interfaces = [] # (linktype, seconds per timestamp unit) per interface id
+        while position + 12 <= end:
+            block_type = struct.unpack_from(endian + "I", view, position)[0]
+            if block_type == _PCAPNG_SHB:
+                byte_order = struct.unpack_from("<I", view, position + 8)[0]
+                endian = "<" if byte_order == _PCAPNG_BYTE_ORDER else ">"
+                interfaces = [] # Interface ids are scoped to a section
+            block_len = struct.unpack_from(endian + "I", view, position + 4)[0]
+            if block_len < 12 or position + block_len > end:
+                break # Truncated or corrupt block
+            body = position + 8
+            if block_type == _PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + "H", view, body)[0]
+                interfaces.append((linktype, self._ts_resolution(view, endian, body + 8, position + block_len - 4)))
+            elif block_type == _PCAPNG_EPB:
+                interface, high, low, captured, _ = struct.unpack_from(endian + "IIIII", view, body)
+                linktype, resolution = interfaces[interface]
+                start = body + 20
+                yield ((high << 32) | low) * resolution, view[start:start + captured], linktype
+            elif block_type == _PCAPNG_SPB and interfaces:
+                original = struct.unpack_from(endian + "I", view, body)[0]
+                linktype, _ = interfaces[0]
+                captured = min(original, block_len - 16)
+                yield None, view[body + 4:body + 4 + captured], linktype # Simple packets carry no timestamp
+            position += block_len
+
+    @staticmethod
+    def _ts_resolution(view, endian, position, end):
+        # if_tsresol: high bit set means a power of two, otherwise a power of ten
+        while position + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", view, position)
+            if code == 0:
+                break
+            if code == _OPT_IF_TSRESOL and length >= 1:
+                value = view[position + 4]
+                return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+            position += 4 + ((length + 3) & ~3)
+        return 1e-6
+
+def open_capture(path):
+    return CaptureReader(path)
@@ -0,0 +1,155 @@
+# Per-link loss models and CSMA/CD medium access
+import json
+import numpy as np
+
+RANDOM_BLOCK = 4096 # Uniform draws generated per refill
+SLOT_TIME = 51.2e-6 # 512 bit times at 10 Mb/s
+JAM_TIME = 3.2e-6 # 32 bit times at 10 Mb/s
+DEFAULT_BANDWIDTH = 10e6
+MAX_ATTEMPTS = 16
+BACKOFF_LIMIT = 10
+
+class RandomStream:
+    # Uniform [0, 1) draws from a seeded numpy Generator, produced a block at a
+    # time and handed out from a plain list so the per-frame cost is an index
+    def __init__(self, seed=None, block=RANDOM_BLOCK):
+        self.generator = np.random.default_rng(seed)
+        self.block = block
+        self._values = []
+        self._next = 0
+
+    def random(self):
+        if self._next >= len(self._values):
+            self._values = self.generator.random(self.block).tolist()
+            self._next = 0
+        value = self._values[self._next]
+        self._next += 1
+        return value
+
+class BernoulliLoss:
+    # Independent loss with a fixed probability per frame
+    def __init__(self, rate):
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(f"Loss rate must be between 0 and 1, got {rate}")
+        self.rate = rate
+
+    def lost(self, stream):
+        return self.rate > 0.0 and stream.random() < self.rate
+
+class GilbertElliottLoss:
+    # Two-state burst loss: p is the good -> bad and r the bad -> good
+    # transition probability per frame, with a loss probability in each state
+    def __init__(self, p, r, loss_good=0.0, loss_bad=1.0):
+        for name, value in (("p", p), ("r", r), ("loss_good", loss_good), ("loss_bad", loss_bad)):
+            if not 0.0 <= value <= 1.0:
+                raise ValueError(f"Gilbert-Elliott {name} must be between 0 and 1, got {value}")
+        self.p = p
+        self.r = r
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    def lost(self, stream):
+        if stream.random() < (self.r if self.bad else self.p):
+            self.bad = not self.bad
+        rate = self.loss_bad if self.bad else self.loss_good
+        return rate > 0.0 and stream.random() < rate
+
+LOSS_MODELS = {"bernoulli": BernoulliLoss, "gilbert-elliott": GilbertElliottLoss, "gilbert_elliott": GilbertElliottLoss}
+
+def make_loss_model(spec):
+    # A link's "loss" attribute: a rate for Bernoulli loss, or a dict (or a
+    # JSON string of one, from flat formats) with "model" and its parameters
+    if spec is None:
+        return None
+    if isinstance(spec, str):
+        spec = json.loads(spec)
+    if isinstance(spec, (int, float)):
+        return BernoulliLoss(float(spec)) if spec else None
+    options = dict(spec)
+    model = str(options.pop("model", "bernoulli")).lower()
+    if model not in LOSS_MODELS:
+        raise ValueError(f"Unknown loss model {model!r}")
+    return LOSS_MODELS[model](**options)
+
+class CsmaCd:
+    # Half-duplex shared medium with 1-persistent carrier sense. A station that
+    # finds the medium busy defers until it goes idle; one that starts within
+    # the propagation window of another transmission (or, with probability
+    # `contention`, of a station not modelled by the simulation) collides,
+    # jams, and backs off a random number of slots drawn from
+    # [0, 2**min(n, backoff_limit)) after its n-th collision, giving up after
+    # max_attempts. The frame already on the wire is not cut short.
+    def __init__(self, bandwidth=DEFAULT_BANDWIDTH, slot_time=SLOT_TIME, jam_time=JAM_TIME, propagation=None,
+                 contention=0.0, max_attempts=MAX_ATTEMPTS, backoff_limit=BACKOFF_LIMIT):
+        if bandwidth <= 0:
+            raise ValueError("Link bandwidth must be positive")
+        self.bandwidth = bandwidth
+        self.slot_time = slot_time
+        self.jam_time = jam_time
+        self.propagation = slot_time / 2 if propagation is None else propagation
+        self.contention = contention
+        self.max_attempts = max_attempts
+        self.backoff_limit = backoff_limit
+        self.last_start = float("-inf")
+        self.busy_until = float("-inf")
+        self.deferrals = 0
+        self.collisions = 0
+        self.excessive = 0
+
+    def reset(self):
+        # Forget the last transmission so the medium is idle for a new clock
+        # starting at 0; the counters are kept
+        self.last_start = float("-inf")
+        self.busy_until = float("-inf")
+
+    def access(self, now, length, stream):
+        # Returns (end of transmission or None when dropped, collisions)
+        t = now
+        collisions = 0
+        while True:
+            # Frames are placed as they are sent, so a deferred one may already
+            # own a start time slightly ahead of t
+            if t < self.busy_until and abs(t - self.last_start) >= self.propagation:
+                t = self.busy_until # Carrier sensed: defer until idle
+                self.deferrals += 1
+            if abs(t - self.last_start) < self.propagation or (self.contention and stream.random() < self.contention):
+                collisions += 1
+                self.collisions += 1
+                self.busy_until = max(self.busy_until, t + self.jam_time)
+                if collisions >= self.max_attempts:
+                    self.excessive += 1
+                    return None, collisions
+                slots = int(stream.random() * (1 << min(collisions, self.backoff_limit)))
+                t += self.jam_time + slots * self.slot_time
+                continue
+            end = t + length * 8 / self.bandwidth
+            self.last_start = t
+            self.busy_until = end
+            return end, collisions
+
+class LinkChannel:
+    # Medium access, loss model and random stream of one link
+    def __init__(self, loss=None, seed=None, **mac_options):
+        self.loss = loss
+        self.mac = CsmaCd(**mac_options)
+        self.stream = RandomStream(seed)
+        self.frames = 0
+        self.lost = 0
+
+    def transmit(self, now, length):
+        # Returns (end, collisions, lost): end is when the frame is fully on
+        # the wire, or None when it was dropped after too many collisions; a
+        # frame that made it onto the wire may still be lost to the loss model
+        self.frames += 1
+        end, collisions = self.mac.access(now, length, self.stream)
+        lost = end is None or (self.loss is not None and self.loss.lost(self.stream))
+        if lost:
+            self.lost += 1
+        return end, collisions, lost
+
+MAC_ATTRIBUTES = ("bandwidth", "slot_time", "jam_time", "propagation", "contention", "max_attempts") # Link attributes passed to CsmaCd
+
+def link_channel(attrs, seed=None):
+    options = {key: attrs[key] for key in MAC_ATTRIBUTES if key in attrs}
+    return LinkChannel(make_loss_model(attrs.get("loss")), seed, **options)
@@ -0,0 +1,184 @@
+# struct based Ethernet/IPv4/TCP/UDP/ICMP header codec
+import socket
+import struct
+
+ETHER_LEN = 14
+IPV4_LEN = 20
+TCP_LEN = 20
+UDP_LEN = 8
+ICMP_LEN = 8
+
+ETHERTYPE_IPV4 = 0x0800
+IP_PROTO = {"ICMP": 1, "TCP": 6, "UDP": 17}
+IP_PROTO_NAMES = {number: name.lower() for name, number in IP_PROTO.items()}
+L4_LEN = {"TCP": TCP_LEN, "UDP": UDP_LEN, "ICMP": ICMP_LEN}
+DEFAULT_PORTS = {"TCP": (12345, 80), "UDP": (12345, 53)}
+ICMP_TYPES = {0: "echo-reply", 3: "dest-unreach", 8: "echo-request", 11: "time-exceeded"}
+TCP_FLAGS = "FSRPAUEC"
+TCP_FIN, TCP_SYN, TCP_ACK = 0x01, 0x02, 0x10
+ICMP_ECHO_REPLY, ICMP_ECHO_REQUEST = 0, 8
+
+_ETHER = struct.Struct("!6s6sH")
+_IPV4 = struct.Struct("!BBHHHBBH4s4s")
+_TCP = struct.Struct("!HHIIBBHHH")
+_UDP = struct.Struct("!HHHH")
+_ICMP = struct.Struct("!BBHHH")
+_PSEUDO = struct.Struct("!4s4sBBH")
+
+def mac_to_bytes(mac):
+    return bytes.fromhex(mac.replace(":", "").replace("-", ""))
+
+def bytes_to_mac(raw):
+    return raw.hex(":")
+
+def tcp_flags_to_int(flags):
+    if isinstance(flags, int):
+        return flags
+    value = 0
+    for flag in flags:
+        value |= 1 << TCP_FLAGS.index(flag)
+    return value
+
+def tcp_flags_to_str(value):
+    return "".join(flag for bit, flag in enumerate(TCP_FLAGS) if value & (1 << bit))
+
+def checksum(data, initial=0):
+    # RFC 1071 internet checksum over a bytes-like object
+    if len(data) % 2:
+        data = bytes(data) + b"\0"
+    total = initial + sum(struct.unpack(f"!{len(data) // 2}H", data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+def frame_length(protocol, payload_len):
+    if protocol == "ICMP":
+        payload_len = 0 # ICMP frames carry no application payload in this model
+    return ETHER_LEN + IPV4_LEN + L4_LEN[protocol] + payload_len
+
+def build_frame(payload, protocol="TCP", src_mac="00:00:00:00:00:00", dst_mac="FF:FF:FF:FF:FF:FF",
+                src_ip="192.168.1.100", dst_ip="192.168.1.1", sport=None, dport=None,
+                flags="S", seq=0, ack=0, icmp_type=8, icmp_id=0, icmp_seq=0, ttl=64, ident=1, buf=None, offset=0):
+    # Writes a complete frame into `buf` (a preallocated bytearray) at `offset`
+    # and returns a memoryview over it. A buffer of the exact size is allocated
+    # when none is given.
+    if protocol not in L4_LEN:
+        raise ValueError("Unsupported protocol")
+    if protocol == "ICMP":
+        payload = b""
+    length = frame_length(protocol, len(payload))
+    if buf is None:
+        buf = bytearray(length)
+        offset = 0
+    elif len(buf) - offset < length:
+        raise ValueError("Buffer too small for frame")
+    default_sport, default_dport = DEFAULT_PORTS.get(protocol, (0, 0))
+    sport = default_sport if sport is None else sport
+    dport = default_dport if dport is None else dport
+    src_addr = socket.inet_aton(src_ip)
+    dst_addr = socket.inet_aton(dst_ip)
+    ip_offset = offset + ETHER_LEN
+    l4_offset = ip_offset + IPV4_LEN
+    l4_len = length - ETHER_LEN - IPV4_LEN
+
+    _ETHER.pack_into(buf, offset, mac_to_bytes(dst_mac), mac_to_bytes(src_mac), ETHERTYPE_IPV4)
+    _IPV4.pack_into(buf, ip_offset, 0x45, 0, IPV4_LEN + l4_len, ident, 0, ttl, IP_PROTO[protocol], 0, src_addr, dst_addr)
+    struct.pack_into("!H", buf, ip_offset + 10, checksum(memoryview(buf)[ip_offset:l4_offset]))
+
+    payload_offset = l4_offset + L4_LEN[protocol]
+    buf[payload_offset:payload_offset + len(payload)] = payload
+    view = memoryview(buf)
+    if protocol == "TCP":
+        _TCP.pack_into(buf, l4_offset, sport, dport, seq & 0xFFFFFFFF, ack & 0xFFFFFFFF, (TCP_LEN // 4) << 4,
+                       tcp_flags_to_int(flags), 8192, 0, 0)
+        pseudo = sum(struct.unpack("!6H", _PSEUDO.pack(src_addr, dst_addr, 0, 6, l4_len)))
+        struct.pack_into("!H", buf, l4_offset + 16, checksum(view[l4_offset:l4_offset + l4_len], pseudo))
+    elif protocol == "UDP":
+        _UDP.pack_into(buf, l4_offset, sport, dport, l4_len, 0)
+        pseudo = sum(struct.unpack("!6H", _PSEUDO.pack(src_addr, dst_addr, 0, 17, l4_len)))
+        struct.pack_into("!H", buf, l4_offset + 6, checksum(view[l4_offset:l4_offset + l4_len], pseudo) or 0xFFFF)
+    else:
+        _ICMP.pack_into(buf, l4_offset, icmp_type, 0, 0, icmp_id, icmp_seq)
+        struct.pack_into("!H", buf, l4_offset + 2, checksum(view[l4_offset:l4_offset + l4_len]))
+    return view[offset:offset + length]
+
+# Summaries are only formatted when something (normally the OSI panel)
+# converts them to text, so the hot path never pays for string building.
+def _ether_summary(frame, offset):
+    dst, src, ethertype = _ETHER.unpack_from(frame, offset)
+    return f"{bytes_to_mac(src)} > {bytes_to_mac(dst)} (0x{ethertype:04x})"
+
+def _ipv4_summary(frame, offset):
+    fields = _IPV4.unpack_from(frame, offset)
+    return f"{socket.inet_ntoa(fields[8])} > {socket.inet_ntoa(fields[9])} {IP_PROTO_NAMES.get(fields[6], fields[6])}"
+
+def _tcp_summary(frame, offset):
+    fields = _TCP.unpack_from(frame, offset)
+    return f"TCP {fields[0]} > {fields[1]} {tcp_flags_to_str(fields[5])}"
+
+def _udp_summary(frame, offset):
+    sport, dport, _, _ = _UDP.unpack_from(frame, offset)
+    return f"UDP {sport} > {dport}"
+
+def _icmp_summary(frame, offset):
+    icmp_type, code, _, _, _ = _ICMP.unpack_from(frame, offset)
+    return f"ICMP {ICMP_TYPES.get(icmp_type, icmp_type)} {code}"
+
+def peek_ipv4(frame, offset=0):
+    # (src_ip, dst_ip, protocol number) of an Ethernet/IPv4 frame without
+    # building any layer objects, or None for anything else
+    if len(frame) - offset < ETHER_LEN + IPV4_LEN or struct.unpack_from("!H", frame, offset + 12)[0] != ETHERTYPE_IPV4:
+        return None
+    ip_offset = offset + ETHER_LEN
+    return (socket.inet_ntoa(frame[ip_offset + 12:ip_offset + 16]), socket.inet_ntoa(frame[ip_offset + 16:ip_offset + 20]),
+            frame[ip_offset + 9])
+
+class HeaderSummary:
+    __slots__ = ("_formatter", "_frame", "_offset", "_text")
+
+    def __init__(self, formatter, frame, offset):
+        self._formatter = formatter
+        self._frame = frame
+        self._offset = offset
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self._formatter(self._frame, self._offset)
+            self._frame = None
+        return self._text
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+_L4_SUMMARIES = {6: (_tcp_summary, TCP_LEN), 17: (_udp_summary, UDP_LEN), 1: (_icmp_summary, ICMP_LEN)}
+
+def parse_frame(frame, offset=0):
+    # Returns (layers, payload) for a frame produced by build_frame or read off
+    # the wire. `layers` is a list of (layer, summary, offset) tuples and
+    # `payload` a memoryview slice; nothing is copied.
+    frame = memoryview(frame)
+    layers = [("Data Link", HeaderSummary(_ether_summary, frame, offset), offset)]
+    ethertype = struct.unpack_from("!H", frame, offset + 12)[0]
+    position = offset + ETHER_LEN
+    if ethertype != ETHERTYPE_IPV4:
+        return layers, frame[position:]
+    ver_ihl = frame[position]
+    total_len = struct.unpack_from("!H", frame, position + 2)[0]
+    proto = frame[position + 9]
+    end = min(len(frame), position + total_len) if total_len else len(frame)
+    layers.append(("Network", HeaderSummary(_ipv4_summary, frame, position), position))
+    position += (ver_ihl & 0x0F) * 4
+    if proto in _L4_SUMMARIES:
+        formatter, header_len = _L4_SUMMARIES[proto]
+        if proto == 6:
+            header_len = (frame[position + 12] >> 4) * 4
+        layers.append(("Transport", HeaderSummary(formatter, frame, position), position))
+        position += header_len
+    return layers, frame[position:end]
@@ -0,0 +1,259 @@
+# Links: bandwidth, latency, MTU and bounded output queues
+from core.channel import LinkChannel, link_channel
+from core.codec import ETHER_LEN
+from core.metrics import REGISTRY
+
+DEFAULT_LATENCY = 0.001
+DEFAULT_MTU = 1500
+DEFAULT_QUEUE = 100 # Frames per output queue
+SENT, QUEUE_DROP, LOST, TOO_BIG = range(4) # Outcomes handed to a send handler
+OUTCOME_NAMES = ("sent", "queue_drop", "lost", "too_big")
+
+class PacketQueue:
+    # Output queue as a fixed-size ring buffer of (length, data, handler,
+    # enqueue time, flow) entries. "droptail" refuses arrivals when full; "red" (Floyd and
+    # Jacobson) also drops early with a probability that grows with the
+    # moving average occupancy between the two thresholds.
+    __slots__ = ("capacity", "discipline", "min_threshold", "max_threshold", "max_p", "weight",
+                 "_entries", "_head", "count", "average", "_since_drop",
+                 "enqueued", "tail_drops", "early_drops", "peak", "_area", "_area_time")
+
+    def __init__(self, capacity=DEFAULT_QUEUE, discipline="droptail", min_threshold=None, max_threshold=None, max_p=0.1, weight=0.002):
+        if capacity < 1:
+            raise ValueError("Queue capacity must be positive")
+        if discipline not in ("droptail", "red"):
+            raise ValueError(f"Unknown queue discipline {discipline!r}")
+        self.capacity = capacity
+        self.discipline = discipline
+        self.min_threshold = capacity / 4 if min_threshold is None else min_threshold
+        self.max_threshold = capacity * 3 / 4 if max_threshold is None else max_threshold
+        if not 0 <= self.min_threshold < self.max_threshold:
+            raise ValueError("RED thresholds must satisfy 0 <= min < max")
+        self.max_p = max_p
+        self.weight = weight
+        self._entries = [None] * capacity
+        self._head = 0
+        self.count = 0
+        self.average = 0.0
+        self._since_drop = -1 # Arrivals since the last early drop
+        self.enqueued = 0
+        self.tail_drops = 0
+        self.early_drops = 0
+        self.peak = 0
+        self._area = 0.0 # Integral of the occupancy over time
+        self._area_time = 0.0
+
+    def __len__(self):
+        return self.count
+
+    def _account(self, now):
+        self._area += self.count * (now - self._area_time)
+        self._area_time = now
+
+    def arrival(self, now, stream, idle_frames=0.0):
+        # Updates the RED average for an arrival (decayed over `idle_frames`
+        # frame times the queue sat empty); returns False to drop it early
+        if self.discipline != "red":
+            return True
+        if self.count == 0 and idle_frames > 0:
+            self.average *= (1 - self.weight) ** idle_frames
+        self.average += self.weight * (self.count - self.average)
+        if self.average < self.min_threshold:
+            self._since_drop = -1
+            return True
+        if self.average >= self.max_threshold:
+            self._since_drop = 0
+            self.early_drops += 1
+            return False
+        self._since_drop += 1
+        p = self.max_p * (self.average - self.min_threshold) / (self.max_threshold - self.min_threshold)
+        p = 1.0 if self._since_drop * p >= 1 else p / (1 - self._since_drop * p)
+        if stream.random() < p:
+            self._since_drop = 0
+            self.early_drops += 1
+            return False
+        return True
+
+    def push(self, entry, now):
+        if self.count >= self.capacity:
+            self.tail_drops += 1
+            return False
+        self._account(now)
+        self._entries[(self._head + self.count) % self.capacity] = entry
+        self.count += 1
+        self.enqueued += 1
+        if self.count > self.peak:
+            self.peak = self.count
+        return True
+
+    def pop(self, now):
+        self._account(now)
+        entry = self._entries[self._head]
+        self._entries[self._head] = None
+        self._head = (self._head + 1) % self.capacity
+        self.count -= 1
+        return entry
+
+    def mean_occupancy(self, now):
+        self._account(now)
+        return self._area / now if now > 0 else 0.0
+
+QUEUE_ATTRIBUTES = {"queue": "capacity", "queue_discipline": "discipline", "red_min": "min_threshold",
+                    "red_max": "max_threshold", "red_max_p": "max_p", "red_weight": "weight"}
+
+class Link:
+    # A link between two device names with one output queue per end (index
+    # 0 sends a -> b, 1 sends b -> a) in front of a shared LinkChannel. A
+    # frame waits in its queue until the previous one from that end has been
+    # serialized, then contends for the medium, and reaches the far end
+    # `latency` seconds after its last bit left. An idle link sends at once,
+    # so uncongested traffic costs one event per hop.
+    def __init__(self, a, b, latency=DEFAULT_LATENCY, mtu=DEFAULT_MTU, channel=None, **queue_options):
+        self.a = a
+        self.b = b
+        self.latency = latency
+        self.mtu = mtu
+        self.channel = channel if channel is not None else LinkChannel()
+        self.queues = (PacketQueue(**queue_options), PacketQueue(**queue_options))
+        self._free_at = [0.0, 0.0] # When each end finishes its current frame
+        self._wakeup = [False, False] # A dequeue event is scheduled
+        self.frames = [0, 0]
+        self.bytes = [0, 0]
+        self.lost = [0, 0]
+        self.oversize = 0
+        self.serializing = [0.0, 0.0] # Total time spent putting bits on the wire
+        self.trace = None # (TraceRecorder, link index) while a run is being recorded
+        self.register_metrics(REGISTRY)
+
+    def register_metrics(self, registry):
+        # Queueing delay per direction is recorded as frames leave the queue;
+        # the counters the link already keeps are read at export time
+        self._queue_delay = tuple(registry.histogram("link_queue_delay_seconds", "Time frames wait in the output queue", link=name)
+                                  for name in self.names)
+        if not registry.enabled:
+            return
+        for direction, name in enumerate(self.names):
+            queue = self.queues[direction]
+            registry.callback("link_frames_total", lambda d=direction: self.frames[d], "Frames put on the wire", link=name)
+            registry.callback("link_bytes_total", lambda d=direction: self.bytes[d], "Bytes put on the wire", link=name)
+            registry.callback("link_lost_total", lambda d=direction: self.lost[d], "Frames lost to the loss model or collisions", link=name)
+            registry.callback("link_tail_drops_total", lambda q=queue: q.tail_drops, "Frames refused by a full queue", link=name)
+            registry.callback("link_early_drops_total", lambda q=queue: q.early_drops, "Frames dropped early by RED", link=name)
+            registry.callback("link_queue_peak", lambda q=queue: q.peak, "Largest queue occupancy", kind="gauge", link=name)
+        mac = self.channel.mac
+        registry.callback("link_collisions_total", lambda: mac.collisions, "CSMA/CD collisions on the medium", link=f"{self.a}-{self.b}")
+        registry.callback("link_deferrals_total", lambda: mac.deferrals, "Transmissions deferred by carrier sense", link=f"{self.a}-{self.b}")
+
+    @property
+    def names(self):
+        # Direction labels, "a->b" and "b->a"
+        return f"{self.a}->{self.b}", f"{self.b}->{self.a}"
+
+    @classmethod
+    def from_attrs(cls, a, b, attrs, seed=None):
+        options = {option: attrs[key] for key, option in QUEUE_ATTRIBUTES.items() if key in attrs}
+        return cls(a, b, attrs.get("latency", DEFAULT_LATENCY), attrs.get("mtu", DEFAULT_MTU), link_channel(attrs, seed), **options)
+
+    @property
+    def bandwidth(self):
+        return self.channel.mac.bandwidth
+
+    def direction(self, src):
+        # Queue index for frames sent by device `src`
+        return 0 if src == self.a else 1
+
+    def send(self, scheduler, direction, length, data, handler, flow=-1):
+        # Queue `length` bytes for transmission from end `direction`.
+        # handler(scheduler, (data, outcome, collisions)) runs when the frame
+        # arrives at the far end (outcome SENT), or as soon as it is dropped.
+        # `flow` only labels the frame's events in a trace.
+        now = scheduler.now
+        if length > self.mtu + ETHER_LEN:
+            self.oversize += 1
+            self._drop(scheduler, direction, length, data, handler, flow, TOO_BIG)
+            return
+        queue = self.queues[direction]
+        idle = (now - self._free_at[direction]) * self.bandwidth / (8 * (self.mtu + ETHER_LEN)) if queue.count == 0 else 0.0
+        if not queue.arrival(now, self.channel.stream, idle):
+            self._drop(scheduler, direction, length, data, handler, flow, QUEUE_DROP)
+            return
+        if queue.count == 0 and now >= self._free_at[direction]:
+            self._queue_delay[direction].record(0.0)
+            self._start(scheduler, direction, length, data, handler, flow)
+            return
+        if not queue.push((length, data, handler, now, flow), now):
+            self._drop(scheduler, direction, length, data, handler, flow, QUEUE_DROP)
+            return
+        if self.trace is not None:
+            recorder, index = self.trace
+            recorder.enqueue(now, index, direction, flow, length, queue.count)
+        if not self._wakeup[direction]:
+            self._wakeup[direction] = True
+            scheduler.schedule_at(self._free_at[direction], "dequeue", (self, direction), _on_dequeue)
+
+    def _drop(self, scheduler, direction, length, data, handler, flow, outcome, collisions=0):
+        if self.trace is not None:
+            recorder, index = self.trace
+            recorder.drop(scheduler.now, index, direction, flow, length, outcome)
+        handler(scheduler, (data, outcome, collisions))
+
+    def _start(self, scheduler, direction, length, data, handler, flow):
+        now = scheduler.now
+        end, collisions, lost = self.channel.transmit(now, length)
+        self.frames[direction] += 1
+        if collisions and self.trace is not None:
+            recorder, index = self.trace
+            recorder.collision(now, index, direction, flow, length, collisions)
+        if end is None:
+            self._free_at[direction] = now # Gave up after too many collisions
+            self.lost[direction] += 1
+            self._drop(scheduler, direction, length, data, handler, flow, LOST, collisions)
+            return
+        self._free_at[direction] = end
+        self.bytes[direction] += length
+        self.serializing[direction] += length * 8 / self.bandwidth
+        if lost:
+            self.lost[direction] += 1
+            self._drop(scheduler, direction, length, data, handler, flow, LOST, collisions)
+            return
+        if self.trace is not None:
+            recorder, index = self.trace
+            recorder.hop(now, end + self.latency, index, direction, flow, length)
+        scheduler.schedule(end - now + self.latency, "hop", (data, SENT, collisions), handler)
+
+    def _dequeue(self, scheduler, direction):
+        self._wakeup[direction] = False
+        queue = self.queues[direction]
+        if queue.count:
+            length, data, handler, queued_at, flow = queue.pop(scheduler.now)
+            self._queue_delay[direction].record(scheduler.now - queued_at)
+            self._start(scheduler, direction, length, data, handler, flow)
+        if queue.count:
+            self._wakeup[direction] = True
+            scheduler.schedule_at(max(self._free_at[direction], scheduler.now), "dequeue", (self, direction), _on_dequeue)
+
+    def statistics(self, now):
+        # Per-direction counters: queue occupancy, drops and utilization
+        rows = []
+        for direction, name in enumerate(self.names):
+            queue = self.queues[direction]
+            rows.append({
+                "link": name, "frames": self.frames[direction], "bytes": self.bytes[direction],
+                "queue_peak": queue.peak, "queue_mean": queue.mean_occupancy(now),
+                "tail_drops": queue.tail_drops, "early_drops": queue.early_drops, "lost": self.lost[direction],
+                "utilization": self.serializing[direction] / now if now > 0 else 0.0,
+            })
+        return rows
+
+def _on_dequeue(scheduler, data):
+    link, direction = data
+    link._dequeue(scheduler, direction)
+
+def build_links(topology, seed=None):
+    # Fresh per-run Link objects, one per topology link in link order. With a
+    # seed, link i draws from its own stream seeded with (seed, i), so a
+    # link's randomness does not depend on how much traffic the others carried.
+    # New links start a new run for the metrics registry.
+    REGISTRY.new_run()
+    return [Link.from_attrs(a.name, b.name, attrs, None if seed is None else (seed, i))
+            for i, (a, b, attrs) in enumerate(topology.links)]
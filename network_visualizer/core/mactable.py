@@ -0,0 +1,182 @@
+# Switch MAC address table (CAM)
+from array import array
+
+EMPTY = -1
+BROADCAST_MAC = 0xFFFFFFFFFFFF
+
+def mac_to_int(mac):
+    if isinstance(mac, int):
+        return mac
+    if isinstance(mac, (bytes, bytearray, memoryview)):
+        return int.from_bytes(mac, "big")
+    return int(mac.replace(":", "").replace("-", ""), 16)
+
+def int_to_mac(value):
+    return value.to_bytes(6, "big").hex(":")
+
+class MacTable:
+    # Open-addressing hash table with linear probing over flat arrays: 48-bit
+    # MACs as int64 keys, int32 port numbers and float64 last-seen times. The
+    # slot count is a power of two at least twice the capacity, and deletions
+    # use backward shifting so no tombstones build up.
+    #
+    # Aging runs on a timer wheel of `tick`-wide buckets. A learned MAC is put
+    # in the bucket of its expiry time; refreshes only touch the timestamp and
+    # an entry found not yet expired when its bucket comes due is moved to its
+    # new bucket. When the CAM is full the entry in the earliest due bucket is
+    # evicted.
+    def __init__(self, capacity=8192, aging_time=300.0, tick=1.0):
+        if capacity < 1:
+            raise ValueError("MAC table capacity must be positive")
+        self.capacity = capacity
+        self.aging_time = aging_time
+        self.tick = tick
+        size = 1
+        while size < capacity * 2:
+            size <<= 1
+        self._mask = size - 1
+        self._keys = array("q", [EMPTY]) * size
+        self._ports = array("i", bytes(4 * size))
+        self._stamps = array("d", bytes(8 * size))
+        self._count = 0
+        self._wheel = [[] for _ in range(int(aging_time / tick) + 2)]
+        self._wheel_tick = 0 # Absolute tick number of the bucket at the cursor
+        self._evict_tick = 0 # No live entry is bucketed before this tick
+        self.evictions = 0
+        self.aged_out = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, mac):
+        return self._find(mac_to_int(mac)) >= 0
+
+    def _home(self, key):
+        return ((key * 0x9E3779B97F4A7C15) >> 20) & self._mask
+
+    def _find(self, key):
+        keys, mask = self._keys, self._mask
+        i = self._home(key)
+        while True:
+            current = keys[i]
+            if current == key:
+                return i
+            if current == EMPTY:
+                return -1
+            i = (i + 1) & mask
+
+    def _delete_slot(self, i):
+        keys, ports, stamps, mask = self._keys, self._ports, self._stamps, self._mask
+        j = i
+        while True:
+            keys[i] = EMPTY
+            while True:
+                j = (j + 1) & mask
+                if keys[j] == EMPTY:
+                    self._count -= 1
+                    return
+                home = self._home(keys[j])
+                # The entry at j may stay unless its home lies cyclically outside (i, j]
+                if (i <= j and i < home <= j) or (i > j and (home > i or home <= j)):
+                    continue
+                break
+            keys[i], ports[i], stamps[i] = keys[j], ports[j], stamps[j]
+            i = j
+
+    def _schedule(self, key, expires):
+        target = max(int(expires / self.tick), self._wheel_tick)
+        self._wheel[target % len(self._wheel)].append(key)
+        if target < self._evict_tick:
+            self._evict_tick = target
+
+    def learn(self, mac, port, now=0.0):
+        key = mac_to_int(mac)
+        if key == BROADCAST_MAC or key & (1 << 40):
+            return # Never learn broadcast or multicast sources
+        self.expire(now)
+        i = self._find(key)
+        if i >= 0:
+            self._ports[i] = port
+            self._stamps[i] = now
+            return
+        if self._count >= self.capacity:
+            self._evict_one()
+        keys, mask = self._keys, self._mask
+        i = self._home(key)
+        while keys[i] != EMPTY:
+            i = (i + 1) & mask
+        keys[i] = key
+        self._ports[i] = port
+        self._stamps[i] = now
+        self._count += 1
+        self._schedule(key, now + self.aging_time)
+
+    def lookup(self, mac):
+        i = self._find(mac_to_int(mac))
+        return self._ports[i] if i >= 0 else None
+
+    def remove(self, mac):
+        i = self._find(mac_to_int(mac))
+        if i < 0:
+            return False
+        self._delete_slot(i)
+        return True
+
+    def flush_port(self, port):
+        # Drop every entry learned on a port (e.g. when the link goes down)
+        keys, ports = self._keys, self._ports
+        stale = [keys[i] for i in range(len(keys)) if keys[i] != EMPTY and ports[i] == port]
+        for key in stale:
+            self._delete_slot(self._find(key))
+        return len(stale)
+
+    def expire(self, now):
+        # Process every bucket whose tick has fully elapsed; entries therefore
+        # age out between aging_time and aging_time + tick after last being seen
+        target = int(now / self.tick)
+        wheel = self._wheel
+        while self._wheel_tick < target:
+            bucket_index = self._wheel_tick % len(wheel)
+            bucket = wheel[bucket_index]
+            if bucket:
+                wheel[bucket_index] = []
+                for key in bucket:
+                    self._check_expiry(key, now)
+            self._wheel_tick += 1
+
+    def _check_expiry(self, key, now):
+        i = self._find(key)
+        if i < 0:
+            return
+        expires = self._stamps[i] + self.aging_time
+        if expires <= now:
+            self._delete_slot(i)
+            self.aged_out += 1
+        else:
+            self._schedule(key, expires)
+
+    def _evict_one(self):
+        # Evict the live entry closest to expiry (the earliest wheel bucket)
+        wheel = self._wheel
+        start = max(self._wheel_tick, self._evict_tick)
+        for tick in range(start, self._wheel_tick + len(wheel)):
+            self._evict_tick = tick
+            bucket = wheel[tick % len(wheel)]
+            while bucket:
+                key = bucket.pop()
+                i = self._find(key)
+                if i < 0:
+                    continue
+                expires = self._stamps[i] + self.aging_time
+                if int(expires / self.tick) > tick:
+                    self._schedule(key, expires) # Refreshed since it was bucketed
+                    continue
+                self._delete_slot(i)
+                self.evictions += 1
+                return
+
+    def items(self):
+        keys, ports = self._keys, self._ports
+        for i in range(len(keys)):
+            if keys[i] != EMPTY:
+                yield int_to_mac(keys[i]), ports[i]
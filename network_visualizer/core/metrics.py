@@ -0,0 +1,383 @@
+# Metrics registry: counters, gauges, latency histograms and timing spans
+import functools
+import json
+import math
+import threading
+from time import perf_counter
+
+HISTOGRAM_BITS = 7 # 2**7 linear sub-buckets per power of two: under 1% relative error
+HISTOGRAM_UNIT = 1e-9 # Histograms record seconds and bucket them in nanoseconds
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+_HALF_BITS = HISTOGRAM_BITS - 1
+_SUB_BUCKETS = 1 << HISTOGRAM_BITS
+
+class Counter:
+    kind = "counter"
+    __slots__ = ("name", "labels", "value")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def merge(self, other):
+        self.value += other.value
+
+class Gauge:
+    kind = "gauge"
+    __slots__ = ("name", "labels", "value")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def merge(self, other):
+        self.value = max(self.value, other.value)
+
+class CallbackMetric:
+    # A counter or gauge whose value is read from the simulation object that
+    # already keeps it (a link's frame count, a flow's deliveries), so the hot
+    # path pays nothing for it. `run` is the registry run it was registered in.
+    __slots__ = ("name", "labels", "kind", "read", "run")
+
+    def __init__(self, name, labels, read, kind="counter", run=0):
+        self.name = name
+        self.labels = labels
+        self.read = read
+        self.kind = kind
+        self.run = run
+
+    @property
+    def value(self):
+        return self.read()
+
+class Histogram:
+    # HDR-style log-linear histogram: values below 2**HISTOGRAM_BITS units get
+    # a bucket each, above that every power of two is split into 2**(BITS-1)
+    # equal buckets, so any recorded value is known to within 1% and the
+    # bucket list grows with the log of the largest value (about 2300 buckets
+    # for an hour in nanoseconds).
+    kind = "summary"
+    __slots__ = ("name", "labels", "unit", "counts", "count", "total", "min", "max")
+
+    def __init__(self, name, labels, unit=HISTOGRAM_UNIT):
+        self.name = name
+        self.labels = labels
+        self.unit = unit
+        self.counts = []
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value):
+        units = int(value / self.unit)
+        if units < 0:
+            units = 0
+        shift = units.bit_length() - HISTOGRAM_BITS
+        index = units if shift <= 0 else (shift << _HALF_BITS) + (units >> shift)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def _bucket_value(self, index):
+        # Value reported for a bucket, in recorded units (seconds): exact for
+        # the unit-wide buckets, the midpoint above them
+        if index < _SUB_BUCKETS:
+            return index * self.unit
+        shift = (index >> _HALF_BITS) - 1
+        low = (index - (shift << _HALF_BITS)) << shift
+        return (low + (1 << shift) / 2) * self.unit
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        target = max(math.ceil(q * self.count), 1)
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def value(self):
+        return self.count
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, n in enumerate(other.counts):
+            self.counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+class _NullMetric:
+    # Handed out by a disabled registry: every update is a no-op
+    __slots__ = ()
+    value = 0
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def record(self, value):
+        pass
+
+NULL_METRIC = _NullMetric()
+
+class Span:
+    # Context manager recording the wall-clock time of its body
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(perf_counter() - self.start)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _copy_metric(metric):
+    # Detached copy of a metric; a callback becomes a plain counter or gauge
+    if isinstance(metric, CallbackMetric):
+        copy = (Counter if metric.kind == "counter" else Gauge)(metric.name, metric.labels)
+        copy.value = metric.value
+        return copy
+    copy = type(metric).__new__(type(metric))
+    for slot in type(metric).__slots__:
+        value = getattr(metric, slot)
+        setattr(copy, slot, list(value) if isinstance(value, list) else value)
+    return copy
+
+class MetricsRegistry:
+    # Metrics are identified by name and labels (device, link, flow, ...).
+    # Simulation objects fetch their metric handles once, when they are
+    # built, and update them directly; a disabled registry hands out
+    # NULL_METRIC and NULL_SPAN instead, so instrumentation costs one no-op
+    # call. Enable the registry before building the topology and links.
+    # Timing spans are a separate switch, since they read the clock.
+    def __init__(self, enabled=False, timing=False):
+        self.enabled = enabled
+        self.timing = timing
+        self._metrics = {} # (name, labels) -> metric
+        self._families = {} # name -> (kind, help)
+        self._run = 0 # Bumped by new_run()
+        self._lock = threading.Lock() # Metrics are created from the GUI and worker threads
+
+    def enable(self, timing=False):
+        self.enabled = True
+        self.timing = timing
+        return self
+
+    def disable(self):
+        self.enabled = False
+        self.timing = False
+
+    def new_run(self):
+        # Marks the start of a simulation run (core.link.build_links calls
+        # it): callbacks registered from now on may replace those of earlier
+        # runs, but not each other
+        self._run += 1
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+            self._families.clear()
+
+    def __len__(self):
+        return len(self._metrics)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, *args):
+        if not self.enabled:
+            return NULL_METRIC
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(name, key[1], *args)
+                    self._families.setdefault(name, (cls.kind, help))
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help="", unit=HISTOGRAM_UNIT, **labels):
+        return self._get(Histogram, name, help, labels, unit)
+
+    def callback(self, name, read, help="", kind="counter", **labels):
+        # Registers read() as the value of name{labels}. A callback from an
+        # earlier run (the last run's flow 0) is replaced; registering the
+        # same name and labels twice in one run means two objects claim the
+        # same identity, and raises ValueError.
+        if not self.enabled:
+            return NULL_METRIC
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            existing = self._metrics.get(key)
+            if existing is not None and (not isinstance(existing, CallbackMetric) or existing.run == self._run):
+                raise ValueError(f"Metric {name}{_format_labels(key[1])} is already registered")
+            metric = self._metrics[key] = CallbackMetric(name, key[1], read, kind, self._run)
+            self._families.setdefault(name, (kind, help))
+        return metric
+
+    def span(self, name, **labels):
+        if not self.timing:
+            return NULL_SPAN
+        return Span(self.histogram("span_duration_seconds", "Wall-clock time spent in instrumented code", span=name, **labels))
+
+    def timed(self, name):
+        # Decorator: times every call as span `name` while timing is enabled
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.timing:
+                    return func(*args, **kwargs)
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._metrics.items())
+
+    def metrics(self):
+        return [metric for _, metric in self._items()]
+
+    def freeze(self):
+        # A picklable copy with callback values read now, e.g. to send from a
+        # worker process to the parent for merge()
+        frozen = MetricsRegistry(self.enabled, self.timing)
+        frozen._families = dict(self._families)
+        frozen._metrics = {key: _copy_metric(metric) for key, metric in self._items()}
+        return frozen
+
+    def merge(self, other):
+        # Adds another registry's values: counters and histograms are summed,
+        # gauges keep the maximum
+        for key, metric in other._items():
+            metric = _copy_metric(metric)
+            with self._lock:
+                mine = self._metrics.get(key)
+                if mine is None or isinstance(mine, CallbackMetric):
+                    self._metrics[key] = metric
+                else:
+                    mine.merge(metric)
+                self._families.setdefault(metric.name, other._families.get(metric.name, (metric.kind, "")))
+
+    def snapshot(self):
+        # Plain dict of every metric, for JSON
+        counters, gauges, histograms = [], [], []
+        for metric in self.metrics():
+            labels = dict(metric.labels)
+            if metric.kind == "summary":
+                row = {"name": metric.name, "labels": labels, "count": metric.count, "sum": metric.total,
+                       "min": metric.min if metric.count else None, "max": metric.max if metric.count else None,
+                       "mean": metric.total / metric.count if metric.count else None}
+                row.update((f"p{q * 100:g}".replace(".", ""), metric.quantile(q)) for q in QUANTILES) # p50 ... p999
+                histograms.append(row)
+            else:
+                (counters if metric.kind == "counter" else gauges).append({"name": metric.name, "labels": labels, "value": metric.value})
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self):
+        # Prometheus text exposition format; histograms are exported as
+        # summaries with QUANTILES, _sum and _count
+        lines = []
+        current = None
+        for metric in self.metrics():
+            if metric.name != current:
+                current = metric.name
+                kind, help = self._families.get(current, (metric.kind, ""))
+                if help:
+                    lines.append(f"# HELP {current} {help}")
+                lines.append(f"# TYPE {current} {kind}")
+            if metric.kind == "summary":
+                for q in QUANTILES:
+                    lines.append(f"{metric.name}{_format_labels(metric.labels, [('quantile', q)])} {_format_value(metric.quantile(q))}")
+                lines.append(f"{metric.name}_sum{_format_labels(metric.labels)} {_format_value(metric.total)}")
+                lines.append(f"{metric.name}_count{_format_labels(metric.labels)} {metric.count}")
+            else:
+                lines.append(f"{metric.name}{_format_labels(metric.labels)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write(self, path, fmt=None):
+        # fmt "json" or "prometheus"; by default from the file extension
+        fmt = fmt or ("json" if path.endswith(".json") else "prometheus")
+        if fmt not in ("json", "prometheus"):
+            raise ValueError(f"Unknown metrics format {fmt!r}")
+        with open(path, "w") as f:
+            f.write(self.to_json() + "\n" if fmt == "json" else self.to_prometheus())
+
+REGISTRY = MetricsRegistry() # Process-wide registry, disabled until enable() is called
+
+def timed(name):
+    return REGISTRY.timed(name)
@@ -0,0 +1,192 @@
+# Compact in-flight packet records, a shared payload arena and a record pool
+from collections.abc import Sequence
+from core.codec import IP_PROTO, build_frame, frame_length, parse_frame
+from core.mactable import int_to_mac, mac_to_int
+from core.protocols import ENCRYPTED_PREFIX
+from core.routing import int_to_ip, ip_to_int
+
+ARENA_SIZE = 1 << 16 # Initial payload arena size in bytes; it doubles when full
+POOL_LIMIT = 1 << 16 # Released records kept for reuse
+TCP, UDP, ICMP = IP_PROTO["TCP"], IP_PROTO["UDP"], IP_PROTO["ICMP"]
+PROTOCOL_NAMES = {number: name for name, number in IP_PROTO.items()}
+_HEADERS_LEN = {number: frame_length(name, 0) for name, number in IP_PROTO.items()}
+
+class PayloadArena:
+    # Payload bytes of every record live in one growable bytearray; a record
+    # holds an (offset, length) pair into it. Payloads are interned by value,
+    # so the packets of a flow that all carry the same message share a single
+    # copy and the arena grows with the number of distinct payloads, not with
+    # the number of packets. It is never cleared: PacketPool.new_arena()
+    # starts a new one per run, and this one is freed with its last record.
+    def __init__(self, size=ARENA_SIZE):
+        self._buffer = bytearray(size)
+        self._used = 0
+        self._offsets = {} # payload -> (offset, length)
+
+    def __len__(self):
+        return self._used
+
+    def store(self, payload):
+        # Returns (offset, length) of `payload` (bytes or str, UTF-8 encoded)
+        slot = self._offsets.get(payload)
+        if slot is not None:
+            return slot
+        data = payload.encode() if isinstance(payload, str) else bytes(payload)
+        end = self._used + len(data)
+        if end > len(self._buffer):
+            self._buffer.extend(bytes(max(len(self._buffer), end - len(self._buffer))))
+        self._buffer[self._used:end] = data
+        slot = self._offsets[payload] = (self._used, len(data))
+        self._used = end
+        return slot
+
+    def read(self, offset, length):
+        # A copy: views into the buffer would pin it and stop it from growing
+        return bytes(self._buffer[offset:offset + length])
+
+class PacketRecord:
+    # One packet as plain ints: IP protocol number, MACs and IPv4 addresses
+    # as integers, ports, TCP flags/seq/ack and the payload's place in the
+    # arena. ICMP keeps its type in `flags` and its id/seq in sport/dport.
+    # Nothing is formatted or built until layers() or frame() is called.
+    __slots__ = ("protocol", "src_mac", "dst_mac", "src_ip", "dst_ip", "sport", "dport", "flags", "seq", "ack",
+                 "ttl", "payload_offset", "payload_length", "length", "arena")
+
+    def payload(self):
+        return self.arena.read(self.payload_offset, self.payload_length)
+
+    def frame(self):
+        # The frame as build_frame writes it; built on every call
+        name = PROTOCOL_NAMES[self.protocol]
+        icmp = self.protocol == ICMP
+        return build_frame(self.payload(), name, int_to_mac(self.src_mac), int_to_mac(self.dst_mac),
+                           int_to_ip(self.src_ip), int_to_ip(self.dst_ip), sport=self.sport, dport=self.dport,
+                           flags=self.flags, seq=self.seq, ack=self.ack, icmp_type=self.flags if icmp else 8,
+                           icmp_id=self.sport if icmp else 0, icmp_seq=self.dport if icmp else 0, ttl=self.ttl)
+
+    def layers(self):
+        # Header dicts in the order encapsulate_packet returns them:
+        # application data first, Data Link last
+        layers, payload = parse_frame(self.frame())
+        data = bytes(payload) if payload else ''
+        headers = []
+        if data:
+            prefix = ENCRYPTED_PREFIX.encode()
+            if self.protocol == TCP and data.startswith(prefix):
+                headers.append({"layer": "Application", "data": data[len(prefix):].decode('utf-8', errors='replace')})
+                headers.append({"layer": "TLS/SSL", "data": data.decode('utf-8', errors='replace')})
+            else:
+                headers.append({"layer": "Application", "data": data.decode('utf-8', errors='replace')})
+        for layer, summary, _ in reversed(layers):
+            headers.append({"layer": layer, "header": summary, "data": data})
+        return headers
+
+    def layer_view(self):
+        return LayerView(self)
+
+class LayerView(Sequence):
+    # List-like stand-in for a packet's header dicts that builds them on
+    # first access. Steps hand these to the GUI, so headless runs never
+    # format a header. The view keeps the record until then: do not release
+    # a record whose view may still be read.
+    __slots__ = ("_record", "_layers")
+
+    def __init__(self, record):
+        self._record = record
+        self._layers = None
+
+    def _materialize(self):
+        if self._layers is None:
+            self._layers = self._record.layers()
+            self._record = None
+        return self._layers
+
+    def __len__(self):
+        return len(self._materialize())
+
+    def __getitem__(self, index):
+        return self._materialize()[index]
+
+    def __iter__(self):
+        return iter(self._materialize())
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(self._materialize())
+
+def address_fields(src_mac, dst_mac, src_ip, dst_ip):
+    # (src_mac, dst_mac, src_ip, dst_ip) as the ints PacketPool.acquire takes;
+    # convert once per flow, not per packet
+    return mac_to_int(src_mac), mac_to_int(dst_mac), ip_to_int(src_ip), ip_to_int(dst_ip)
+
+class PacketPool:
+    # Free list of PacketRecords. acquire() reuses a released record when
+    # there is one, so a steady stream of packets allocates no new objects;
+    # up to `limit` released records are kept.
+    def __init__(self, arena=None, limit=POOL_LIMIT):
+        self.arena = arena if arena is not None else PayloadArena()
+        self.limit = limit
+        self._free = []
+        self.created = 0
+        self.reused = 0
+
+    def __len__(self):
+        return len(self._free)
+
+    def new_arena(self):
+        # Store the payloads of records acquired from now on in a new arena.
+        # Called at the start of each run so payloads do not accumulate for
+        # the life of the process; records already acquired (and their unread
+        # LayerViews) keep the arena they were stored in.
+        self.arena = PayloadArena()
+
+    def acquire(self, protocol, src_mac, dst_mac, src_ip, dst_ip, payload=b"", sport=None, dport=None, flags=None, seq=0, ack=0, ttl=64):
+        # protocol is "TCP"/"UDP"/"ICMP" or its IP protocol number; addresses
+        # are ints (see address_fields). Ports default like build_frame's,
+        # and an ICMP record is an echo request unless `flags` says otherwise.
+        if isinstance(protocol, str):
+            if protocol not in IP_PROTO:
+                raise ValueError("Unsupported protocol")
+            protocol = IP_PROTO[protocol]
+        if self._free:
+            record = self._free.pop()
+            self.reused += 1
+        else:
+            record = PacketRecord()
+            self.created += 1
+        if protocol == ICMP:
+            payload = b"" # ICMP frames carry no application payload in this model
+            sport = 0 if sport is None else sport
+            dport = 0 if dport is None else dport
+            flags = 8 if flags is None else flags
+        else:
+            sport = 12345 if sport is None else sport
+            dport = (80 if protocol == TCP else 53) if dport is None else dport
+            flags = 0 if flags is None else flags
+        arena = self.arena
+        record.protocol = protocol
+        record.src_mac = src_mac
+        record.dst_mac = dst_mac
+        record.src_ip = src_ip
+        record.dst_ip = dst_ip
+        record.sport = sport
+        record.dport = dport
+        record.flags = flags
+        record.seq = seq
+        record.ack = ack
+        record.ttl = ttl
+        record.payload_offset, record.payload_length = arena.store(payload)
+        record.length = _HEADERS_LEN[protocol] + record.payload_length
+        record.arena = arena
+        return record
+
+    def release(self, record):
+        # Return a record nothing else refers to any more. It lets go of its
+        # arena, so a free record does not keep an earlier run's payloads.
+        record.arena = None
+        if len(self._free) < self.limit:
+            self._free.append(record)
+
+POOL = PacketPool() # Shared by the simulation; only one thread runs flows at a time
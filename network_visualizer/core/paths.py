@@ -0,0 +1,132 @@
+# Shortest-path and forwarding-table service
+import heapq
+from array import array
+from collections import deque
+
+UNREACHABLE = -1
+
+class PathService:
+    # Next-hop tables stored one row per destination: row[d][u] is the next
+    # device from u towards d, so a path query just follows the row and costs
+    # O(path length). Rows come from one BFS (uniform costs) or Dijkstra run
+    # rooted at the destination, are computed on first use (or all at once by
+    # precompute()), and only the rows a link change can affect are dropped.
+    def __init__(self, topology, weight="cost"):
+        self.topology = topology
+        self.weight = weight
+        self._rows = {} # destination -> (next_hop array('i'), distance array('d'))
+        self._down = set() # link indices that are administratively down
+        self.computed_rows = 0
+        self._costs = array("d", (float(attrs.get(weight, 1)) for _, _, attrs in topology.links))
+        self._uniform = len(set(self._costs)) <= 1
+
+    def _compute_row(self, dst):
+        offsets, neighbors, neighbor_links = self.topology.adjacency()
+        count = len(self.topology)
+        next_hop = array("i", [UNREACHABLE]) * count
+        distance = array("d", [float("inf")]) * count
+        costs, down = self._costs, self._down
+        next_hop[dst] = dst
+        distance[dst] = 0.0
+        if self._uniform:
+            cost = costs[0] if costs else 1.0
+            queue = deque([dst])
+            while queue:
+                node = queue.popleft()
+                for k in range(offsets[node], offsets[node + 1]):
+                    neighbor = neighbors[k]
+                    if next_hop[neighbor] == UNREACHABLE and neighbor_links[k] not in down:
+                        next_hop[neighbor] = node
+                        distance[neighbor] = distance[node] + cost
+                        queue.append(neighbor)
+        else:
+            heap = [(0.0, dst)]
+            while heap:
+                dist, node = heapq.heappop(heap)
+                if dist > distance[node]:
+                    continue
+                for k in range(offsets[node], offsets[node + 1]):
+                    link = neighbor_links[k]
+                    if link in down:
+                        continue
+                    neighbor = neighbors[k]
+                    candidate = dist + costs[link]
+                    if candidate < distance[neighbor]:
+                        distance[neighbor] = candidate
+                        next_hop[neighbor] = node
+                        heapq.heappush(heap, (candidate, neighbor))
+        self.computed_rows += 1
+        row = self._rows[dst] = (next_hop, distance)
+        return row
+
+    def _row(self, dst):
+        row = self._rows.get(dst)
+        return row if row is not None else self._compute_row(dst)
+
+    def precompute(self):
+        # Fill every destination row (all-pairs next hops)
+        for dst in range(len(self.topology)):
+            self._row(dst)
+
+    def next_hop(self, src, dst):
+        index = self.topology.index
+        hop = self._row(index[dst])[0][index[src]]
+        return None if hop == UNREACHABLE else self.topology.devices[hop].name
+
+    def distance(self, src, dst):
+        index = self.topology.index
+        return self._row(index[dst])[1][index[src]]
+
+    def path(self, src, dst):
+        index = self.topology.index
+        devices = self.topology.devices
+        node, goal = index[src], index[dst]
+        next_hop = self._row(goal)[0]
+        if next_hop[node] == UNREACHABLE:
+            return None
+        path = [devices[node].name]
+        while node != goal:
+            node = next_hop[node]
+            path.append(devices[node].name)
+        return path
+
+    def forwarding_table(self, name):
+        # {destination name: next-hop name} for one device, from all rows
+        self.precompute()
+        source = self.topology.index[name]
+        devices = self.topology.devices
+        return {devices[dst].name: devices[row[0][source]].name
+                for dst, row in self._rows.items() if row[0][source] != UNREACHABLE and dst != source}
+
+    def _link_index(self, a, b):
+        offsets, neighbors, neighbor_links = self.topology.adjacency()
+        i, j = self.topology.index[a], self.topology.index[b]
+        for k in range(offsets[i], offsets[i + 1]):
+            if neighbors[k] == j:
+                return neighbor_links[k], i, j
+        raise KeyError(f"No link between {a} and {b}")
+
+    def link_down(self, a, b):
+        # Only rows whose tree routes over the link can change
+        link, i, j = self._link_index(a, b)
+        if link in self._down:
+            return
+        self._down.add(link)
+        stale = [dst for dst, (next_hop, _) in self._rows.items() if next_hop[i] == j or next_hop[j] == i]
+        for dst in stale:
+            del self._rows[dst]
+
+    def link_up(self, a, b):
+        # Only rows where the restored link gives a strictly shorter distance can change
+        link, i, j = self._link_index(a, b)
+        if link not in self._down:
+            return
+        self._down.discard(link)
+        cost = self._costs[link]
+        stale = [dst for dst, (_, distance) in self._rows.items()
+                 if distance[i] + cost < distance[j] or distance[j] + cost < distance[i]]
+        for dst in stale:
+            del self._rows[dst]
+
+    def is_up(self, a, b):
+        return self._link_index(a, b)[0] not in self._down
@@ -1,7 +1,46 @@
 # Protocol handling logic
-from scapy.all import Ether, IP, TCP, UDP, ICMP
+from core.codec import L4_LEN, build_frame, parse_frame
+from core.metrics import timed
 
-def encapsulate_packet(message, protocol="TCP", src_mac="00:00:00:00:00:00", dst_mac="FF:FF:FF:FF:FF:FF", src_ip="192.168.1.100", dst_ip="192.168.1.1"):
+ENCRYPTED_PREFIX = "[ENCRYPTED]:"
+
+def scapy_layers():
+    # (Ether, IP, TCP, UDP, ICMP). Scapy is only needed for the "scapy"
+    # backend and Scapy packet objects, and importing it takes most of a
+    # second, so it is imported on first use rather than with this module.
+    try:
+        from scapy.all import Ether, IP, TCP, UDP, ICMP
+    except ImportError:
+        raise RuntimeError("Building Scapy packets requires Scapy to be installed") from None
+    return Ether, IP, TCP, UDP, ICMP
+
+@timed("encapsulate")
+def encapsulate_packet(message, protocol="TCP", src_mac="00:00:00:00:00:00", dst_mac="FF:FF:FF:FF:FF:FF", src_ip="192.168.1.100", dst_ip="192.168.1.1", backend="fast", buf=None):
+    # The "fast" backend builds the frame with the struct codec and returns it
+    # as a memoryview; header summaries are formatted only when displayed.
+    # backend="scapy" builds Scapy layers as before.
+    if backend == "scapy":
+        return _encapsulate_scapy(message, protocol, src_mac, dst_mac, src_ip, dst_ip)
+    if protocol not in L4_LEN:
+        raise ValueError("Unsupported protocol")
+
+    headers = [{"layer": "Application", "data": message}]
+    app_data = message
+    if protocol == "TCP":
+        app_data = ENCRYPTED_PREFIX + message
+        headers.append({"layer": "TLS/SSL", "data": app_data})
+
+    frame = build_frame(app_data.encode(), protocol, src_mac=src_mac, dst_mac=dst_mac, src_ip=src_ip, dst_ip=dst_ip, buf=buf)
+    # Summaries decode their header bytes when first shown. A caller's buf is
+    # overwritten by its next frame, so in that mode they read a copy of this one.
+    layers, payload = parse_frame(frame if buf is None else bytes(frame))
+    data = bytes(payload) if payload else ''
+    for layer, summary, _ in reversed(layers):
+        headers.append({"layer": layer, "header": summary, "data": data})
+    return frame, headers
+
+def _encapsulate_scapy(message, protocol, src_mac, dst_mac, src_ip, dst_ip):
+    Ether, IP, TCP, UDP, ICMP = scapy_layers()
     headers = []
 
     # Application Layer (simplified)
@@ -39,7 +78,11 @@ def encapsulate_packet(message, protocol="TCP", src_mac="00:00:00:00:00:00", dst
 
     return data_link_frame, headers
 
+@timed("decapsulate")
 def decapsulate_packet(packet):
+    if isinstance(packet, (bytes, bytearray, memoryview)):
+        return _decapsulate_raw(packet)
+    Ether, IP, TCP, UDP, ICMP = scapy_layers() # Already imported by whoever built the packet
     decapsulation_steps = []
     
     # Data Link Layer
@@ -79,3 +122,22 @@ def decapsulate_packet(packet):
         decapsulation_steps.append({"layer": "Application", "data": str(packet)})
     
     return decapsulation_steps
+
+def _decapsulate_raw(frame):
+    layers, payload = parse_frame(frame)
+    data = bytes(payload) if payload else ''
+    decapsulation_steps = [{"layer": layer, "header": summary, "data": data} for layer, summary, _ in layers]
+
+    # TLS/SSL Decryption (simplified)
+    prefix = ENCRYPTED_PREFIX.encode()
+    if data and data.startswith(prefix):
+        data = data[len(prefix):].decode('utf-8', errors='replace')
+        decapsulation_steps.append({"layer": "TLS/SSL", "data": "[DECRYPTED]:" + data})
+    elif data:
+        data = data.decode('utf-8', errors='replace')
+
+    # Application Layer
+    if data:
+        decapsulation_steps.append({"layer": "Application", "data": data})
+
+    return decapsulation_steps
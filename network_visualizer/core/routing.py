@@ -0,0 +1,122 @@
+# CIDR routing table with longest-prefix matching
+import socket
+
+_MISS = object()
+_MASKS = [(0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF for length in range(33)]
+
+def ip_to_int(ip):
+    return int.from_bytes(socket.inet_aton(ip), "big")
+
+def int_to_ip(value):
+    return socket.inet_ntoa(value.to_bytes(4, "big"))
+
+def parse_prefix(prefix):
+    # Accepts "10.0.0.0/8", a bare host address (treated as /32) and the legacy
+    # dotted string prefixes such as "192.168.1." used by older routing tables
+    if "/" in prefix:
+        address, length = prefix.split("/", 1)
+        length = int(length)
+    elif prefix.endswith("."):
+        octets = prefix.rstrip(".").split(".")
+        address = ".".join(octets + ["0"] * (4 - len(octets)))
+        length = 8 * len(octets)
+    else:
+        address, length = prefix, 32
+    if address.count(".") != 3:
+        # inet_aton would read "192.168.1" as 192.168.0.1; only the trailing-dot form is shorthand
+        raise ValueError(f"Invalid address in prefix {prefix!r}: expected four dotted octets")
+    if not 0 <= length <= 32:
+        raise ValueError(f"Invalid prefix length in {prefix!r}")
+    return ip_to_int(address) & _MASKS[length], length
+
+class RoutingTable:
+    # One hash index per prefix length over integer network addresses. Lookups
+    # probe only the lengths that actually hold routes, longest first, and
+    # results are memoised per destination until the table changes.
+    def __init__(self, routes=None, cache_size=65536):
+        self._tables = {}
+        self._lengths = []
+        self._probes = [] # (mask, table) pairs, longest prefix first
+        self._cache = {}
+        self.cache_size = cache_size
+        if routes:
+            self.update(routes)
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
+
+    def __contains__(self, prefix):
+        network, length = parse_prefix(prefix)
+        return network in self._tables.get(length, ())
+
+    def _reindex(self):
+        self._lengths = sorted(self._tables, reverse=True)
+        self._probes = [(_MASKS[length], self._tables[length]) for length in self._lengths]
+
+    def _insert(self, prefix, next_hop):
+        network, length = parse_prefix(prefix)
+        table = self._tables.get(length)
+        if table is None:
+            table = self._tables[length] = {}
+            self._reindex()
+        table[network] = next_hop
+
+    def add(self, prefix, next_hop):
+        self._insert(prefix, next_hop)
+        self._cache.clear()
+
+    def update(self, routes):
+        # Bulk insert from a mapping or an iterable of (prefix, next_hop) pairs
+        items = routes.items() if hasattr(routes, "items") else routes
+        for prefix, next_hop in items:
+            self._insert(prefix, next_hop)
+        self._cache.clear()
+
+    def withdraw(self, prefix):
+        network, length = parse_prefix(prefix)
+        table = self._tables.get(length)
+        if table is None or network not in table:
+            return False
+        del table[network]
+        if not table:
+            del self._tables[length]
+            self._reindex()
+        self._cache.clear()
+        return True
+
+    def load(self, path, resolve=None):
+        # Bulk load "prefix next_hop" lines; '#' starts a comment. `resolve`
+        # maps the next-hop token from the file to the object stored in the table.
+        def routes():
+            with open(path) as f:
+                for line in f:
+                    line = line.split("#", 1)[0].split()
+                    if not line:
+                        continue
+                    if len(line) != 2:
+                        raise ValueError(f"Malformed route line in {path}: {' '.join(line)}")
+                    prefix, next_hop = line
+                    yield prefix, resolve(next_hop) if resolve else next_hop
+        self.update(routes())
+        return self
+
+    def lookup(self, dst_ip, default=None):
+        cache = self._cache
+        result = cache.get(dst_ip, _MISS)
+        if result is _MISS:
+            address = ip_to_int(dst_ip) if isinstance(dst_ip, str) else dst_ip
+            result = None
+            for mask, table in self._probes:
+                next_hop = table.get(address & mask, _MISS)
+                if next_hop is not _MISS:
+                    result = (next_hop,)
+                    break
+            if len(cache) >= self.cache_size:
+                cache.clear()
+            cache[dst_ip] = result
+        return default if result is None else result[0]
+
+    def items(self):
+        for length in self._lengths:
+            for network, next_hop in self._tables[length].items():
+                yield f"{int_to_ip(network)}/{length}", next_hop
@@ -0,0 +1,90 @@
+# Discrete-event scheduler
+import heapq
+from collections import namedtuple
+from itertools import count
+
+Event = namedtuple("Event", ["time", "name", "data"])
+
+class EventScheduler:
+    # Priority queue of timestamped events. Heap entries are plain tuples
+    # (time, seq, name, data, handler) so pushing and popping stay cheap; seq
+    # keeps events posted for the same instant in FIFO order.
+    def __init__(self, record=True):
+        self.now = 0.0
+        self.record = record
+        self.log = [] # Processed events, read by the GUI once a run is done
+        self.processed = 0
+        self._queue = []
+        self._seq = count()
+        self._handlers = {}
+
+    def __len__(self):
+        return len(self._queue)
+
+    def on(self, name, handler):
+        # Default handler for every event with this name
+        self._handlers[name] = handler
+
+    def schedule(self, delay, name, data=None, handler=None):
+        if delay < 0:
+            raise ValueError("Cannot schedule an event in the past")
+        heapq.heappush(self._queue, (self.now + delay, next(self._seq), name, data, handler))
+
+    def schedule_at(self, time, name, data=None, handler=None):
+        if time < self.now:
+            raise ValueError("Cannot schedule an event in the past")
+        heapq.heappush(self._queue, (time, next(self._seq), name, data, handler))
+
+    def peek_time(self):
+        return self._queue[0][0] if self._queue else None
+
+    def step(self):
+        time, _, name, data, handler = heapq.heappop(self._queue)
+        self.now = time
+        self.processed += 1
+        if handler is None:
+            handler = self._handlers.get(name)
+        if handler is not None:
+            handler(self, data)
+        if self.record:
+            self.log.append(Event(time, name, data))
+        return time, name, data
+
+    def run(self, until=None, max_events=None):
+        # Process events in time order until the queue drains, the clock would
+        # pass `until`, or `max_events` have been handled. Returns the number
+        # of events processed by this call.
+        queue = self._queue
+        pop = heapq.heappop
+        handlers = self._handlers
+        log = self.log if self.record else None
+        processed = 0
+        while queue:
+            if until is not None and queue[0][0] > until:
+                break
+            if max_events is not None and processed >= max_events:
+                break
+            time, _, name, data, handler = pop(queue)
+            self.now = time
+            processed += 1
+            if handler is None:
+                handler = handlers.get(name)
+            if handler is not None:
+                handler(self, data)
+            if log is not None:
+                log.append(Event(time, name, data))
+        if until is not None and until > self.now and (not queue or queue[0][0] > until):
+            self.now = until
+        self.processed += processed
+        return processed
+
+    def drain_log(self):
+        # Hand the recorded events to a reader and start a fresh log
+        log, self.log = self.log, []
+        return log
+
+    def clear(self):
+        self._queue.clear()
+        self.log = []
+        self.now = 0.0
+        self.processed = 0
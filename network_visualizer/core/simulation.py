@@ -1,9 +1,31 @@
 # Network simulation logic
-from scapy.all import IP, TCP, UDP, ICMP
 import random
-from core.protocols import encapsulate_packet # Added import for encapsulate_packet
+import time
+from core.capture import LINKTYPE_ETHERNET, open_capture
+from core.link import SENT, QUEUE_DROP, build_links
+from core.codec import ICMP_ECHO_REPLY, ICMP_ECHO_REQUEST, IP_PROTO_NAMES, TCP_ACK, TCP_SYN, peek_ipv4
+from core.packet import POOL, address_fields
+from core.protocols import ENCRYPTED_PREFIX, scapy_layers
+from core.devices import Switch
+from core.mactable import mac_to_int
+from core.metrics import REGISTRY
+from core.scheduler import EventScheduler
+
+HOP_DELAY = 0.001 # Simulated one-way delay between logical steps, in seconds
+
+def post_steps(scheduler, steps, start=None, interval=HOP_DELAY):
+    # Queue logical steps on the scheduler, one interval apart, so a reader can
+    # pick them up from the event log in time order
+    if scheduler is None:
+        return
+    time = scheduler.now if start is None else start
+    for step in steps:
+        scheduler.schedule_at(time, step["event"], step)
+        time += interval
 
 def build_packet(message, protocol="TCP", dst_ip="192.168.1.1"):
+    # The only Scapy packet the simulation still builds
+    _, IP, TCP, UDP, ICMP = scapy_layers()
     if protocol == "TCP":
         pkt = IP(dst=dst_ip)/TCP(dport=80)/message
     elif protocol == "UDP":
@@ -14,61 +36,281 @@ def build_packet(message, protocol="TCP", dst_ip="192.168.1.1"):
         raise ValueError("Unsupported protocol")
     return pkt
 
-def simulate_tcp_handshake(client, server):
+STEP_KINDS = ("sent", "collision", "lost", "dropped") # A step's "kind": fixed values to label metrics by
+
+def _step(event, record, src, dst):
+    # A logical step carries its packet as a compact record; the header dicts
+    # for the OSI panel are only built if something reads step["headers"]
+    return {"event": event, "kind": "sent", "packet": record, "headers": record.layer_view(), "from": src.name, "to": dst.name, "length": record.length}
+
+def simulate_tcp_handshake(client, server, scheduler=None, start=None):
     handshake_steps = []
+    client_fields = address_fields(client.mac, "FF:FF:FF:FF:FF:FF", client.ip, server.ip) # Assuming broadcast to switch
+    server_fields = address_fields(server.mac, "FF:FF:FF:FF:FF:FF", server.ip, client.ip)
 
     # Step 1: Client sends SYN
-    syn_packet = client.send_syn(server.ip)
-    _, syn_headers = encapsulate_packet(str(syn_packet[TCP].payload), "TCP", 
-                                        src_mac=client.mac, dst_mac="FF:FF:FF:FF:FF:FF", # Assuming broadcast to switch
-                                        src_ip=client.ip, dst_ip=server.ip)
-    handshake_steps.append({"event": "Client sends SYN", "packet": syn_packet, "headers": syn_headers, "from": client.name, "to": server.name})
+    syn = POOL.acquire("TCP", *client_fields, flags=TCP_SYN)
+    handshake_steps.append(_step("Client sends SYN", syn, client, server))
 
     # Step 2: Server receives SYN, sends SYN-ACK
     # For simulation, we assume the server processes and responds
-    syn_ack_packet = IP(dst=client.ip)/TCP(dport=client.send_syn(server.ip).dport, sport=80, flags="SA", 
-                                          seq=random.randint(0, 0xFFFFFFFF), ack=syn_packet[TCP].seq + 1)
-    _, syn_ack_headers = encapsulate_packet(str(syn_ack_packet[TCP].payload), "TCP", 
-                                              src_mac=server.mac, dst_mac="FF:FF:FF:FF:FF:FF", # Assuming broadcast to switch
-                                              src_ip=server.ip, dst_ip=client.ip)
-    handshake_steps.append({"event": "Server sends SYN-ACK", "packet": syn_ack_packet, "headers": syn_ack_headers, "from": server.name, "to": client.name})
+    syn_ack = POOL.acquire("TCP", *server_fields, sport=syn.dport, dport=syn.sport, flags=TCP_SYN | TCP_ACK,
+                           seq=random.randint(0, 0xFFFFFFFF), ack=syn.seq + 1)
+    handshake_steps.append(_step("Server sends SYN-ACK", syn_ack, server, client))
 
     # Step 3: Client receives SYN-ACK, sends ACK
-    ack_packet = client.send_ack(server.ip, seq=syn_packet[TCP].seq + 1, ack=syn_ack_packet[TCP].seq + 1)
-    _, ack_headers = encapsulate_packet(str(ack_packet[TCP].payload), "TCP", 
-                                        src_mac=client.mac, dst_mac="FF:FF:FF:FF:FF:FF",
-                                        src_ip=client.ip, dst_ip=server.ip)
-    handshake_steps.append({"event": "Client sends ACK", "packet": ack_packet, "headers": ack_headers, "from": client.name, "to": server.name})
+    ack = POOL.acquire("TCP", *client_fields, flags=TCP_ACK, seq=syn.seq + 1, ack=(syn_ack.seq + 1) & 0xFFFFFFFF)
+    handshake_steps.append(_step("Client sends ACK", ack, client, server))
 
+    post_steps(scheduler, handshake_steps, start)
     return handshake_steps
 
-def simulate_icmp_ping(client, server):
+def simulate_icmp_ping(client, server, scheduler=None, start=None):
     ping_steps = []
 
     # Step 1: Client sends ICMP Echo Request
-    echo_request_packet = client.send_icmp_echo_request(server.ip)
-    _, echo_request_headers = encapsulate_packet(str(echo_request_packet[ICMP].payload), "ICMP", 
-                                                    src_mac=client.mac, dst_mac="FF:FF:FF:FF:FF:FF",
-                                                    src_ip=client.ip, dst_ip=server.ip)
-    ping_steps.append({"event": "Client sends ICMP Echo Request", "packet": echo_request_packet, "headers": echo_request_headers, "from": client.name, "to": server.name})
+    echo_request = POOL.acquire("ICMP", *address_fields(client.mac, "FF:FF:FF:FF:FF:FF", client.ip, server.ip), flags=ICMP_ECHO_REQUEST)
+    ping_steps.append(_step("Client sends ICMP Echo Request", echo_request, client, server))
 
     # Step 2: Server receives ICMP Echo Request, sends Echo Reply
-    echo_reply_packet = IP(dst=client.ip)/ICMP(type="echo-reply", id=echo_request_packet[ICMP].id, seq=echo_request_packet[ICMP].seq)
-    _, echo_reply_headers = encapsulate_packet(str(echo_reply_packet[ICMP].payload), "ICMP", 
-                                                  src_mac=server.mac, dst_mac="FF:FF:FF:FF:FF:FF",
-                                                  src_ip=server.ip, dst_ip=client.ip)
-    ping_steps.append({"event": "Server sends ICMP Echo Reply", "packet": echo_reply_packet, "headers": echo_reply_headers, "from": server.name, "to": client.name})
+    echo_reply = POOL.acquire("ICMP", *address_fields(server.mac, "FF:FF:FF:FF:FF:FF", server.ip, client.ip),
+                              sport=echo_request.sport, dport=echo_request.dport, flags=ICMP_ECHO_REPLY)
+    ping_steps.append(_step("Server sends ICMP Echo Reply", echo_reply, server, client))
 
+    post_steps(scheduler, ping_steps, start)
     return ping_steps
 
-def simulate_packet_loss(packet):
-    if random.random() < 0.2: # 20% chance of packet loss
-        print("Packet lost!")
+def simulate_packet_loss(packet, channel, scheduler=None):
+    # Draws the link's loss model once; returns None when the packet is lost
+    if channel.loss is not None and channel.loss.lost(channel.stream):
+        channel.lost += 1
+        post_steps(scheduler, [{"event": "Packet Lost!", "kind": "lost", "headers": [{"layer": "Simulation", "data": "Packet Lost!"}]}])
         return None
     return packet
 
-def simulate_collision():
-    if random.random() < 0.3: # 30% chance of collision
-        print("Collision detected!")
-        return True
-    return False
+def simulate_collision(channel, length, scheduler=None):
+    # Contends for the link with CSMA/CD at the scheduler's current time and
+    # posts a step per collision; returns (end of transmission or None after
+    # too many collisions, collisions)
+    now = scheduler.now if scheduler is not None else 0.0
+    end, collisions = channel.mac.access(now, length, channel.stream)
+    steps = [{"event": f"Collision Detected! Backing off (attempt {attempt})", "kind": "collision",
+              "headers": [{"layer": "Simulation", "data": f"Collision Detected! Backing off (attempt {attempt})"}]}
+             for attempt in range(1, collisions + 1)]
+    if end is None:
+        channel.lost += 1
+        steps.append({"event": "Excessive Collisions! Frame Dropped", "kind": "dropped", "headers": [{"layer": "Simulation", "data": "Excessive Collisions! Frame Dropped"}]})
+    post_steps(scheduler, steps)
+    return end, collisions
+
+def run_scenario(topology, flows, seed=None, duration=None, scheduler=None, links=None, trace=None):
+    # Headless run of traffic flows over a topology. Each flow is a dict with
+    # "src", "dst" and optional "protocol", "count", "interval", "start" and
+    # "message"; returns one statistics dict per flow. Pass a scheduler and
+    # links to share the run with other traffic (e.g. core.tcp transfers),
+    # and a core.trace.TraceRecorder on those links to record it.
+    if seed is not None:
+        random.seed(seed)
+    if scheduler is None:
+        scheduler = EventScheduler(record=False)
+    if links is None:
+        links = build_links(topology, seed)
+    states = start_flows(topology, flows, scheduler, links, trace)
+    scheduler.run(until=duration)
+    return [flow_statistics(state) for state in states]
+
+def start_flows(topology, flows, scheduler, links, trace=None):
+    # Schedules every packet of the flows and returns their flow states, for
+    # callers that drive the scheduler themselves. With a trace recorder, a
+    # snapshot of each flow's headers is recorded when it starts.
+    POOL.new_arena() # Payloads of earlier runs go away with their records
+    states = []
+    for flow_id, flow in enumerate(flows):
+        state = new_flow_state(topology, links, flow_id, flow["src"], flow["dst"], flow.get("protocol", "UDP"), flow.get("message", "Hello Server"))
+        if state is None:
+            raise ValueError(f"No path from {flow['src']} to {flow['dst']}")
+        state["deliver"] = state["drop"] = _release_packet # Packets are pooled records
+        states.append(state)
+        start, interval = flow.get("start", 0.0), flow.get("interval", HOP_DELAY)
+        if trace is not None:
+            scheduler.schedule_at(start, "headers", state, trace.flow_headers)
+        for i in range(flow.get("count", 1)):
+            scheduler.schedule_at(start + i * interval, "send", state, _send_flow_packet)
+    return states
+
+def new_flow_state(topology, links, flow_id, src_name, dst_name, protocol="UDP", message=""):
+    # Per-flow path, addressing and counters; None when dst is unreachable.
+    # `links` is the build_links list the flow's hops are sent over.
+    path = topology.path(src_name, dst_name)
+    if path is None or len(path) < 2:
+        return None
+    src, next_hop, dst = (topology.by_name[name] for name in (path[0], path[1], path[-1]))
+    state = {
+        "addresses": address_fields(src.mac, next_hop.mac, src.ip, dst.ip),
+        "payload": ENCRYPTED_PREFIX + message if protocol == "TCP" else message, # As encapsulate_packet frames it
+        "path_devices": [topology.by_name[name] for name in path],
+        "host_macs": (mac_to_int(src.mac), mac_to_int(dst.mac)),
+        "flow": flow_id, "src": src_name, "dst": dst_name, "protocol": protocol, "message": message, "path": path,
+        "hop_links": [_hop_link(topology, links, a, b) for a, b in zip(path, path[1:])],
+        "sent": 0, "delivered": 0, "lost": 0, "queue_drops": 0, "collisions": 0, "flooded": 0, "bytes": 0, "delivered_bytes": 0,
+        "latency_sum": 0.0, "latency_min": None, "latency_max": None, "first_send": None, "last_delivery": None,
+        "deliver": None, "drop": None,
+        "latency_histograms": (REGISTRY.histogram("flow_latency_seconds", "End-to-end packet latency", flow=flow_id, src=src_name, dst=dst_name, protocol=protocol),
+                               REGISTRY.histogram("device_delivery_latency_seconds", "Latency of packets delivered to a device", device=dst_name)),
+    }
+    if REGISTRY.enabled:
+        labels = {"flow": flow_id, "src": src_name, "dst": dst_name, "protocol": protocol}
+        for key, help in (("sent", "Packets sent"), ("delivered", "Packets delivered"), ("lost", "Packets lost or dropped"),
+                          ("queue_drops", "Packets dropped by a full queue"), ("bytes", "Bytes sent"), ("delivered_bytes", "Bytes delivered")):
+            REGISTRY.callback(f"flow_{key}_total", lambda key=key: state[key], help, **labels)
+    return state
+
+def _hop_link(topology, links, a, b):
+    link = links[topology.link_index(a, b)]
+    return link, link.direction(a)
+
+def _send_flow_packet(scheduler, state):
+    # The packet travels as a pooled record; its frame is never built
+    record = POOL.acquire(state["protocol"], *state["addresses"], payload=state["payload"])
+    transmit_segment(scheduler, state, record.length, record)
+
+def _release_packet(scheduler, record):
+    POOL.release(record)
+
+def transmit_flow_packet(scheduler, state, frame):
+    # Put an already built frame on the flow's first link at the current time
+    transmit_segment(scheduler, state, len(frame))
+
+def transmit_segment(scheduler, state, length, segment=None):
+    # Send `length` bytes along the flow's path. A segment other than None is
+    # handed to state["deliver"](scheduler, segment) when it arrives, and to
+    # state["drop"] (if set) when it is lost; this is how transport models
+    # (core.tcp) and pooled packet records ride on a flow's path.
+    state["sent"] += 1
+    state["bytes"] += length
+    if state["first_send"] is None:
+        state["first_send"] = scheduler.now
+    if REGISTRY.timing:
+        # Tested inline like Router.route_packet: this runs for every packet
+        with REGISTRY.span("send"):
+            _transmit_hop(scheduler, state, scheduler.now, 0, length, segment)
+        return
+    _transmit_hop(scheduler, state, scheduler.now, 0, length, segment)
+
+def _transmit_hop(scheduler, state, sent_time, hop, length, segment):
+    # Hand the frame to the hop's link, which queues, serializes and delivers
+    # it to the next device (or reports the drop) through _forward_flow_packet
+    link, direction = state["hop_links"][hop]
+    link.send(scheduler, direction, length, (state, sent_time, hop + 1, length, segment), _forward_flow_packet, state["flow"])
+
+def _forward_flow_packet(scheduler, packet):
+    # Link callback for every hop of every packet; timed as span "forward"
+    if REGISTRY.timing:
+        with REGISTRY.span("forward"):
+            _forward_hop(scheduler, packet)
+        return
+    _forward_hop(scheduler, packet)
+
+def _forward_hop(scheduler, packet):
+    (state, sent_time, hop, length, segment), outcome, collisions = packet
+    state["collisions"] += collisions
+    if outcome != SENT:
+        state["lost"] += 1
+        if outcome == QUEUE_DROP:
+            state["queue_drops"] += 1
+        if segment is not None and state["drop"] is not None:
+            state["drop"](scheduler, segment)
+        return
+    device = state["path_devices"][hop]
+    if isinstance(device, Switch):
+        # Learning bridge: learn the source host on the ingress port, flood if the destination is unknown
+        src_mac, dst_mac = state["host_macs"]
+        if isinstance(device.switch_frame(src_mac, dst_mac, state["path"][hop - 1], scheduler.now), tuple):
+            state["flooded"] += 1
+    if hop < len(state["hop_links"]):
+        _transmit_hop(scheduler, state, sent_time, hop, length, segment)
+        return
+    latency = scheduler.now - sent_time
+    state["delivered"] += 1
+    state["delivered_bytes"] += length
+    state["latency_sum"] += latency
+    state["latency_min"] = latency if state["latency_min"] is None else min(state["latency_min"], latency)
+    state["latency_max"] = latency if state["latency_max"] is None else max(state["latency_max"], latency)
+    state["last_delivery"] = scheduler.now
+    flow_histogram, device_histogram = state["latency_histograms"]
+    flow_histogram.record(latency)
+    device_histogram.record(latency)
+    if segment is not None:
+        state["deliver"](scheduler, segment)
+
+def flow_statistics(state):
+    delivered = state["delivered"]
+    elapsed = (state["last_delivery"] - state["first_send"]) if delivered else 0.0
+    return {
+        "flow": state["flow"], "src": state["src"], "dst": state["dst"], "protocol": state["protocol"],
+        "hops": len(state["path"]) - 1, "sent": state["sent"], "delivered": delivered,
+        "lost": state["lost"], "queue_drops": state["queue_drops"], "collisions": state["collisions"], "flooded": state["flooded"], "bytes": state["bytes"],
+        "loss_rate": state["lost"] / state["sent"] if state["sent"] else 0.0,
+        "latency_mean": state["latency_sum"] / delivered if delivered else None,
+        "latency_min": state["latency_min"], "latency_max": state["latency_max"],
+        "throughput_bps": 8 * state["delivered_bytes"] / elapsed if elapsed > 0 else None,
+    }
+
+def replay_capture(topology, path, realtime=False, speed=1.0, seed=None, scheduler=None, links=None):
+    # Replays a pcap/pcapng file through the device model. Capture timestamps
+    # (relative to the first frame) drive the simulation clock; with realtime
+    # the replay is also paced to wall-clock time divided by `speed`,
+    # otherwise it runs as fast as possible. Frames are read straight from the
+    # mapped file and only their IPv4 addresses are parsed; IPv4 frames between
+    # two addresses known to the topology follow its path, the rest are counted.
+    if seed is not None:
+        random.seed(seed)
+    if scheduler is None:
+        scheduler = EventScheduler(record=False)
+    if links is None:
+        links = build_links(topology, seed)
+    summary = {"frames": 0, "bytes": 0, "replayed": 0, "non_ipv4": 0, "unmatched": 0, "duration": 0.0}
+    flows = {} # (src IP, dst IP, protocol) -> flow state, or None when not replayed
+    replayed = [] # Flow states in flow id order
+    first_timestamp = None
+    wall_start = time.perf_counter()
+    with open_capture(path) as capture:
+        for timestamp, frame, linktype in capture:
+            summary["frames"] += 1
+            summary["bytes"] += len(frame)
+            if timestamp is None:
+                now = scheduler.now # No timestamp: deliver in file order
+            else:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                now = max(timestamp - first_timestamp, scheduler.now)
+            if realtime:
+                delay = wall_start + now / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            scheduler.run(until=now)
+            endpoints = peek_ipv4(frame) if linktype == LINKTYPE_ETHERNET else None
+            if endpoints is None:
+                summary["non_ipv4"] += 1
+                continue
+            src_ip, dst_ip, proto = endpoints
+            key = (src_ip, dst_ip, proto)
+            if key in flows:
+                state = flows[key]
+            else:
+                # Replayed flows are numbered in order of appearance; unmatched
+                # keys are remembered as None and take no number
+                src, dst = topology.ip_index.get(src_ip), topology.ip_index.get(dst_ip)
+                state = new_flow_state(topology, links, len(replayed), src, dst, IP_PROTO_NAMES.get(proto, str(proto)).upper()) if src and dst and src != dst else None
+                flows[key] = state
+                if state is not None:
+                    replayed.append(state)
+            if state is None:
+                summary["unmatched"] += 1
+                continue
+            summary["replayed"] += 1
+            transmit_flow_packet(scheduler, state, frame)
+    scheduler.run()
+    summary["duration"] = scheduler.now
+    summary["flows"] = [flow_statistics(state) for state in replayed]
+    return summary
@@ -0,0 +1,430 @@
+# TCP connection model: handshake, sliding window, retransmission timers and congestion control
+from core.codec import ETHER_LEN, IPV4_LEN, TCP_LEN
+from core.channel import BernoulliLoss
+from core.link import build_links
+from core.scheduler import EventScheduler
+from core.simulation import new_flow_state, transmit_segment
+
+CLOSED, LISTEN, SYN_SENT, SYN_RECEIVED, ESTABLISHED, FIN_WAIT_1, FIN_WAIT_2, CLOSE_WAIT, LAST_ACK, TIME_WAIT = range(10)
+STATE_NAMES = ("CLOSED", "LISTEN", "SYN_SENT", "SYN_RECEIVED", "ESTABLISHED",
+               "FIN_WAIT_1", "FIN_WAIT_2", "CLOSE_WAIT", "LAST_ACK", "TIME_WAIT")
+
+FIN, SYN, ACK = 0x01, 0x02, 0x10 # Same bit values as the TCP header flags
+HEADER_BYTES = ETHER_LEN + IPV4_LEN + TCP_LEN # On-the-wire overhead per segment
+DEFAULT_MSS = 1460
+DEFAULT_WINDOW = 65535 # Receive window advertised by the passive end
+INITIAL_WINDOW = 10 # Segments (RFC 6928)
+INITIAL_RTO = 1.0
+MIN_RTO = 0.2
+MAX_RTO = 60.0
+DUPACK_THRESHOLD = 3
+
+class Reno:
+    # Slow start, additive increase and NewReno fast recovery (RFC 5681/6582)
+    name = "reno"
+
+    def on_ack(self, conn, acked, now):
+        if conn.cwnd < conn.ssthresh:
+            conn.cwnd += min(acked, conn.mss)
+        else:
+            conn.cwnd += conn.mss * conn.mss / conn.cwnd
+
+    def on_loss(self, conn, now):
+        conn.ssthresh = max((conn.snd_nxt - conn.snd_una) / 2, 2 * conn.mss)
+
+class Cubic(Reno):
+    # RFC 8312 window growth, in segments, with fast convergence and the
+    # TCP-friendly region; recovery is the same as Reno's
+    name = "cubic"
+    C = 0.4
+    BETA = 0.7
+
+    def on_ack(self, conn, acked, now):
+        if conn.cwnd < conn.ssthresh:
+            conn.cwnd += min(acked, conn.mss)
+            return
+        mss = conn.mss
+        cwnd = conn.cwnd / mss
+        if conn.epoch is None:
+            conn.epoch = now
+            if cwnd < conn.w_max:
+                conn.k = ((conn.w_max - cwnd) / self.C) ** (1 / 3)
+                conn.origin = conn.w_max
+            else:
+                conn.k = 0.0
+                conn.origin = cwnd
+            conn.w_est = cwnd
+        t = now - conn.epoch + (conn.srtt or 0.0)
+        target = conn.origin + self.C * (t - conn.k) ** 3
+        conn.w_est += 3 * (1 - self.BETA) / (1 + self.BETA) * (acked / mss) / cwnd
+        target = max(target, conn.w_est)
+        if target > cwnd:
+            conn.cwnd += mss * (target - cwnd) / cwnd * (acked / mss)
+        else:
+            conn.cwnd += mss * 0.01 / cwnd * (acked / mss)
+
+    def on_loss(self, conn, now):
+        cwnd = conn.cwnd / conn.mss
+        conn.w_max = cwnd * (1 + self.BETA) / 2 if cwnd < conn.w_max else cwnd
+        conn.ssthresh = max(conn.cwnd * self.BETA, 2 * conn.mss)
+        conn.epoch = None
+
+CONGESTION_CONTROL = {"reno": Reno(), "cubic": Cubic()}
+
+class TcpConnection:
+    # Both ends of one bulk transfer of `size` bytes. The active end sends the
+    # data; the passive end acknowledges it and closes as soon as it sees the
+    # FIN. Sequence numbers are relative to an ISS of 0 on both sides (the
+    # SYN takes seq 0, data runs from 1 to size and the FIN follows) and do
+    # not wrap. Slots keep a connection at a few hundred bytes so 100k of
+    # them fit comfortably in memory.
+    __slots__ = ("id", "forward", "reverse", "cc", "size", "mss", "rwnd",
+                 "state", "snd_una", "snd_nxt", "snd_max", "cwnd", "ssthresh", "dupacks", "recover", "in_recovery",
+                 "srtt", "rttvar", "rto", "rtt_seq", "rtt_time", "timer", "timer_armed",
+                 "w_max", "epoch", "k", "origin", "w_est",
+                 "peer_state", "rcv_nxt", "out_of_order",
+                 "segments", "retransmits", "fast_retransmits", "timeouts", "started", "established", "finished")
+
+    def __init__(self, conn_id, forward, reverse, size, algorithm="reno", mss=DEFAULT_MSS, rwnd=DEFAULT_WINDOW):
+        if algorithm not in CONGESTION_CONTROL:
+            raise ValueError(f"Unknown congestion control {algorithm!r}")
+        self.id = conn_id
+        self.forward = forward # Flow state of the data direction
+        self.reverse = reverse # Flow state of the ACK direction
+        self.cc = CONGESTION_CONTROL[algorithm]
+        self.size = size
+        self.mss = mss
+        self.rwnd = rwnd
+        self.state = CLOSED
+        self.snd_una = self.snd_nxt = self.snd_max = 0
+        self.cwnd = float(INITIAL_WINDOW * mss)
+        self.ssthresh = float("inf")
+        self.dupacks = 0
+        self.recover = 0
+        self.in_recovery = False
+        self.srtt = self.rttvar = None
+        self.rto = INITIAL_RTO
+        self.rtt_seq = self.rtt_time = None
+        self.timer = 0 # Generation of the armed retransmission timer
+        self.timer_armed = False
+        self.w_max = 0.0
+        self.epoch = None
+        self.k = self.origin = self.w_est = 0.0
+        self.peer_state = LISTEN
+        self.rcv_nxt = 0
+        self.out_of_order = None # {seq: length}, only allocated once a hole appears
+        self.segments = self.retransmits = self.fast_retransmits = self.timeouts = 0
+        self.started = self.established = self.finished = None
+
+    @property
+    def data_end(self):
+        return 1 + self.size # Sequence number of the FIN
+
+    @property
+    def delivered(self):
+        # In-order bytes handed to the receiving application
+        return min(max(self.rcv_nxt - 1, 0), self.size)
+
+    # Active (sending) end
+
+    def open(self, scheduler):
+        self.started = scheduler.now
+        self.state = SYN_SENT
+        self.snd_nxt = self.snd_max = 1
+        self.rtt_seq, self.rtt_time = 1, scheduler.now
+        self._send(scheduler, SYN, 0, 0, 0, self.forward)
+        self._arm(scheduler)
+
+    def _send(self, scheduler, flags, seq, ack, length, direction):
+        self.segments += 1
+        transmit_segment(scheduler, direction, HEADER_BYTES + length, (self, flags, seq, ack, length, direction is self.forward))
+
+    def _send_data(self, scheduler, seq):
+        length = min(self.mss, self.data_end - seq)
+        if seq < self.snd_max:
+            self.retransmits += 1
+        self._send(scheduler, ACK, seq, 1, length, self.forward)
+        return length
+
+    def _send_fin(self, scheduler):
+        if self.data_end < self.snd_max:
+            self.retransmits += 1
+        self._send(scheduler, FIN | ACK, self.data_end, 1, 0, self.forward)
+
+    def _retransmit_first(self, scheduler):
+        if self.snd_una < self.data_end:
+            self._send_data(scheduler, self.snd_una)
+        else:
+            self._send_fin(scheduler)
+
+    def _fill_window(self, scheduler):
+        # Send new segments while the smaller of cwnd and rwnd allows, then
+        # the FIN once every data byte has been sent
+        if self.state not in (ESTABLISHED, FIN_WAIT_1):
+            return
+        window = min(self.cwnd, self.rwnd)
+        while self.snd_nxt < self.data_end:
+            length = min(self.mss, self.data_end - self.snd_nxt)
+            if self.snd_nxt - self.snd_una + length > window:
+                break
+            if self.rtt_seq is None and self.snd_nxt >= self.snd_max:
+                self.rtt_seq, self.rtt_time = self.snd_nxt + length, scheduler.now # Karn: only time new data
+            self._send_data(scheduler, self.snd_nxt)
+            self.snd_nxt += length
+        if self.snd_nxt == self.data_end:
+            self._send_fin(scheduler)
+            self.snd_nxt += 1
+            self.state = FIN_WAIT_1
+        self.snd_max = max(self.snd_max, self.snd_nxt)
+        if self.snd_nxt > self.snd_una and not self.timer_armed:
+            self._arm(scheduler)
+
+    def _arm(self, scheduler):
+        self.timer += 1
+        self.timer_armed = True
+        scheduler.schedule(self.rto, "rto", (self, self.timer), _on_timeout)
+
+    def _disarm(self):
+        self.timer += 1
+        self.timer_armed = False
+
+    def _sample_rtt(self, rtt):
+        # RFC 6298 smoothing
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max(self.srtt + 4 * self.rttvar, MIN_RTO), MAX_RTO)
+
+    def timeout(self, scheduler):
+        self.timer_armed = False
+        if self.state in (CLOSED, TIME_WAIT):
+            return
+        self.timeouts += 1
+        self.rto = min(self.rto * 2, MAX_RTO)
+        self.rtt_seq = None
+        if self.state == SYN_SENT:
+            self.retransmits += 1
+            self._send(scheduler, SYN, 0, 0, 0, self.forward)
+            self._arm(scheduler)
+            return
+        # Go back to the first unacknowledged byte with a one-segment window
+        self.cc.on_loss(self, scheduler.now)
+        self.cwnd = float(self.mss)
+        self.in_recovery = False
+        self.dupacks = 0
+        self.snd_nxt = self.snd_una
+        if self.state == FIN_WAIT_1 and self.snd_una < self.data_end:
+            self.state = ESTABLISHED # FIN goes out again after the data
+        if self.snd_una == self.data_end:
+            self._send_fin(scheduler)
+            self.snd_nxt = self.data_end + 1
+            self._arm(scheduler)
+        else:
+            self._fill_window(scheduler)
+
+    def sender_input(self, scheduler, flags, seq, ack, length):
+        now = scheduler.now
+        if self.state == SYN_SENT:
+            if flags & SYN and flags & ACK and ack == 1:
+                self.snd_una = 1
+                self.state = ESTABLISHED
+                self.established = now
+                if self.rtt_seq is not None:
+                    self._sample_rtt(now - self.rtt_time)
+                    self.rtt_seq = None
+                self._disarm()
+                self._send(scheduler, ACK, 1, 1, 0, self.forward)
+                self._fill_window(scheduler)
+            return
+        if flags & FIN:
+            # Peer's FIN (with the ACK of ours): acknowledge it and finish
+            if ack == self.data_end + 1:
+                self.snd_una = ack
+                if self.state != TIME_WAIT:
+                    self.state = TIME_WAIT
+                    self.finished = now
+                    self._disarm()
+                self._send(scheduler, ACK, ack, seq + 1, 0, self.forward)
+            return
+        if self.state not in (ESTABLISHED, FIN_WAIT_1):
+            return
+        if ack > self.snd_una:
+            acked = ack - self.snd_una
+            self.snd_una = ack
+            self.snd_nxt = max(self.snd_nxt, ack)
+            if self.rtt_seq is not None and ack >= self.rtt_seq:
+                self._sample_rtt(now - self.rtt_time)
+                self.rtt_seq = None
+            if self.in_recovery:
+                if ack >= self.recover:
+                    self.in_recovery = False
+                    self.cwnd = self.ssthresh
+                else:
+                    # Partial ACK: retransmit the next hole and deflate
+                    self._retransmit_first(scheduler)
+                    self.cwnd = max(self.cwnd - acked + self.mss, float(self.mss))
+            else:
+                self.cc.on_ack(self, acked, now)
+            self.dupacks = 0
+            if ack == self.data_end + 1:
+                self.state = FIN_WAIT_2 # Also after a timeout had reopened the data phase
+            self._disarm()
+            if self.snd_nxt > self.snd_una:
+                self._arm(scheduler)
+        elif ack == self.snd_una and length == 0 and not flags & SYN and self.snd_nxt > self.snd_una:
+            self.dupacks += 1
+            if self.dupacks == DUPACK_THRESHOLD and not self.in_recovery:
+                self.cc.on_loss(self, now)
+                self.recover = self.snd_nxt
+                self.in_recovery = True
+                self.fast_retransmits += 1
+                self.rtt_seq = None
+                self._retransmit_first(scheduler)
+                self.cwnd = self.ssthresh + DUPACK_THRESHOLD * self.mss
+            elif self.in_recovery:
+                self.cwnd += self.mss # Window inflation per further duplicate
+        self._fill_window(scheduler)
+
+    # Passive (receiving) end
+
+    def receiver_input(self, scheduler, flags, seq, ack, length):
+        if flags & SYN:
+            if self.peer_state in (LISTEN, SYN_RECEIVED):
+                self.peer_state = SYN_RECEIVED
+                self.rcv_nxt = 1
+                self._send(scheduler, SYN | ACK, 0, 1, 0, self.reverse)
+            return
+        if self.peer_state == SYN_RECEIVED and flags & ACK:
+            self.peer_state = ESTABLISHED
+        if self.peer_state == LAST_ACK:
+            if flags & FIN or length:
+                self._send(scheduler, FIN | ACK, 1, self.rcv_nxt, 0, self.reverse) # Our FIN+ACK was lost
+            elif ack == 2:
+                self.peer_state = CLOSED
+            return
+        if self.peer_state == CLOSED:
+            return
+        if length:
+            self._receive_data(seq, length)
+        if flags & FIN and seq == self.rcv_nxt:
+            # Passive close: acknowledge the FIN and send ours at once
+            self.rcv_nxt += 1
+            self.peer_state = LAST_ACK
+            self._send(scheduler, FIN | ACK, 1, self.rcv_nxt, 0, self.reverse)
+            return
+        if length or flags & FIN:
+            self._send(scheduler, ACK, 1, self.rcv_nxt, 0, self.reverse)
+
+    def _receive_data(self, seq, length):
+        if seq == self.rcv_nxt:
+            self.rcv_nxt += length
+            pending = self.out_of_order
+            while pending and self.rcv_nxt in pending:
+                self.rcv_nxt += pending.pop(self.rcv_nxt)
+            if pending is not None and not pending:
+                self.out_of_order = None
+        elif self.rcv_nxt < seq < self.rcv_nxt + self.rwnd:
+            if self.out_of_order is None:
+                self.out_of_order = {}
+            self.out_of_order[seq] = length
+
+def _on_timeout(scheduler, data):
+    conn, generation = data
+    if generation == conn.timer:
+        conn.timeout(scheduler)
+
+def _on_open(scheduler, conn):
+    conn.open(scheduler)
+
+def _deliver(scheduler, segment):
+    conn, flags, seq, ack, length, to_receiver = segment
+    if to_receiver:
+        conn.receiver_input(scheduler, flags, seq, ack, length)
+    else:
+        conn.sender_input(scheduler, flags, seq, ack, length)
+
+def connection_statistics(conn):
+    duration = conn.finished - conn.started if conn.finished is not None else None
+    return {
+        "connection": conn.id, "src": conn.forward["src"], "dst": conn.forward["dst"], "algorithm": conn.cc.name,
+        "size": conn.size, "delivered": conn.delivered, "state": STATE_NAMES[conn.state], "peer_state": STATE_NAMES[conn.peer_state],
+        "segments": conn.segments, "retransmits": conn.retransmits, "fast_retransmits": conn.fast_retransmits,
+        "timeouts": conn.timeouts, "srtt": conn.srtt, "duration": duration,
+        "goodput_bps": 8 * conn.delivered / duration if duration else None,
+    }
+
+class TransferSet:
+    # Opens TCP bulk transfers on a topology. Connections between the same
+    # pair of devices share one flow state per direction, so per-connection
+    # memory is just the TcpConnection. Their flow ids start at `first_flow`:
+    # when transfers share a run with scenario flows (numbered from 0), pass
+    # the number of flows so metrics and traces can tell them apart.
+    def __init__(self, topology, scheduler, links, first_flow=0):
+        self.topology = topology
+        self.scheduler = scheduler
+        self.links = links
+        self.connections = []
+        self.first_flow = first_flow
+        self._paths = {}
+
+    def _path_state(self, src, dst):
+        key = (src, dst)
+        state = self._paths.get(key)
+        if state is None:
+            state = new_flow_state(self.topology, self.links, self.first_flow + len(self._paths), src, dst, "TCP")
+            if state is None:
+                raise ValueError(f"No path from {src} to {dst}")
+            state["deliver"] = _deliver
+            self._paths[key] = state
+        return state
+
+    def open(self, src, dst, size, start=0.0, algorithm="reno", mss=DEFAULT_MSS, rwnd=DEFAULT_WINDOW):
+        forward = self._path_state(src, dst)
+        reverse = self._path_state(dst, src)
+        conn = TcpConnection(len(self.connections), forward, reverse, size, algorithm, mss, rwnd)
+        self.connections.append(conn)
+        self.scheduler.schedule_at(max(start, self.scheduler.now), "tcp_open", conn, _on_open)
+        return conn
+
+    def add(self, transfer):
+        # Opens a transfer described by a scenario record: "src", "dst",
+        # "bytes" and optional "start", "algorithm" ("reno" or "cubic"),
+        # "mss" and "window"
+        return self.open(transfer["src"], transfer["dst"], transfer["bytes"], transfer.get("start", 0.0),
+                         transfer.get("algorithm", "reno"), transfer.get("mss", DEFAULT_MSS), transfer.get("window", DEFAULT_WINDOW))
+
+    def statistics(self):
+        return [connection_statistics(conn) for conn in self.connections]
+
+def run_transfers(topology, transfers, seed=None, duration=None, scheduler=None, links=None):
+    # Headless run of TCP bulk transfers (records as for TransferSet.add);
+    # returns one statistics dict per connection
+    if scheduler is None:
+        scheduler = EventScheduler(record=False)
+    if links is None:
+        links = build_links(topology, seed)
+    transfer_set = TransferSet(topology, scheduler, links)
+    for transfer in transfers:
+        transfer_set.add(transfer)
+    scheduler.run(until=duration)
+    return transfer_set.statistics()
+
+def goodput_sweep(topology, src, dst, loss_rates, size=1000000, algorithm="reno", seed=0, duration=None):
+    # Goodput of one transfer from src to dst with Bernoulli loss at each rate
+    # on every link of the path (in both directions, so ACKs are lost too).
+    # Other link attributes are kept; returns one statistics dict per rate.
+    path = topology.path(src, dst)
+    if path is None:
+        raise ValueError(f"No path from {src} to {dst}")
+    results = []
+    for rate in loss_rates:
+        links = build_links(topology, seed)
+        for a, b in zip(path, path[1:]):
+            links[topology.link_index(a, b)].channel.loss = BernoulliLoss(rate) if rate else None
+        row = run_transfers(topology, [{"src": src, "dst": dst, "bytes": size, "algorithm": algorithm}],
+                            duration=duration, links=links)[0]
+        row["loss"] = rate
+        results.append(row)
+    return results
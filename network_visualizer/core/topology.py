@@ -0,0 +1,249 @@
+# Topology loading
+import json
+import os
+import xml.etree.ElementTree as ET
+from array import array
+from core.devices import Client, Switch, Router, Server, Device
+from core.paths import PathService
+
+DEVICE_TYPES = {"client": Client, "switch": Switch, "router": Router, "server": Server, "device": Device}
+DEVICE_OPTIONS = {Switch: ("cam_size", "aging_time")} # Extra constructor arguments read from device records
+
+class Topology:
+    # Devices are numbered in insertion order. Adjacency is kept as CSR arrays
+    # (per-device offsets into flat neighbour and link-index arrays), rebuilt
+    # lazily after links are added. IPs and MACs are indexed in dicts so
+    # duplicates are rejected in O(1) per device.
+    def __init__(self):
+        self.devices = []
+        self.by_name = {}
+        self.index = {} # name -> device number
+        self.ip_index = {}
+        self.mac_index = {}
+        self.links = [] # (device_a, device_b, attrs)
+        self._link_a = array("i")
+        self._link_b = array("i")
+        self._offsets = None
+        self._neighbors = None
+        self._neighbor_links = None
+        self._paths = None
+
+    def __len__(self):
+        return len(self.devices)
+
+    def add_device(self, device):
+        if device.name in self.by_name:
+            raise ValueError(f"Duplicate device name: {device.name}")
+        if device.ip in self.ip_index:
+            raise ValueError(f"Duplicate IP {device.ip}: {device.name} and {self.ip_index[device.ip]}")
+        mac = device.mac.lower()
+        if mac in self.mac_index:
+            raise ValueError(f"Duplicate MAC {device.mac}: {device.name} and {self.mac_index[mac]}")
+        self.ip_index[device.ip] = device.name
+        self.mac_index[mac] = device.name
+        self.index[device.name] = len(self.devices)
+        self.devices.append(device)
+        self.by_name[device.name] = device
+        self._offsets = None
+        self._paths = None
+        return device
+
+    def add_link(self, a, b, **attrs):
+        a = self.by_name[a] if isinstance(a, str) else a
+        b = self.by_name[b] if isinstance(b, str) else b
+        self.links.append((a, b, attrs))
+        self._link_a.append(self.index[a.name])
+        self._link_b.append(self.index[b.name])
+        self._offsets = None
+        self._paths = None
+
+    def _build_adjacency(self):
+        # Counting sort of both link directions into CSR form
+        count = len(self.devices)
+        degree = array("i", bytes(4 * (count + 1)))
+        for a, b in zip(self._link_a, self._link_b):
+            degree[a + 1] += 1
+            degree[b + 1] += 1
+        for i in range(count):
+            degree[i + 1] += degree[i]
+        offsets = degree
+        fill = array("i", offsets[:-1])
+        neighbors = array("i", bytes(4 * offsets[-1]))
+        neighbor_links = array("i", bytes(4 * offsets[-1]))
+        for link, (a, b) in enumerate(zip(self._link_a, self._link_b)):
+            neighbors[fill[a]] = b
+            neighbor_links[fill[a]] = link
+            fill[a] += 1
+            neighbors[fill[b]] = a
+            neighbor_links[fill[b]] = link
+            fill[b] += 1
+        self._offsets, self._neighbors, self._neighbor_links = offsets, neighbors, neighbor_links
+
+    def adjacency(self):
+        # (offsets, neighbors, neighbor_links) CSR arrays
+        if self._offsets is None:
+            self._build_adjacency()
+        return self._offsets, self._neighbors, self._neighbor_links
+
+    def neighbors(self, name):
+        offsets, neighbors, _ = self.adjacency()
+        i = self.index[name]
+        return [self.devices[j].name for j in neighbors[offsets[i]:offsets[i + 1]]]
+
+    def devices_of_type(self, cls):
+        return [device for device in self.devices if isinstance(device, cls)]
+
+    def connections(self):
+        # (a, b, attrs) tuples in the form NetworkVisualizer accepts
+        return list(self.links)
+
+    def link_index(self, a, b):
+        # Position in self.links of the link between two device names
+        offsets, neighbors, neighbor_links = self.adjacency()
+        i, j = self.index[a], self.index[b]
+        for k in range(offsets[i], offsets[i + 1]):
+            if neighbors[k] == j:
+                return neighbor_links[k]
+        raise KeyError(f"No link between {a} and {b}")
+
+    def link_attrs(self, a, b):
+        return self.links[self.link_index(a, b)][2]
+
+    @property
+    def paths(self):
+        # Shared next-hop tables; recreated whenever devices or links are added
+        if self._paths is None:
+            self._paths = PathService(self)
+        return self._paths
+
+    def path(self, src, dst):
+        # Least-cost path between two device names ("cost" link attribute, default 1)
+        return self.paths.path(src, dst)
+
+def _make_device(entry):
+    device_type = str(entry.get("type", "device")).lower()
+    if device_type not in DEVICE_TYPES:
+        raise ValueError(f"Unknown device type {entry.get('type')!r} for {entry.get('name')}")
+    cls = DEVICE_TYPES[device_type]
+    options = {key: entry[key] for key in DEVICE_OPTIONS.get(cls, ()) if key in entry}
+    return cls(entry["name"], entry["ip"], entry["mac"], **options)
+
+def build_topology(devices, links):
+    # Builds a Topology from iterables of device and link records, which may be
+    # generators reading a file
+    return _build_from_records(_chain_records(devices, links))
+
+def _chain_records(devices, links):
+    for entry in devices:
+        yield "device", entry
+    for entry in links:
+        yield "link", entry
+
+def _build_from_records(records):
+    # Consumes ("device" | "link", entry) records one at a time, so a reader
+    # that streams them keeps only the topology itself in memory. A link may
+    # come before its devices: from then on links are held until the end, so
+    # they keep their file order (link order seeds each link's randomness).
+    # Routes are resolved once every device exists.
+    topology = Topology()
+    routes = []
+    pending = [] # Links from the first one read before its devices on
+    for kind, entry in records:
+        if kind == "device":
+            device = topology.add_device(_make_device(entry))
+            if entry.get("routes"):
+                if not isinstance(device, Router):
+                    raise ValueError(f"Device {device.name} has routes but is not a router")
+                routes.append((device, entry["routes"]))
+        elif not pending and entry["a"] in topology.by_name and entry["b"] in topology.by_name:
+            _add_link(topology, entry)
+        else:
+            pending.append(entry)
+    for entry in pending:
+        for end in ("a", "b"):
+            if entry[end] not in topology.by_name:
+                raise ValueError(f"Link references unknown device {entry[end]!r}")
+        _add_link(topology, entry)
+    for switch in topology.devices_of_type(Switch):
+        switch.set_ports(topology.neighbors(switch.name))
+    for device, table in routes:
+        if isinstance(table, str):
+            table = json.loads(table)
+        for prefix, next_hop in table.items():
+            device.add_route(prefix, topology.by_name.get(next_hop, next_hop))
+    return topology
+
+def _add_link(topology, entry):
+    attrs = {key: value for key, value in entry.items() if key not in ("a", "b")}
+    topology.add_link(entry["a"], entry["b"], **attrs)
+
+# Readers yield ("device" | "link", entry) records. JSON Lines and GraphML
+# are read incrementally; JSON and YAML documents are parsed whole by their
+# parsers, so only the records, not the file, are streamed into the builder.
+
+def _record_kind(record):
+    # JSON Lines: each record is a device (has "name") or a link (has "a" and "b")
+    return "link" if "a" in record and "b" in record else "device"
+
+def _read_json(path):
+    with open(path) as f:
+        spec = json.load(f)
+    return _chain_records(spec.get("devices", []), spec.get("links", []))
+
+def _read_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield _record_kind(record), record
+
+def _read_yaml(path):
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError("Loading YAML topologies requires PyYAML") from None
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path) as f:
+        spec = yaml.load(f, Loader=loader) or {}
+    return _chain_records(spec.get("devices", []), spec.get("links", []))
+
+_GRAPHML_TYPES = {"int": int, "long": int, "float": float, "double": float, "boolean": lambda v: v.lower() == "true"}
+
+def _read_graphml(path):
+    # Streams the document with iterparse. Each node and edge is cleared and
+    # detached from its parent once read, so memory stays flat for large
+    # files. Node ids are device names.
+    keys = {}
+    parents = [] # Open elements; the last is the parent of an element that ends
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag == "key":
+            convert = _GRAPHML_TYPES.get(element.get("attr.type"), str)
+            keys[element.get("id")] = (element.get("attr.name") or element.get("id"), convert)
+        elif tag in ("node", "edge"):
+            record = {}
+            for data in element:
+                name, convert = keys.get(data.get("key"), (data.get("key"), str))
+                record[name] = convert(data.text or "")
+            if tag == "node":
+                record["name"] = element.get("id")
+                yield "device", record
+            else:
+                record["a"], record["b"] = element.get("source"), element.get("target")
+                yield "link", record
+            element.clear()
+            if parents:
+                parents[-1].remove(element)
+
+TOPOLOGY_READERS = {".json": _read_json, ".jsonl": _read_jsonl, ".ndjson": _read_jsonl,
+                    ".yaml": _read_yaml, ".yml": _read_yaml, ".graphml": _read_graphml}
+
+def load_topology(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in TOPOLOGY_READERS:
+        raise ValueError(f"Unsupported topology format: {path}")
+    return _build_from_records(TOPOLOGY_READERS[extension](path))
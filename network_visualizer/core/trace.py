@@ -0,0 +1,257 @@
+# Append-only columnar trace files: recording a run and seeking through it
+import json
+import mmap
+import struct
+import numpy as np
+from core.packet import POOL
+
+CHUNK_EVENTS = 1 << 16 # Events buffered in memory before a chunk is appended
+HOP, ENQUEUE, DROP, COLLISION, HEADERS = range(5)
+KIND_NAMES = ("hop", "enqueue", "drop", "collision", "headers")
+
+# time: when the event happened (a hop's departure); until: a hop's arrival;
+# value: queue occupancy for enqueue, the link outcome for drop, the number
+# of collisions for collision. Device and link columns are indexes into the
+# names in the file header, -1 when not applicable.
+COLUMNS = (("time", "<f8"), ("until", "<f8"), ("flow", "<i4"), ("link", "<i4"), ("src", "<i4"),
+           ("dst", "<i4"), ("length", "<u4"), ("value", "<i4"), ("kind", "u1"))
+ROW_DTYPE = np.dtype(list(COLUMNS))
+_FILE_MAGIC = b"NVTRACE1"
+_CHUNK_MAGIC = b"NVTC"
+_FILE_HEADER = struct.Struct("<8sI")
+_CHUNK_HEADER = struct.Struct("<4sIIIdddd") # magic, events, text bytes, snapshots, first time, last time, last arrival, longest hop
+
+def _padded(size):
+    return (size + 7) & ~7
+
+def _pad(data):
+    return data + bytes(_padded(len(data)) - len(data))
+
+class TraceRecorder:
+    # Records one run to `path`, replacing any file there. The file starts
+    # with a JSON header naming the devices and links; events are then
+    # appended in chunks of CHUNK_EVENTS, each holding one array per column
+    # plus the JSON text of its header snapshots, so a crash loses at most
+    # the chunk being filled. Events must be recorded in time order, which
+    # holds for anything called at the scheduler's current time. Links are
+    # attached on construction and detached by close().
+    def __init__(self, path, topology, links, chunk_events=CHUNK_EVENTS, **meta):
+        self.path = path
+        self.chunk_events = chunk_events
+        self.links = links
+        self.devices = [device.name for device in topology.devices]
+        index = {name: i for i, name in enumerate(self.devices)}
+        self._ends = [((index[link.a], index[link.b]), (index[link.b], index[link.a])) for link in links]
+        self._index = index
+        self._rows = []
+        self._texts = {} # Row in the current chunk -> JSON bytes
+        self.events = 0
+        self.chunks = 0
+        header = json.dumps(dict(meta, devices=self.devices, links=[[link.a, link.b] for link in links])).encode()
+        self._file = open(path, "wb")
+        self._file.write(_pad(_FILE_HEADER.pack(_FILE_MAGIC, len(header)) + header))
+        for i, link in enumerate(links):
+            link.trace = (self, i)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def hop(self, time, until, link, direction, flow, length):
+        src, dst = self._ends[link][direction]
+        self._append((time, until, flow, link, src, dst, length, 0, HOP))
+
+    def enqueue(self, time, link, direction, flow, length, occupancy):
+        src, dst = self._ends[link][direction]
+        self._append((time, time, flow, link, src, dst, length, occupancy, ENQUEUE))
+
+    def drop(self, time, link, direction, flow, length, outcome):
+        src, dst = self._ends[link][direction]
+        self._append((time, time, flow, link, src, dst, length, outcome, DROP))
+
+    def collision(self, time, link, direction, flow, length, collisions):
+        src, dst = self._ends[link][direction]
+        self._append((time, time, flow, link, src, dst, length, collisions, COLLISION))
+
+    def headers(self, time, event, headers, src=None, dst=None, flow=-1, length=0):
+        # A header snapshot: the step's name and its header dicts, as JSON.
+        # Payload bytes are stored as their str() form, which is how the OSI
+        # panel shows them.
+        self._texts[len(self._rows)] = json.dumps({"event": event, "headers": list(headers)}, default=str).encode()
+        self._append((time, time, flow, -1, self._index.get(src, -1), self._index.get(dst, -1), length, 0, HEADERS))
+
+    def flow_headers(self, scheduler, state):
+        # Scheduler handler: snapshot the headers of a flow's packets
+        record = POOL.acquire(state["protocol"], *state["addresses"], payload=state["payload"])
+        self.headers(scheduler.now, f"Flow {state['flow']}: {state['protocol']} {state['src']} -> {state['dst']}",
+                     record.layers(), state["src"], state["dst"], state["flow"], record.length)
+        POOL.release(record)
+
+    def _append(self, row):
+        rows = self._rows
+        rows.append(row)
+        if len(rows) >= self.chunk_events:
+            self.flush()
+
+    def flush(self):
+        # Append the buffered events as one chunk
+        rows = self._rows
+        if not rows:
+            return
+        table = np.array(rows, dtype=ROW_DTYPE)
+        offsets = np.zeros(len(rows) + 1, dtype="<u4")
+        texts = self._texts
+        for row, text in texts.items():
+            offsets[row + 1] = len(text)
+        np.cumsum(offsets, out=offsets)
+        blob = b"".join(texts[row] for row in sorted(texts))
+        hops = table["kind"] == HOP
+        longest = float((table["until"][hops] - table["time"][hops]).max()) if hops.any() else 0.0
+        parts = [_CHUNK_HEADER.pack(_CHUNK_MAGIC, len(rows), len(blob), len(texts), table["time"][0], table["time"][-1],
+                                    float(table["until"].max()), longest)]
+        parts.extend(_pad(np.ascontiguousarray(table[name]).tobytes()) for name, _ in COLUMNS)
+        parts.append(_pad(offsets.tobytes()))
+        parts.append(_pad(blob))
+        self._file.write(b"".join(parts)) # One write per chunk
+        self._file.flush()
+        self.events += len(rows)
+        self.chunks += 1
+        self._rows = []
+        self._texts = {}
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+        for link in self.links:
+            link.trace = None
+
+class TraceReader:
+    # Memory-maps a trace and indexes it by time. Opening only reads the
+    # chunk headers; column arrays are zero-copy views of the mapping, and a
+    # time range is found by a binary search over the chunks' first times and
+    # then within each chunk's time column. A chunk cut short by a crash is
+    # ignored. Use as a context manager.
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty file
+            self._file.close()
+            raise ValueError(f"{path} is not a trace file") from None
+        size = len(self._map)
+        if size < _FILE_HEADER.size or self._map[:8] != _FILE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a trace file")
+        _, header_len = _FILE_HEADER.unpack_from(self._map, 0)
+        self.meta = json.loads(self._map[_FILE_HEADER.size:_FILE_HEADER.size + header_len])
+        self.devices = self.meta["devices"]
+        self.links = [tuple(link) for link in self.meta["links"]]
+        self._chunks = [] # (columns, text offsets, text start, snapshots) per chunk
+        self._kind_counts = None # Events per kind in each chunk, counted on first use
+        first, last, until, longest = [], [], [], []
+        position = _padded(_FILE_HEADER.size + header_len)
+        while position + _CHUNK_HEADER.size <= size:
+            magic, count, text_len, snapshots, t0, t1, t_until, hop = _CHUNK_HEADER.unpack_from(self._map, position)
+            end = position + _CHUNK_HEADER.size + sum(_padded(count * np.dtype(kind).itemsize) for _, kind in COLUMNS) + _padded(4 * (count + 1)) + _padded(text_len)
+            if magic != _CHUNK_MAGIC or end > size:
+                break # Truncated final chunk
+            offset = position + _CHUNK_HEADER.size
+            columns = {}
+            for name, kind in COLUMNS:
+                columns[name] = np.frombuffer(self._map, dtype=kind, count=count, offset=offset)
+                offset += _padded(count * columns[name].itemsize)
+            text_offsets = np.frombuffer(self._map, dtype="<u4", count=count + 1, offset=offset)
+            self._chunks.append((columns, text_offsets, offset + _padded(4 * (count + 1)), snapshots))
+            first.append(t0)
+            last.append(t1)
+            until.append(t_until)
+            longest.append(hop)
+            position = end
+        self._first = np.array(first)
+        self._last = np.array(last)
+        self.counts = np.array([len(chunk[0]["time"]) for chunk in self._chunks], dtype=np.int64)
+        self.start_time = float(self._first[0]) if first else 0.0
+        self.end_time = max(max(until), max(last)) if first else 0.0
+        self.longest_hop = max(longest) if first else 0.0 # Bounds how far back a hop in flight at t departed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return int(self.counts.sum())
+
+    def close(self):
+        if self._file is None:
+            return
+        self._chunks = []
+        self._file.close()
+        self._file = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass # Column arrays are still referenced; the mapping goes away with the last of them
+
+    def _ranges(self, start, end):
+        # (chunk, first row, end row) for the events with start <= time < end
+        for chunk in range(int(np.searchsorted(self._last, start, "left")), int(np.searchsorted(self._first, end, "left"))):
+            times = self._chunks[chunk][0]["time"]
+            low = int(np.searchsorted(times, start, "left"))
+            high = int(np.searchsorted(times, end, "left"))
+            if low < high:
+                yield chunk, low, high
+
+    def events(self, start, end, kinds=None):
+        # Columns of the events with start <= time < end as a dict of arrays,
+        # optionally only those of the given kinds
+        parts = []
+        for chunk, low, high in self._ranges(start, end):
+            columns = self._chunks[chunk][0]
+            keep = slice(None) if kinds is None else np.isin(columns["kind"][low:high], kinds)
+            parts.append({name: columns[name][low:high][keep] for name, _ in COLUMNS})
+        return {name: np.concatenate([part[name] for part in parts]) if parts else np.empty(0, dtype=kind) for name, kind in COLUMNS}
+
+    def hops(self, start, end):
+        # Hops in flight at some point in [start, end): departed before `end`
+        # and arriving after `start`
+        hops = self.events(start - self.longest_hop, end, [HOP])
+        keep = hops["until"] > start
+        return {name: values[keep] for name, values in hops.items()}
+
+    def counts_until(self, time):
+        # Number of events of each kind with time <= `time`, as a list indexed by kind
+        if self._kind_counts is None:
+            counts = [np.bincount(chunk[0]["kind"], minlength=len(KIND_NAMES)) for chunk in self._chunks]
+            self._kind_counts = np.cumsum([np.zeros(len(KIND_NAMES), dtype=np.int64)] + counts, axis=0) # Prefix sums
+        done = int(np.searchsorted(self._last, time, "right"))
+        totals = self._kind_counts[done].copy()
+        if done < len(self._chunks):
+            columns = self._chunks[done][0]
+            totals += np.bincount(columns["kind"][:int(np.searchsorted(columns["time"], time, "right"))], minlength=len(KIND_NAMES))
+        return totals.tolist()
+
+    def headers_at(self, time):
+        # The latest header snapshot at or before `time` as (time, event,
+        # headers), or None
+        for chunk in range(int(np.searchsorted(self._first, time, "right")) - 1, -1, -1):
+            columns, offsets, text_start, snapshots = self._chunks[chunk]
+            if not snapshots:
+                continue
+            high = int(np.searchsorted(columns["time"], time, "right"))
+            rows = np.flatnonzero(columns["kind"][:high] == HEADERS)
+            if len(rows):
+                row = int(rows[-1])
+                snapshot = json.loads(self._map[text_start + int(offsets[row]):text_start + int(offsets[row + 1])])
+                return float(columns["time"][row]), snapshot["event"], snapshot["headers"]
+        return None
+
+def open_trace(path):
+    return TraceReader(path)
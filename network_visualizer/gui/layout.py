@@ -0,0 +1,108 @@
+# Graph layout computation with an on-disk cache
+import hashlib
+import json
+import os
+import networkx as nx
+import numpy as np
+
+LAYOUT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "network_visualizer", "layouts")
+LARGE_GRAPH_NODES = 500 # "auto" switches to a cheaper engine above this size
+
+LAYOUT_ENGINES = {
+    "spring": lambda graph, seed: nx.spring_layout(graph, seed=seed),
+    "kamada_kawai": lambda graph, seed: nx.kamada_kawai_layout(graph),
+    "spectral": lambda graph, seed: nx.spectral_layout(graph),
+    "circular": lambda graph, seed: nx.circular_layout(graph),
+    "shell": lambda graph, seed: nx.shell_layout(graph),
+    "random": lambda graph, seed: nx.random_layout(graph, seed=seed),
+}
+
+def resolve_engine(graph, engine="auto"):
+    if engine == "auto":
+        return "spring" if graph.number_of_nodes() <= LARGE_GRAPH_NODES else "spectral"
+    if engine not in LAYOUT_ENGINES:
+        raise ValueError(f"Unknown layout engine {engine!r}")
+    return engine
+
+def topology_hash(graph):
+    # Stable across runs and insertion order: hashes the sorted node and edge names
+    digest = hashlib.sha1()
+    for node in sorted(map(str, graph.nodes)):
+        digest.update(node.encode())
+        digest.update(b"\0")
+    digest.update(b"\1")
+    for edge in sorted(tuple(sorted((str(a), str(b)))) for a, b in graph.edges):
+        digest.update("\0".join(edge).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _cache_path(cache_dir, graph, engine, seed):
+    return os.path.join(cache_dir, f"{topology_hash(graph)}-{engine}-{seed}.json")
+
+def load_cached_layout(graph, engine, seed=None, cache_dir=LAYOUT_CACHE_DIR):
+    if cache_dir is None:
+        return None
+    try:
+        with open(_cache_path(cache_dir, graph, engine, seed)) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    by_name = {str(node): node for node in graph.nodes}
+    if set(stored) != set(by_name):
+        return None
+    return {by_name[name]: np.array(xy) for name, xy in stored.items()}
+
+def save_layout(graph, pos, engine, seed=None, cache_dir=LAYOUT_CACHE_DIR):
+    if cache_dir is None:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = _cache_path(cache_dir, graph, engine, seed)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({str(node): [float(xy[0]), float(xy[1])] for node, xy in pos.items()}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass # A read-only cache only costs a recomputation next time
+
+def compute_layout(graph, engine="auto", seed=None, cache_dir=LAYOUT_CACHE_DIR):
+    engine = resolve_engine(graph, engine)
+    pos = load_cached_layout(graph, engine, seed, cache_dir)
+    if pos is None:
+        pos = LAYOUT_ENGINES[engine](graph, seed) if graph.number_of_nodes() else {}
+        save_layout(graph, pos, engine, seed, cache_dir)
+    return pos
+
+def extend_layout(graph, pos, seed=None, iterations=30):
+    # Place nodes missing from `pos` next to their already placed neighbours,
+    # then relax only the new nodes and their direct neighbourhood; every
+    # other node keeps its position.
+    new_nodes = [node for node in graph.nodes if node not in pos]
+    if not new_nodes:
+        return dict(pos)
+    rng = np.random.default_rng(seed)
+    pos = dict(pos)
+    spread = np.ptp(np.array(list(pos.values())), axis=0).max() * 0.05 if pos else 1.0
+    for node in new_nodes:
+        placed = [pos[n] for n in graph.neighbors(node) if n in pos]
+        center = np.mean(placed, axis=0) if placed else np.zeros(2)
+        pos[node] = center + rng.uniform(-spread, spread, 2)
+    movable = set(new_nodes)
+    for node in new_nodes:
+        movable.update(graph.neighbors(node))
+    region = set(movable)
+    for node in movable:
+        region.update(graph.neighbors(node))
+    fixed = [node for node in region if node not in movable]
+    if not fixed:
+        return pos # Without anchors spring_layout would rescale the region; keep the neighbour placement
+    subgraph = graph.subgraph(region)
+    # Use the typical existing edge length as the spring's optimal distance so
+    # the relaxed region matches the scale of the rest of the drawing
+    lengths = [np.linalg.norm(pos[a] - pos[b]) for a, b in subgraph.edges if a not in movable or b not in movable]
+    k = float(np.median(lengths)) if lengths else None
+    relaxed = nx.spring_layout(subgraph, pos={node: pos[node] for node in region}, fixed=fixed,
+                               iterations=iterations, seed=seed, k=k or None)
+    for node in movable:
+        pos[node] = relaxed[node]
+    return pos
@@ -0,0 +1,149 @@
+# OSI stack and header history table models
+from array import array
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtWidgets import QAbstractItemView, QHeaderView, QTableView
+
+DATA_PREVIEW = 80 # Characters of payload shown in a cell
+ROW_HEIGHT = 20
+
+def format_data(data):
+    # Cell text for a header's payload; bytes are shown like the old labels did
+    if data is None or data == "":
+        return ""
+    text = str(data)
+    return text if len(text) <= DATA_PREVIEW else text[:DATA_PREVIEW - 3] + "..."
+
+class OsiStackModel(QAbstractTableModel):
+    # The layers of the packet currently shown, one row per header dict.
+    # Setting a new stack of the same depth only changes cell contents, so
+    # the view keeps its rows and just repaints; cells are formatted when
+    # the view asks for them.
+    COLUMNS = ("Layer", "Header", "Data")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._headers = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        header = self._headers[index.row()]
+        column = index.column()
+        if column == 0:
+            return header["layer"]
+        if column == 1:
+            return str(header.get("header", ""))
+        return format_data(header.get("data"))
+
+    def set_headers(self, headers_list):
+        old, new = len(self._headers), len(headers_list)
+        if new < old:
+            self.beginRemoveRows(QModelIndex(), new, old - 1)
+            del self._headers[new:]
+            self.endRemoveRows()
+        elif new > old:
+            self.beginInsertRows(QModelIndex(), old, new - 1)
+            self._headers.extend(headers_list[old:])
+            self.endInsertRows()
+        shared = min(old, new)
+        if shared:
+            self._headers[:shared] = headers_list[:shared]
+            self.dataChanged.emit(self.index(0, 0), self.index(shared - 1, len(self.COLUMNS) - 1))
+
+class HeaderHistoryModel(QAbstractTableModel):
+    # Every header of every recorded step, one row each. Rows are stored
+    # column-wise: a step number per row in an int array, plus the step's
+    # time and event once per step, and a reference to the header dict, so a
+    # million rows cost a few tens of MB and nothing is formatted until the
+    # (virtualized) view paints a visible row. Appends are buffered and
+    # announced to the view in one insert per flush().
+    COLUMNS = ("#", "Time", "Event", "Layer", "Header", "Data")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._row_step = array("i")
+        self._headers = []
+        self._step_time = array("d")
+        self._step_event = []
+        self._visible_rows = 0 # Rows announced to the view; the rest are pending
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._visible_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        step = self._row_step[row]
+        if column == 0:
+            return step
+        if column == 1:
+            return f"{self._step_time[step]:.6f}"
+        if column == 2:
+            return self._step_event[step]
+        header = self._headers[row]
+        if column == 3:
+            return header["layer"]
+        if column == 4:
+            return str(header.get("header", ""))
+        return format_data(header.get("data"))
+
+    def append_step(self, time, event, headers_list):
+        step = len(self._step_event)
+        self._step_time.append(time)
+        self._step_event.append(event)
+        self._row_step.extend([step] * len(headers_list))
+        self._headers.extend(headers_list)
+
+    def flush(self):
+        # Show rows appended since the last flush
+        total = len(self._headers)
+        if total > self._visible_rows:
+            self.beginInsertRows(QModelIndex(), self._visible_rows, total - 1)
+            self._visible_rows = total
+            self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._row_step = array("i")
+        self._headers = []
+        self._step_time = array("d")
+        self._step_event = []
+        self._visible_rows = 0
+        self.endResetModel()
+
+def make_table_view(model, stretch_last=True):
+    # Fixed row heights and column widths keep the view virtualized: Qt only
+    # asks the model for the rows in the viewport and never measures contents
+    view = QTableView()
+    view.setModel(model)
+    view.setSelectionBehavior(QAbstractItemView.SelectRows)
+    view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    view.setWordWrap(False)
+    vertical = view.verticalHeader()
+    vertical.setVisible(False)
+    vertical.setSectionResizeMode(QHeaderView.Fixed)
+    vertical.setDefaultSectionSize(ROW_HEIGHT)
+    horizontal = view.horizontalHeader()
+    horizontal.setSectionResizeMode(QHeaderView.Interactive)
+    horizontal.setStretchLastSection(stretch_last)
+    return view
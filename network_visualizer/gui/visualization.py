@@ -1,10 +1,21 @@
 # Network visualization components
+import math
+import time
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
 from PyQt5.QtWidgets import QVBoxLayout, QWidget
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from PyQt5.QtCore import QTimer, pyqtSignal
+from core.channel import DEFAULT_BANDWIDTH
+from core.metrics import timed
+from gui.layout import LAYOUT_CACHE_DIR, compute_layout, extend_layout, save_layout, resolve_engine
+
+LABEL_NODE_LIMIT = 200 # Above this many nodes the static layer is drawn without labels
+FRAME_INTERVAL_MS = 16 # ~60 fps while packets are in flight
+DEFAULT_LINK_LATENCY = 0.1 # Simulated seconds per hop when an edge has no latency
+TRACE_WINDOW = 2.0 # Wall-clock seconds of trace playback loaded around the playhead at a time
 
 class MplCanvas(FigureCanvas):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
@@ -17,8 +28,9 @@ class NetworkVisualizer(QWidget):
     headers_updated = pyqtSignal(list) # This signal is no longer needed for OSI panel updates, but kept for potential future tooltip implementation
     node_reached = pyqtSignal(str) # New signal to indicate node reached
     animation_step_completed = pyqtSignal() # New signal for when a single animation path is done
+    trace_time_changed = pyqtSignal(float) # Playhead position while a trace is loaded
 
-    def __init__(self, devices=None, connections=None):
+    def __init__(self, devices=None, connections=None, layout_engine="auto", layout_seed=None, layout_cache_dir=LAYOUT_CACHE_DIR):
         super().__init__()
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
@@ -31,10 +43,36 @@ class NetworkVisualizer(QWidget):
         self.graph = nx.Graph()
         self.devices = devices if devices is not None else []
         self.connections = connections if connections is not None else []
+        self.layout_engine = layout_engine
+        self.layout_seed = layout_seed
+        self.layout_cache_dir = layout_cache_dir # None disables the on-disk layout cache
 
         self.current_packet_headers = None
         self.packet_headers_for_tooltips = [] # Added for packet header tooltips
 
+        # The static topology is rendered once and cached as a background
+        # bitmap; animation frames only restore it and blit the packet artists.
+        self.packet_artist = None
+        self._background = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+        # In-flight packets are stored one row per hop: segment endpoints and
+        # the simulation times at which the hop departs and arrives. Each frame
+        # interpolates every active row in a single NumPy expression.
+        self.sim_time = 0.0
+        self.time_scale = 1.0 # Simulated seconds per wall-clock second
+        self._last_frame_wall = None
+        self._next_packet_id = 0
+        self._pending_hops = []
+        self._clear_hops()
+
+        # A loaded trace replaces live packets: hops around the playhead are
+        # read from its time index, so it can be played in either direction
+        self.trace = None
+        self.trace_rate = 0.0 # Playback speed in time_scale units; negative plays backward
+        self._trace_pos = None
+        self._trace_window = None # (start, end) of the hops currently loaded
+
         self.init_network()
 
     def init_network(self):
@@ -43,70 +81,240 @@ class NetworkVisualizer(QWidget):
             self.graph.add_node(device.name, device=device)
         
         for conn in self.connections:
-            self.graph.add_edge(conn[0].name, conn[1].name)
+            self._add_connection(conn)
 
-        self.pos = nx.spring_layout(self.graph) # or other layout algorithms
+        # Cached per topology hash, so restarting on the same topology skips the layout run
+        self.pos = compute_layout(self.graph, self.layout_engine, self.layout_seed, self.layout_cache_dir)
         self.draw_network()
         
-        self.packet_path = []
-        self.packet_idx = 0
         self.packet_animation_timer = QTimer()
         self.packet_animation_timer.timeout.connect(self.animate_packet)
 
-    def draw_network(self):
-        self.canvas.axes.clear()
-        nx.draw(self.graph, pos=self.pos, ax=self.canvas.axes, with_labels=True, node_color='lightblue', node_size=2000, font_size=10, font_weight='bold')
-        
-        if hasattr(self, 'packet_position') and self.packet_position is not None:
-            self.draw_packet(self.packet_position)
+    def _add_connection(self, conn):
+        # Connections are (a, b) or (a, b, {"latency": seconds, "bandwidth": bit/s, ...})
+        attrs = conn[2] if len(conn) > 2 else {}
+        self.graph.add_edge(conn[0].name, conn[1].name, **attrs)
+
+    def add_device(self, device, connections=()):
+        # Incremental topology change: only the new device's neighbourhood is re-laid out
+        self.devices.append(device)
+        self.graph.add_node(device.name, device=device)
+        for conn in connections:
+            self.connections.append(conn)
+            self._add_connection(conn)
+        self.pos = extend_layout(self.graph, self.pos, seed=self.layout_seed)
+        save_layout(self.graph, self.pos, resolve_engine(self.graph, self.layout_engine), self.layout_seed, self.layout_cache_dir)
+        self.draw_network()
 
+    @timed("render_topology")
+    def draw_network(self):
+        # Full redraw of the static topology; only needed when the graph or
+        # layout changes. Per-frame updates go through update_packets().
+        ax = self.canvas.axes
+        ax.clear()
+        if self.graph.number_of_nodes() <= LABEL_NODE_LIMIT:
+            nx.draw(self.graph, pos=self.pos, ax=ax, with_labels=True, node_color='lightblue', node_size=2000, font_size=10, font_weight='bold',
+                    width=self._edge_widths())
+        else:
+            nx.draw_networkx_edges(self.graph, pos=self.pos, ax=ax, width=0.5, alpha=0.5)
+            nx.draw_networkx_nodes(self.graph, pos=self.pos, ax=ax, node_color='lightblue', node_size=20)
+            ax.set_axis_off()
+        # One scatter artist holds every in-flight packet
+        self.packet_artist = ax.scatter(np.empty(0), np.empty(0), c='red', s=100, zorder=3, animated=True)
+        self._background = None
         self.canvas.draw()
 
-    def draw_packet(self, position):
-        # Draw a small red circle for the packet
-        self.canvas.axes.plot(position[0], position[1], 'ro', markersize=10)
+    def _edge_widths(self):
+        # Line width grows with the log of the link bandwidth: 10 Mb/s is 2, 1 Gb/s is 4
+        return [max(0.5, math.log10(bandwidth / 1e5)) for _, _, bandwidth in self.graph.edges(data='bandwidth', default=DEFAULT_BANDWIDTH)]
+
+    def _on_draw(self, event):
+        # Every full draw (initial, resize, topology change) refreshes the cached background
+        self._background = self.canvas.copy_from_bbox(self.canvas.axes.bbox)
+        self._draw_packet_artists()
+
+    def _draw_packet_artists(self):
+        if self.packet_artist is None:
+            return
+        self.packet_artist.set_offsets(self.packet_positions())
+        self.canvas.axes.draw_artist(self.packet_artist)
+
+    @timed("render_frame")
+    def update_packets(self):
+        # Per-frame update: restore the cached topology and blit the packets
+        if self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_packet_artists()
+        self.canvas.blit(self.canvas.axes.bbox)
 
     def update_network(self):
         self.draw_network()
 
-    def start_packet_animation(self, path, headers_history=None):
-        self.packet_path = path
-        self.packet_idx = 0
-        self.packet_headers_for_tooltips = headers_history if headers_history is not None else []
-        if self.packet_path:
-            self.packet_position = self.pos[self.packet_path[0]]
-            self.packet_animation_timer.start(100) # Animate every 100 ms
-        else:
-            self.packet_position = None
+    def _clear_hops(self):
+        self._hop_src = np.empty((0, 2))
+        self._hop_dst = np.empty((0, 2))
+        self._hop_depart = np.empty(0)
+        self._hop_arrive = np.empty(0)
+        self._hop_nodes = [] # Node reached at the end of each hop
+
+    def _flush_pending_hops(self):
+        if not self._pending_hops:
+            return
+        src, dst, depart, arrive, nodes = zip(*self._pending_hops)
+        self._pending_hops = []
+        self._hop_src = np.concatenate([self._hop_src, np.array(src, dtype=float).reshape(-1, 2)])
+        self._hop_dst = np.concatenate([self._hop_dst, np.array(dst, dtype=float).reshape(-1, 2)])
+        self._hop_depart = np.concatenate([self._hop_depart, depart])
+        self._hop_arrive = np.concatenate([self._hop_arrive, arrive])
+        self._hop_nodes.extend(nodes)
+
+    def _compact_hops(self):
+        keep = self._hop_arrive > self.sim_time
+        if keep.all():
+            return
+        self._hop_src = self._hop_src[keep]
+        self._hop_dst = self._hop_dst[keep]
+        self._hop_depart = self._hop_depart[keep]
+        self._hop_arrive = self._hop_arrive[keep]
+        self._hop_nodes = [node for node, k in zip(self._hop_nodes, keep.tolist()) if k]
+
+    def packets_in_flight(self):
+        return len(self._pending_hops) + int(np.count_nonzero(self._hop_arrive > self.sim_time))
+
+    def hop_duration(self, a, b, length=0):
+        # Serialization of `length` bytes at the edge's bandwidth plus its latency
+        if not self.graph.has_edge(a, b):
+            return DEFAULT_LINK_LATENCY
+        edge = self.graph.edges[a, b]
+        return edge.get('latency', DEFAULT_LINK_LATENCY) + length * 8 / edge.get('bandwidth', DEFAULT_BANDWIDTH)
+
+    def add_packet(self, path, depart=None, length=0):
+        # Queue a packet of `length` bytes along `path`, departing at
+        # simulation time `depart` (default: now)
+        if len(path) < 2:
+            return None
+        t = self.sim_time if depart is None else depart
+        for a, b in zip(path, path[1:]):
+            duration = self.hop_duration(a, b, length)
+            self._pending_hops.append((self.pos[a], self.pos[b], t, t + duration, b))
+            t += duration
+        packet_id = self._next_packet_id
+        self._next_packet_id += 1
+        if not self.packet_animation_timer.isActive():
+            self._last_frame_wall = time.perf_counter()
+            self.packet_animation_timer.start(FRAME_INTERVAL_MS)
+        return packet_id
+
+    def clear_packets(self):
+        self.packet_animation_timer.stop()
+        self._pending_hops = []
+        self._clear_hops()
+        self.update_packets()
+
+    def packet_positions(self):
+        # Positions of all packets at the current simulation time, shape (n, 2)
+        t = self.sim_time
+        active = (self._hop_depart <= t) & (t < self._hop_arrive)
+        if not active.any():
+            return np.empty((0, 2))
+        depart = self._hop_depart[active]
+        fraction = ((t - depart) / (self._hop_arrive[active] - depart))[:, None]
+        src = self._hop_src[active]
+        return src + fraction * (self._hop_dst[active] - src)
+
+    def set_sim_time(self, sim_time):
+        previous, self.sim_time = self.sim_time, sim_time
+        self._flush_pending_hops()
+        if sim_time > previous:
+            arrived = np.flatnonzero((self._hop_arrive > previous) & (self._hop_arrive <= sim_time))
+            for index in arrived[np.argsort(self._hop_arrive[arrived], kind='stable')].tolist():
+                self.node_reached.emit(self._hop_nodes[index]) # Emit signal when packet reaches a node
+        self.update_packets()
+        if len(self._hop_arrive) and not (self._hop_arrive > sim_time).any():
             self.packet_animation_timer.stop()
-        self.draw_network()
+            self._clear_hops()
+            self.current_packet_headers = None # Clear headers
+            self.update_packets()
+            self.animation_step_completed.emit() # Emit signal that all in-flight packets are delivered
+        elif len(self._hop_arrive) > 1024 and np.count_nonzero(self._hop_arrive <= sim_time) * 2 > len(self._hop_arrive):
+            self._compact_hops()
+
+    def advance(self, dt):
+        self.set_sim_time(self.sim_time + dt)
+
+    def start_packet_animation(self, path, headers_history=None, length=0):
+        self.packet_headers_for_tooltips = headers_history if headers_history is not None else []
+        packet_id = self.add_packet(path, length=length)
+        self.update_packets()
+        return packet_id
 
     def animate_packet(self):
-        if self.packet_idx < len(self.packet_path) - 1:
-            start_node = self.packet_path[self.packet_idx]
-            end_node = self.packet_path[self.packet_idx + 1]
-            
-            start_pos = self.pos[start_node]
-            end_pos = self.pos[end_node]
-
-            # Simple linear interpolation for now
-            # In a real animation, you might want more steps between nodes
-            self.packet_position = ((start_pos[0] + end_pos[0]) / 2, (start_pos[1] + end_pos[1]) / 2) 
-            
-            # if self.packet_idx < len(self.packet_headers_for_tooltips):
-            #     self.update_packet_headers(self.packet_headers_for_tooltips[self.packet_idx])
-            #     self.headers_updated.emit(self.current_packet_headers) # Emit signal with current headers
-
-            self.packet_idx += 1
-            self.draw_network()
-            self.node_reached.emit(end_node) # Emit signal when packet reaches a node
-        else:
+        # Timer slot: advance the simulation clock by the elapsed wall time
+        now = time.perf_counter()
+        elapsed = now - self._last_frame_wall if self._last_frame_wall is not None else 0.0
+        self._last_frame_wall = now
+        if self.trace is not None:
+            target = self.sim_time + elapsed * self.time_scale * self.trace_rate
+            self.seek(target)
+            if not self.trace.start_time < target < self.trace.end_time:
+                self.play(0.0) # Reached either end
+            return
+        self.advance(elapsed * self.time_scale)
+
+    def load_trace(self, trace):
+        # Show a recorded run (a core.trace.TraceReader) from its start,
+        # paused; every device in it must be in the drawn topology
+        missing = [name for name in trace.devices if name not in self.pos]
+        if missing:
+            raise ValueError(f"Trace devices not in the topology: {', '.join(missing[:5])}")
+        self.clear_packets()
+        self.trace = trace
+        self.trace_rate = 0.0
+        self._trace_pos = np.array([self.pos[name] for name in trace.devices], dtype=float).reshape(-1, 2)
+        self._trace_window = None
+        self.seek(trace.start_time)
+
+    def close_trace(self):
+        if self.trace is None:
+            return
+        self.trace = None
+        self.trace_rate = 0.0
+        self._trace_pos = None
+        self._trace_window = None
+        self.clear_packets()
+
+    def seek(self, sim_time):
+        # Move the playhead to `sim_time`, clamped to the trace. Hops are
+        # reloaded only when it leaves the loaded window.
+        trace = self.trace
+        sim_time = min(max(sim_time, trace.start_time), trace.end_time)
+        window = self._trace_window
+        if window is None or not window[0] <= sim_time <= window[1]:
+            span = max(abs(self.trace_rate), 1.0) * self.time_scale * TRACE_WINDOW
+            self._load_trace_window(sim_time - span, sim_time + span)
+        self.sim_time = sim_time
+        self.update_packets()
+        self.trace_time_changed.emit(sim_time)
+
+    def _load_trace_window(self, start, end):
+        hops = self.trace.hops(start, end)
+        self._hop_src = self._trace_pos[hops["src"]]
+        self._hop_dst = self._trace_pos[hops["dst"]]
+        self._hop_depart = hops["time"]
+        self._hop_arrive = hops["until"]
+        self._hop_nodes = [] # Nodes reached are not signalled during replay
+        self._trace_window = (start, end)
+
+    def play(self, rate):
+        # Play the trace at `rate` times time_scale: 1 forward, -1 backward, 0 pauses
+        self.trace_rate = rate
+        if not rate:
             self.packet_animation_timer.stop()
-            self.packet_position = None # Packet reached destination
-            self.current_packet_headers = None # Clear headers
-            # self.headers_updated.emit([]) # Emit empty list to clear headers display
-            self.draw_network()
-            self.animation_step_completed.emit() # Emit signal that animation step is completed
+        elif not self.packet_animation_timer.isActive():
+            self._last_frame_wall = time.perf_counter()
+            self.packet_animation_timer.start(FRAME_INTERVAL_MS)
 
     # def update_packet_headers(self, headers):
     #     self.current_packet_headers = headers
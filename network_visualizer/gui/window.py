@@ -1,14 +1,37 @@
 # GUI Window components
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QLineEdit, QLabel, QComboBox
+from PyQt5.QtCore import QThread, Qt, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QLineEdit, QLabel, QComboBox, QSlider
+from gui.osi_panel import HeaderHistoryModel, OsiStackModel, make_table_view
 from gui.visualization import NetworkVisualizer
+from gui.worker import SimulationWorker, SnapshotQueue
 from core.devices import Client, Switch, Router, Server
-from core.simulation import build_packet, simulate_tcp_handshake, simulate_icmp_ping, simulate_packet_loss, simulate_collision
-from core.protocols import encapsulate_packet, decapsulate_packet
+from core.metrics import REGISTRY
+from core.topology import load_topology
+from core.trace import COLLISION, DROP, ENQUEUE, HOP, open_trace
+import json
+import os
 import sys
 
+DEFAULT_TOPOLOGY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "topologies", "default.json")
+DEFAULT_SCENARIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scenarios", "default.json")
+ANIMATION_TIME_SCALE = 0.01 # Simulated seconds per wall-clock second: a 1 ms link takes 100 ms on screen
+TRACE_SLIDER_STEPS = 10000 # Slider resolution over a trace's duration
+TRACE_SPEEDS = {"1x": 1, "10x": 10, "100x": 100, "1000x": 1000, "10000x": 10000}
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # Requests to the simulation worker; queued across threads, so emitting never blocks the GUI
+    send_requested = pyqtSignal(str, str)
+    scenario_requested = pyqtSignal(object, object)
+
+    def __init__(self, topology_path=DEFAULT_TOPOLOGY, scenario_path=DEFAULT_SCENARIO, trace_path=None, replay_path=None):
+        # trace_path: record scenario runs to this file; replay_path: a trace to open at startup
         super().__init__()
+        self.topology_path = topology_path
+        self.scenario_path = scenario_path
+        self.trace_path = trace_path
+        self.replay_path = replay_path # The trace the Replay button opens
+        self.trace = None # Open TraceReader while replaying
+        self._trace_headers = None # Time of the header snapshot shown during replay
         self.setWindowTitle("Network Data Flow Visualizer")
         self.setGeometry(100, 100, 1200, 800)
 
@@ -19,6 +42,9 @@ class MainWindow(QMainWindow):
 
         self.setup_network_devices()
         self.setup_ui()
+        self.setup_worker()
+        if replay_path:
+            self.open_trace(replay_path)
 
     def setup_ui(self):
         # Input and Protocol Selection
@@ -33,90 +59,190 @@ class MainWindow(QMainWindow):
         input_layout.addWidget(QLabel("Protocol:"))
         input_layout.addWidget(self.protocol_select)
         input_layout.addWidget(self.send_button)
+        self.scenario_button = QPushButton("Run Scenario")
+        self.scenario_button.clicked.connect(self.run_scenario)
+        input_layout.addWidget(self.scenario_button)
+        self.replay_button = QPushButton("Replay")
+        self.replay_button.clicked.connect(lambda: self.open_trace(self.replay_path))
+        self.replay_button.setEnabled(bool(self.replay_path))
+        input_layout.addWidget(self.replay_button)
         self.main_layout.addLayout(input_layout)
+        self.status_label = QLabel("")
+        self.main_layout.addWidget(self.status_label)
 
         # Device Flow Diagram
         self.network_visualizer = NetworkVisualizer(self.devices, self.connections)
+        self.network_visualizer.time_scale = ANIMATION_TIME_SCALE
         self.main_layout.addWidget(self.network_visualizer)
         # self.network_visualizer.headers_updated.connect(self.update_osi_panel) # Removed connection
         self.network_visualizer.node_reached.connect(self._process_node_reached) # Connect node_reached to a new handler
         self.network_visualizer.animation_step_completed.connect(self._advance_simulation) # Connect animation_step_completed
+        self.network_visualizer.trace_time_changed.connect(self._show_trace_time)
 
-        # OSI Layer Visualization Panel
+        # Trace replay: play either way and a slider to seek; hidden until a trace is opened
+        self.trace_bar = QWidget()
+        trace_layout = QHBoxLayout()
+        trace_layout.setContentsMargins(0, 0, 0, 0)
+        self.trace_bar.setLayout(trace_layout)
+        for label, direction in (("<< Back", -1), ("Pause", 0), ("Play >>", 1)):
+            button = QPushButton(label)
+            button.clicked.connect(lambda checked, direction=direction: self.play_trace(direction))
+            trace_layout.addWidget(button)
+        self.trace_speed = QComboBox()
+        self.trace_speed.addItems(list(TRACE_SPEEDS))
+        trace_layout.addWidget(self.trace_speed)
+        self.trace_slider = QSlider(Qt.Horizontal)
+        self.trace_slider.setRange(0, TRACE_SLIDER_STEPS)
+        self.trace_slider.valueChanged.connect(self._seek_trace)
+        trace_layout.addWidget(self.trace_slider, 1)
+        self.trace_label = QLabel("")
+        trace_layout.addWidget(self.trace_label)
+        self.close_trace_button = QPushButton("Close")
+        self.close_trace_button.clicked.connect(self.close_trace)
+        trace_layout.addWidget(self.close_trace_button)
+        self.trace_bar.hide()
+        self.main_layout.addWidget(self.trace_bar)
+
+        # OSI Layer Visualization Panel: the current stack, updated in place, next
+        # to the history of every header received
+        panels = QHBoxLayout()
         self.osi_panel = QVBoxLayout()
         self.osi_panel_label = QLabel("OSI Stack:")
         self.osi_panel.addWidget(self.osi_panel_label)
-        self.main_layout.addLayout(self.osi_panel)
+        self.osi_model = OsiStackModel(self)
+        self.osi_view = make_table_view(self.osi_model)
+        self.osi_panel.addWidget(self.osi_view)
+        panels.addLayout(self.osi_panel)
+        history_panel = QVBoxLayout()
+        history_panel.addWidget(QLabel("Header History:"))
+        self.history_model = HeaderHistoryModel(self)
+        self.history_view = make_table_view(self.history_model)
+        history_panel.addWidget(self.history_view)
+        panels.addLayout(history_panel)
+        self.main_layout.addLayout(panels)
 
     def setup_network_devices(self):
-        self.client = Client("Client", "192.168.1.100", "00:11:22:33:44:01")
-        self.switch = Switch("Switch", "192.168.1.1", "00:11:22:33:44:02")
-        self.router = Router("Router", "192.168.1.1", "00:11:22:33:44:03", routing_table={"192.168.1.": self.switch})
-        self.server = Server("Server", "192.168.1.10", "00:11:22:33:44:04")
-
-        self.devices = [self.client, self.switch, self.router, self.server]
-        self.connections = [
-            (self.client, self.switch),
-            (self.switch, self.router),
-            (self.router, self.server)
-        ]
+        self.topology = load_topology(self.topology_path)
+        # The first client and server in the topology are the endpoints of a send
+        self.client = self.topology.devices_of_type(Client)[0]
+        self.server = self.topology.devices_of_type(Server)[0]
+
+        self.devices = self.topology.devices
+        self.connections = self.topology.connections()
 
         self.current_simulation_steps = []
         self.current_step_idx = 0
 
+    def setup_worker(self):
+        # The simulation runs on its own thread and streams snapshots back
+        # through a bounded queue; the GUI thread only draws
+        self.snapshots = SnapshotQueue()
+        self.worker_thread = QThread()
+        self.worker = SimulationWorker(self.topology, self.client, self.server, self.snapshots, self.trace_path)
+        self.worker.moveToThread(self.worker_thread)
+        self.send_requested.connect(self.worker.simulate_send)
+        self.scenario_requested.connect(self.worker.run_scenario)
+        self.worker.snapshot_ready.connect(self._drain_snapshots)
+        self.worker_thread.start()
+
     def send_message(self):
-        message = self.message_input.text()
-        protocol = self.protocol_select.currentText()
+        self.close_trace()
+        self.send_requested.emit(self.message_input.text(), self.protocol_select.currentText())
+
+    def run_scenario(self):
+        with open(self.scenario_path) as f:
+            scenario = json.load(f)
+        self.close_trace() # The worker may record over the trace file
+        self.scenario_requested.emit(scenario.get("flows", []), scenario.get("duration"))
 
+    def open_trace(self, path):
+        # Replay a recorded run: live animation stops and the trace is shown
+        # paused at its start
+        self.close_trace()
         self.current_simulation_steps = []
         self.current_step_idx = 0
+        self.trace = open_trace(path)
+        try:
+            self.network_visualizer.load_trace(self.trace)
+        except ValueError as error:
+            self.trace.close()
+            self.trace = None
+            self.status_label.setText(str(error))
+            return
+        self.trace_bar.show()
+        self.status_label.setText(f"Replaying {path}: {len(self.trace)} events over {self.trace.end_time - self.trace.start_time:.3f}s")
 
-        if protocol == "TCP":
-            handshake_steps = simulate_tcp_handshake(self.client, self.server)
-            # For TCP handshake, we want to show the headers at each logical step of the handshake
-            # rather than at each physical hop. So, the path for each step is the full path.
-            for step in handshake_steps:
-                if step["from"] == self.client.name:
-                    path = [self.client.name, self.switch.name, self.router.name, self.server.name]
-                else:
-                    path = [self.server.name, self.router.name, self.switch.name, self.client.name]
-                self.current_simulation_steps.append({"event": step["event"], "headers": step["headers"], "path": path})
-
-        elif protocol == "ICMP":
-            ping_steps = simulate_icmp_ping(self.client, self.server)
-            # Similar to TCP, for ICMP, we process logical steps.
-            for step in ping_steps:
-                if step["from"] == self.client.name:
-                    path = [self.client.name, self.switch.name, self.router.name, self.server.name]
-                else:
-                    path = [self.server.name, self.router.name, self.switch.name, self.client.name]
-                self.current_simulation_steps.append({"event": step["event"], "headers": step["headers"], "path": path})
+    def close_trace(self):
+        if self.trace is None:
+            return
+        self.network_visualizer.close_trace()
+        self.trace.close()
+        self.trace = None
+        self._trace_headers = None
+        self.trace_bar.hide()
 
-        else:
-            # Simulate encapsulation for UDP/Other
-            frame, headers_list = encapsulate_packet(message, protocol, 
-                                                     src_mac=self.client.mac, dst_mac=self.switch.mac,
-                                                     src_ip=self.client.ip, dst_ip=self.server.ip)
-            
-            # Simulate CSMA/CD collision (simplified retransmission for now)
-            if simulate_collision():
-                self.current_simulation_steps.append({"event": "Collision Detected! Retransmitting...", "headers": [{"layer": "Simulation", "data": "Collision Detected! Retransmitting..."}], "path": []})
-                # Re-encapsulate after collision
-                frame, headers_list = encapsulate_packet(message, protocol, 
-                                                         src_mac=self.client.mac, dst_mac=self.switch.mac,
-                                                         src_ip=self.client.ip, dst_ip=self.server.ip)
-
-            # Simulate packet loss
-            if simulate_packet_loss(frame) is None:
-                self.current_simulation_steps.append({"event": "Packet Lost!", "headers": [{"layer": "Simulation", "data": "Packet Lost!"}], "path": []})
-            else:
-                # For non-TCP/ICMP, a single step of animation and OSI update
-                path = [self.client.name, self.switch.name, self.router.name, self.server.name]
-                self.current_simulation_steps.append({"event": "Packet Sent", "headers": headers_list, "path": path})
-        
-        # Start the first step of the animation
-        if self.current_simulation_steps:
-            self._process_next_simulation_step() # Start the first step
+    def play_trace(self, direction):
+        self.network_visualizer.play(direction * TRACE_SPEEDS[self.trace_speed.currentText()])
+
+    def _seek_trace(self, value):
+        # Slider moved by the user (programmatic updates block signals)
+        if self.trace is not None:
+            trace = self.trace
+            self.network_visualizer.seek(trace.start_time + (trace.end_time - trace.start_time) * value / TRACE_SLIDER_STEPS)
+
+    def _show_trace_time(self, sim_time):
+        trace = self.trace
+        if trace is None:
+            return
+        duration = trace.end_time - trace.start_time
+        self.trace_slider.blockSignals(True)
+        self.trace_slider.setValue(round((sim_time - trace.start_time) / duration * TRACE_SLIDER_STEPS) if duration > 0 else 0)
+        self.trace_slider.blockSignals(False)
+        counts = trace.counts_until(sim_time)
+        self.trace_label.setText(f"t={sim_time:.6f}s hops={counts[HOP]} queued={counts[ENQUEUE]} drops={counts[DROP]} collisions={counts[COLLISION]}")
+        snapshot = trace.headers_at(sim_time)
+        if snapshot is not None and snapshot[0] != self._trace_headers:
+            self._trace_headers = snapshot[0]
+            self.update_osi_panel(snapshot[2])
+
+    def _drain_snapshots(self):
+        # Everything published since the last wakeup, oldest first
+        for snapshot in self.snapshots.get_all():
+            for step in snapshot["steps"]:
+                self.history_model.append_step(step["time"], step["event"], step["headers"])
+            if snapshot["trace"] is not None:
+                self.replay_path = snapshot["trace"]
+                self.replay_button.setEnabled(True)
+            if self.trace is not None:
+                continue # Replaying: live results only go to the history
+            if snapshot["steps"]:
+                idle = not self.current_simulation_steps
+                self.current_simulation_steps.extend(snapshot["steps"])
+                if idle:
+                    self._process_next_simulation_step() # Start the first step
+            for path, length in snapshot["packets"]:
+                self.network_visualizer.add_packet(path, length=length)
+            if snapshot["stats"] is not None:
+                sent = sum(row["sent"] for row in snapshot["stats"])
+                delivered = sum(row["delivered"] for row in snapshot["stats"])
+                lost = sum(row["lost"] for row in snapshot["stats"])
+                state = "done" if snapshot["done"] else "running"
+                self.status_label.setText(f"Scenario {state}: t={snapshot['time']:.3f}s sent={sent} delivered={delivered} lost={lost}")
+        self._flush_history()
+
+    def _flush_history(self):
+        # One row insert per drain; follow the tail only if the user is already there
+        scrollbar = self.history_view.verticalScrollBar()
+        at_bottom = scrollbar.value() == scrollbar.maximum()
+        self.history_model.flush()
+        if at_bottom:
+            self.history_view.scrollToBottom()
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        super().closeEvent(event)
 
     def _process_node_reached(self, node_name):
         # This is called when a packet reaches an intermediate node in an animation path
@@ -125,6 +251,8 @@ class MainWindow(QMainWindow):
 
     def _advance_simulation(self):
         # This slot is called when an animation step completes, or immediately for non-animated steps.
+        if not self.current_simulation_steps:
+            return # Scenario packets finished; no step is playing
         self.current_step_idx += 1
         self._process_next_simulation_step()
 
@@ -134,42 +262,25 @@ class MainWindow(QMainWindow):
             
             if "path" in step and step["path"]:
                 # This is an animation step, start the animation
-                self.network_visualizer.start_packet_animation(step["path"], step["headers"])
+                self.network_visualizer.start_packet_animation(step["path"], step["headers"], step["length"])
                 self.update_osi_panel(step["headers"])
-                print(f"Processing step {self.current_step_idx}: {step['event']}")
+                REGISTRY.counter("gui_steps_total", "Simulation steps played back", kind=step["kind"]).inc()
                 # Do NOT increment current_step_idx here. _advance_simulation will do it after animation completes.
             else:
                 # This is a non-animated step (e.g., collision or packet loss message)
                 self.update_osi_panel(step["headers"])
-                print(f"Processing step {self.current_step_idx}: {step['event']}")
+                REGISTRY.counter("gui_steps_total", "Simulation steps played back", kind=step["kind"]).inc()
                 self._advance_simulation() # Trigger next step immediately as no animation is involved
 
         else:
-            print("Simulation Finished.")
+            REGISTRY.counter("gui_simulations_total", "Simulations played back to the end").inc()
             self.current_simulation_steps = []
             self.current_step_idx = 0
-            self.network_visualizer.packet_animation_timer.stop() # Ensure timer is stopped
-            self.network_visualizer.packet_position = None # Clear packet from display
-            self.network_visualizer.draw_network()
+            self.network_visualizer.clear_packets() # Stop the timer and clear packets from display
 
     def update_osi_panel(self, headers_list):
-        # Clear previous OSI layer information
-        for i in reversed(range(self.osi_panel.count())): 
-            widget = self.osi_panel.itemAt(i).widget()
-            if widget is not None and widget is not self.osi_panel_label: # Keep the main label
-                widget.setParent(None)
-                widget.deleteLater()
-
-        for header_info in headers_list:
-            layer_label = QLabel(f"<b>{header_info['layer']} Layer:</b>")
-            self.osi_panel.addWidget(layer_label)
-            if "header" in header_info:
-                header_data_label = QLabel(f"Header: {header_info['header']}")
-                self.osi_panel.addWidget(header_data_label)
-            if "data" in header_info:
-                data_label = QLabel(f"Data: {header_info['data']}")
-                self.osi_panel.addWidget(data_label)
-
+        # Rows are updated in place; the view repaints only what changed
+        self.osi_model.set_headers(headers_list)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
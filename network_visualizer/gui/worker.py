@@ -0,0 +1,162 @@
+# Background simulation worker and the bounded snapshot queue it feeds
+import threading
+from collections import deque
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from core.link import build_links
+from core.packet import POOL, address_fields
+from core.protocols import ENCRYPTED_PREFIX
+from core.scheduler import EventScheduler
+from core.simulation import (flow_statistics, post_steps, simulate_collision, simulate_icmp_ping, simulate_packet_loss,
+                             simulate_tcp_handshake, start_flows)
+from core.trace import TraceRecorder
+
+SNAPSHOT_QUEUE_SIZE = 8
+SNAPSHOT_PACKETS = 256 # Packets a snapshot carries for animation; the rest are only counted
+CHUNK_EVENTS = 20000 # Scenario events simulated between two snapshots
+
+def new_snapshot(time=0.0, steps=None, packets=None, stats=None, done=False):
+    # steps: animation steps for the step player; packets: (path, length)
+    # pairs to draw; stats: latest per-flow statistics; trace: the file a
+    # finished scenario was recorded to
+    return {"time": time, "steps": steps or [], "packets": packets or [], "dropped_packets": 0,
+            "stats": stats, "done": done, "trace": None}
+
+def merge_snapshot(into, snapshot):
+    # Coalesce a newer snapshot into an older one: steps are all kept, packets
+    # only up to SNAPSHOT_PACKETS, and the newer time and statistics win
+    into["time"] = snapshot["time"]
+    into["steps"].extend(snapshot["steps"])
+    room = max(SNAPSHOT_PACKETS - len(into["packets"]), 0)
+    into["packets"].extend(snapshot["packets"][:room])
+    into["dropped_packets"] += snapshot["dropped_packets"] + max(len(snapshot["packets"]) - room, 0)
+    if snapshot["stats"] is not None:
+        into["stats"] = snapshot["stats"]
+    into["done"] = into["done"] or snapshot["done"]
+    into["trace"] = snapshot["trace"] or into["trace"]
+
+class SnapshotQueue:
+    # Bounded, thread-safe FIFO from the simulation to the GUI. put() never
+    # blocks: when the queue is full the snapshot is merged into the newest
+    # queued one, so a slow display sees fewer, fuller frames while the
+    # simulation keeps its own pace.
+    def __init__(self, maxsize=SNAPSHOT_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.coalesced = 0
+        self._items = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, snapshot):
+        # Returns True when the queue was empty, i.e. the consumer needs a wakeup
+        with self._lock:
+            was_empty = not self._items
+            if len(self._items) < self.maxsize:
+                self._items.append(snapshot)
+            else:
+                merge_snapshot(self._items[-1], snapshot)
+                self.coalesced += 1
+            return was_empty
+
+    def get_all(self):
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+        return items
+
+class SimulationWorker(QObject):
+    # Lives on its own QThread; slots are invoked through queued signals from
+    # the window. Results go into the snapshot queue and `snapshot_ready` is
+    # emitted only when the queue goes from empty to non-empty, so a busy GUI
+    # thread never accumulates a backlog of wakeup events.
+    snapshot_ready = pyqtSignal()
+
+    def __init__(self, topology, client, server, snapshots, trace_path=None):
+        super().__init__()
+        self.topology = topology
+        self.client = client
+        self.server = server
+        self.snapshots = snapshots
+        self.trace_path = trace_path # Scenario runs are recorded here when set
+        self.links = build_links(topology) # Unseeded: every send draws fresh loss and backoff
+        self._stop = threading.Event()
+
+    def stop(self):
+        # Thread-safe: asks a running scenario to return at its next chunk
+        self._stop.set()
+
+    def _publish(self, snapshot):
+        if self.snapshots.put(snapshot):
+            self.snapshot_ready.emit()
+
+    def _step_from_event(self, event):
+        step = event.data
+        path = (self.topology.path(step["from"], step["to"]) or []) if "from" in step else []
+        return {"event": event.name, "kind": step["kind"], "headers": step["headers"], "path": path, "time": event.time, "length": step.get("length", 0)}
+
+    @pyqtSlot(str, str)
+    def simulate_send(self, message, protocol):
+        # The simulation posts its events to a headless scheduler; the GUI only
+        # receives the processed event log as animation steps. Each send
+        # stores its message in a new payload arena, so messages sent earlier
+        # are freed once their steps have been shown.
+        POOL.new_arena()
+        scheduler = EventScheduler()
+        if protocol == "TCP":
+            # Logical handshake steps, each animated along the full path
+            simulate_tcp_handshake(self.client, self.server, scheduler=scheduler)
+        elif protocol == "ICMP":
+            simulate_icmp_ping(self.client, self.server, scheduler=scheduler)
+        elif not self.topology.path(self.client.name, self.server.name):
+            # Unreachable: report it as a step rather than failing on this thread
+            event = f"No route from {self.client.name} to {self.server.name}! Packet Dropped"
+            post_steps(scheduler, [{"event": event, "kind": "dropped", "headers": [{"layer": "Simulation", "data": event}]}])
+        else:
+            path = self.topology.path(self.client.name, self.server.name)
+            next_hop = self.topology.by_name[path[1]]
+            channel = self.links[self.topology.link_index(path[0], path[1])].channel
+            record = POOL.acquire(protocol, *address_fields(self.client.mac, next_hop.mac, self.client.ip, self.server.ip),
+                                  payload=ENCRYPTED_PREFIX + message if protocol == "TCP" else message)
+            # CSMA/CD on the first link: collisions back off and retry until the
+            # frame gets on the wire or is dropped after too many attempts. Each
+            # send has its own clock starting at 0, so the medium starts idle.
+            channel.mac.reset()
+            end, _ = simulate_collision(channel, record.length, scheduler=scheduler)
+            scheduler.run() # Process the collision steps so the send is posted after them
+            if end is not None and simulate_packet_loss(record, channel, scheduler=scheduler) is not None:
+                post_steps(scheduler, [{"event": "Packet Sent", "kind": "sent", "packet": record, "headers": record.layer_view(),
+                                        "from": self.client.name, "to": self.server.name, "length": record.length}])
+        scheduler.run()
+        self._publish(new_snapshot(scheduler.now, steps=[self._step_from_event(event) for event in scheduler.drain_log()], done=True))
+
+    @pyqtSlot(object, object)
+    def run_scenario(self, flows, duration=None):
+        # Runs traffic flows in chunks of CHUNK_EVENTS events, publishing the
+        # packets sent in each chunk and the running statistics after it. The
+        # final snapshot names the trace once it is complete on disk.
+        self._stop.clear()
+        scheduler = EventScheduler(record=False)
+        links = build_links(self.topology)
+        recorder = TraceRecorder(self.trace_path, self.topology, links) if self.trace_path else None
+        try:
+            states = start_flows(self.topology, flows, scheduler, links, recorder)
+            sent = [0] * len(states)
+            while not self._stop.is_set():
+                processed = scheduler.run(until=duration, max_events=CHUNK_EVENTS)
+                snapshot = new_snapshot(scheduler.now, stats=[flow_statistics(state) for state in states], done=processed == 0)
+                for i, state in enumerate(states):
+                    new = state["sent"] - sent[i]
+                    sent[i] = state["sent"]
+                    shown = min(new, SNAPSHOT_PACKETS - len(snapshot["packets"]))
+                    snapshot["packets"].extend([(state["path"], state["bytes"] // max(state["sent"], 1))] * shown)
+                    snapshot["dropped_packets"] += new - shown
+                if processed == 0 and recorder is not None:
+                    recorder.close()
+                    snapshot["trace"] = recorder.path
+                self._publish(snapshot)
+                if processed == 0:
+                    break
+        finally:
+            if recorder is not None:
+                recorder.close() # Stopped early: what was recorded is still readable
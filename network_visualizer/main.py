@@ -1,10 +1,23 @@
 # Main application entry point
 from gui.window import MainWindow
 from PyQt5.QtWidgets import QApplication
+from core.metrics import REGISTRY
+import argparse
 import sys
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    parser = argparse.ArgumentParser(description="Network Data Flow Visualizer")
+    parser.add_argument("--metrics", help="Write counters, latency histograms and spans to this file on exit (.json for JSON, else Prometheus text)")
+    parser.add_argument("--timing", action="store_true", help="Record timing spans for packet sends, hops and rendering")
+    parser.add_argument("--record", help="Record scenario runs to this trace file for replay")
+    parser.add_argument("--replay", help="Open a recorded trace for replay at startup")
+    args, qt_args = parser.parse_known_args() # Everything else is left to Qt
+    if args.metrics or args.timing:
+        REGISTRY.enable(timing=args.timing) # Before the window builds the topology
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(trace_path=args.record, replay_path=args.replay)
     window.show()
-    sys.exit(app.exec_())
+    status = app.exec_()
+    if args.metrics:
+        REGISTRY.write(args.metrics)
+    sys.exit(status)
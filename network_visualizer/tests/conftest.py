@@ -0,0 +1,6 @@
+# Shared setup for the unit tests
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Import core/ and gui/ like main.py does
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
@@ -0,0 +1,34 @@
+# Replaying captures through the topology
+import os
+import struct
+from core.codec import build_frame
+from core.metrics import REGISTRY
+from core.simulation import replay_capture
+from core.topology import load_topology
+
+TOPOLOGY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "topologies", "default.json")
+CLIENT, SERVER, ROUTER, OUTSIDE = "192.168.1.100", "192.168.1.10", "192.168.1.254", "10.9.9.9"
+
+def _write_pcap(path, packets):
+    # Classic little-endian pcap of UDP frames, one every millisecond
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i, (src, dst) in enumerate(packets):
+            frame = bytes(build_frame(b"hello", "UDP", src_ip=src, dst_ip=dst))
+            f.write(struct.pack("<IIII", 0, i * 1000, len(frame), len(frame)) + frame)
+
+def test_replayed_flows_are_numbered_in_order_despite_unmatched_traffic(tmp_path):
+    path = str(tmp_path / "mixed.pcap")
+    _write_pcap(path, [(OUTSIDE, SERVER), (CLIENT, SERVER), (OUTSIDE, CLIENT), (SERVER, CLIENT),
+                       (OUTSIDE, SERVER), (ROUTER, SERVER), (CLIENT, SERVER)])
+    REGISTRY.enable()
+    try:
+        summary = replay_capture(load_topology(TOPOLOGY), path, seed=0)
+        sent = {row["labels"]["flow"]: row["value"] for row in REGISTRY.snapshot()["counters"] if row["name"] == "flow_sent_total"}
+    finally:
+        REGISTRY.disable()
+        REGISTRY.reset()
+    assert (summary["frames"], summary["replayed"], summary["unmatched"]) == (7, 4, 3)
+    assert [(row["flow"], row["src"], row["dst"], row["sent"]) for row in summary["flows"]] == [
+        (0, "Client", "Server", 2), (1, "Server", "Client", 1), (2, "Router", "Server", 1)]
+    assert sent == {0: 2, 1: 1, 2: 1}
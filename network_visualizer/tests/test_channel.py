@@ -0,0 +1,41 @@
+# Loss models and CSMA/CD medium access
+import pytest
+from core.channel import BernoulliLoss, CsmaCd, LinkChannel, RandomStream, make_loss_model
+
+def test_idle_medium_never_collides_without_contention():
+    mac = CsmaCd(contention=0.0)
+    stream = RandomStream(0)
+    now = 0.0
+    for _ in range(100):
+        end, collisions = mac.access(now, 1000, stream)
+        assert collisions == 0
+        now = end + 1.0
+    assert mac.collisions == mac.deferrals == 0
+
+def test_busy_medium_defers_and_simultaneous_starts_collide():
+    mac = CsmaCd(contention=0.0)
+    stream = RandomStream(0)
+    end, _ = mac.access(0.0, 1000, stream)
+    deferred, collisions = mac.access(mac.propagation * 2, 1000, stream)
+    assert collisions == 0 and mac.deferrals == 1
+    assert deferred == pytest.approx(end + 1000 * 8 / mac.bandwidth)
+    _, collisions = mac.access(mac.last_start, 1000, stream)
+    assert collisions >= 1
+
+def test_reset_forgets_the_last_transmission():
+    # A new clock starting at 0 must not see the previous run's frame on the wire
+    mac = CsmaCd(contention=0.0)
+    stream = RandomStream(0)
+    for _ in range(5):
+        mac.reset()
+        _, collisions = mac.access(0.0, 1000, stream)
+        assert collisions == 0
+    assert mac.collisions == mac.deferrals == 0
+
+def test_loss_models():
+    assert make_loss_model(None) is None and make_loss_model(0) is None
+    assert isinstance(make_loss_model(0.5), BernoulliLoss)
+    with pytest.raises(ValueError):
+        make_loss_model({"model": "unknown"})
+    channel = LinkChannel(BernoulliLoss(1.0), seed=0)
+    assert channel.transmit(0.0, 100)[2] and channel.lost == 1
@@ -0,0 +1,48 @@
+# Metrics registry: callback registration and timing spans
+import os
+import pytest
+import cli
+from core.metrics import MetricsRegistry, REGISTRY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPOLOGY = os.path.join(ROOT, "topologies", "default.json")
+SCENARIO = os.path.join(ROOT, "scenarios", "default.json")
+
+def _registry():
+    registry = MetricsRegistry()
+    registry.enable()
+    return registry
+
+def test_duplicate_callback_in_one_run_raises():
+    registry = _registry()
+    registry.callback("flow_sent_total", lambda: 1, flow=0)
+    with pytest.raises(ValueError, match=r"flow_sent_total\{flow=\"0\"\}"):
+        registry.callback("flow_sent_total", lambda: 2, flow=0)
+    registry.callback("flow_sent_total", lambda: 3, flow=1)
+
+def test_callback_from_an_earlier_run_is_replaced():
+    registry = _registry()
+    registry.callback("flow_sent_total", lambda: 1, flow=0)
+    registry.new_run()
+    registry.callback("flow_sent_total", lambda: 2, flow=0)
+    assert [row["value"] for row in registry.snapshot()["counters"]] == [2]
+
+def test_callback_does_not_replace_a_counter():
+    registry = _registry()
+    registry.counter("frames_total").inc()
+    with pytest.raises(ValueError):
+        registry.callback("frames_total", lambda: 5)
+
+@pytest.fixture
+def registry():
+    yield REGISTRY
+    REGISTRY.disable()
+    REGISTRY.reset()
+
+def test_timing_records_simulation_spans(registry):
+    rows, metrics = cli.run_seed(TOPOLOGY, SCENARIO, 0, metrics=True, timing=True)
+    spans = {row["labels"]["span"]: row["count"] for row in metrics.snapshot()["histograms"] if row["name"] == "span_duration_seconds"}
+    assert spans["run"] == 1
+    # Transfers send segments and ACKs on top of the scenario flows' packets
+    assert spans["send"] > sum(row["sent"] for row in rows if "flow" in row)
+    assert spans["forward"] >= spans["send"]
@@ -0,0 +1,50 @@
+# Pooled packet records, lazy header views and payload arenas
+import gc
+import weakref
+from core.packet import PacketPool, PayloadArena, address_fields
+
+FIELDS = address_fields("00:11:22:33:44:01", "00:11:22:33:44:02", "10.0.0.1", "10.0.0.2")
+
+def test_released_records_are_reused():
+    pool = PacketPool()
+    first = pool.acquire("UDP", *FIELDS, payload="one")
+    pool.release(first)
+    second = pool.acquire("TCP", *FIELDS, payload="two")
+    assert second is first
+    assert (pool.created, pool.reused) == (1, 1)
+    assert second.payload() == b"two" and second.dport == 80
+
+def test_pool_keeps_at_most_limit_records():
+    pool = PacketPool(limit=2)
+    for record in [pool.acquire("UDP", *FIELDS) for _ in range(3)]:
+        pool.release(record)
+    assert len(pool) == 2
+
+def test_arena_interns_payloads():
+    arena = PayloadArena(size=4)
+    assert arena.store("hello") == arena.store("hello")
+    offset, length = arena.store(b"world")
+    assert arena.read(offset, length) == b"world" and len(arena) == 10
+
+def test_layer_view_builds_headers_on_first_access():
+    pool = PacketPool()
+    record = pool.acquire("UDP", *FIELDS, payload="hello")
+    view = record.layer_view()
+    assert view._layers is None
+    assert view[0] == {"layer": "Application", "data": "hello"}
+    assert view._layers is not None and view._record is None # The record is no longer needed
+    assert view == record.layers()
+    assert [header["layer"] for header in view] == ["Application", "Transport", "Network", "Data Link"]
+
+def test_new_arena_keeps_unread_views_valid_and_frees_the_old_arena():
+    pool = PacketPool()
+    record = pool.acquire("UDP", *FIELDS, payload="first run")
+    view = record.layer_view()
+    old = weakref.ref(pool.arena)
+    pool.new_arena()
+    pool.release(pool.acquire("UDP", *FIELDS, payload="second run"))
+    assert len(pool.arena) == len("second run")
+    assert view[0]["data"] == "first run" # Read after the arena was replaced
+    del record, view
+    gc.collect()
+    assert old() is None
@@ -0,0 +1,42 @@
+# Encapsulation with the struct codec
+import os
+import subprocess
+import sys
+from core.protocols import decapsulate_packet, encapsulate_packet
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _summaries(headers):
+    return [str(header["header"]) for header in headers if "header" in header]
+
+def test_reused_buffer_does_not_change_earlier_summaries():
+    buf = bytearray(2048)
+    frame, headers = encapsulate_packet("first", "UDP", src_ip="10.0.0.1", dst_ip="10.0.0.2", buf=buf)
+    expected = _summaries(encapsulate_packet("first", "UDP", src_ip="10.0.0.1", dst_ip="10.0.0.2")[1])
+    encapsulate_packet("second", "TCP", src_ip="172.16.0.9", dst_ip="172.16.0.10", buf=buf)
+    assert _summaries(headers) == expected
+    assert "10.0.0.1 > 10.0.0.2" in " ".join(_summaries(headers))
+    assert bytes(frame) != bytes(encapsulate_packet("first", "UDP", src_ip="10.0.0.1", dst_ip="10.0.0.2")[0]) # The frame itself is the caller's buffer
+
+def test_layers_are_ordered_application_first():
+    _, headers = encapsulate_packet("hi", "TCP")
+    assert [header["layer"] for header in headers] == ["Application", "TLS/SSL", "Transport", "Network", "Data Link"]
+    assert headers[1]["data"] == "[ENCRYPTED]:hi"
+
+def test_decapsulate_reverses_encapsulate():
+    frame, headers = encapsulate_packet("hi", "TCP", src_ip="10.0.0.1", dst_ip="10.0.0.2")
+    steps = decapsulate_packet(frame)
+    assert [step["layer"] for step in steps] == ["Data Link", "Network", "Transport", "TLS/SSL", "Application"]
+    assert _summaries(steps) == list(reversed(_summaries(headers)))
+    assert steps[-1]["data"] == "hi"
+
+def test_headless_cli_does_not_import_scapy():
+    # Scapy is imported on first use; the CLI and its pool workers never need it
+    check = "import sys, cli; print('scapy' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", check], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+def test_scapy_backend_round_trip():
+    packet, headers = encapsulate_packet("hello", "TCP", backend="scapy")
+    assert [header["layer"] for header in headers] == ["Application", "TLS/SSL", "Transport", "Network", "Data Link"]
+    assert [step["layer"] for step in decapsulate_packet(packet)][:3] == ["Data Link", "Network", "Transport"]
@@ -0,0 +1,23 @@
+# Prefix parsing and longest-prefix matching
+import pytest
+from core.routing import RoutingTable, ip_to_int, parse_prefix
+
+def test_cidr_and_host_prefixes():
+    assert parse_prefix("10.0.0.0/8") == (ip_to_int("10.0.0.0"), 8)
+    assert parse_prefix("10.1.2.3/8") == (ip_to_int("10.0.0.0"), 8)
+    assert parse_prefix("192.168.1.7") == (ip_to_int("192.168.1.7"), 32)
+
+def test_legacy_trailing_dot_prefixes():
+    assert parse_prefix("192.168.1.") == (ip_to_int("192.168.1.0"), 24)
+    assert parse_prefix("10.") == (ip_to_int("10.0.0.0"), 8)
+
+@pytest.mark.parametrize("prefix", ["192.168.1", "10", "10.1/8", "192.168.1.0/33"])
+def test_malformed_prefixes_are_rejected(prefix):
+    with pytest.raises(ValueError):
+        parse_prefix(prefix)
+
+def test_longest_prefix_wins():
+    table = RoutingTable({"0.0.0.0/0": "Default", "192.168.0.0/16": "Site", "192.168.1.": "Lan"})
+    assert table.lookup("192.168.1.20") == "Lan"
+    assert table.lookup("192.168.7.1") == "Site"
+    assert table.lookup("8.8.8.8") == "Default"
@@ -0,0 +1,36 @@
+# Scenario flows and TCP transfers sharing one run
+import os
+import pytest
+import cli
+from core.metrics import REGISTRY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPOLOGY = os.path.join(ROOT, "topologies", "default.json")
+SCENARIO = os.path.join(ROOT, "scenarios", "default.json")
+
+@pytest.fixture
+def registry():
+    yield REGISTRY
+    REGISTRY.disable()
+    REGISTRY.reset()
+
+def _by_flow(rows, name):
+    return {row["labels"]["flow"]: row for row in rows if row["name"] == name}
+
+def test_flows_and_transfers_have_separate_flow_metrics(registry):
+    rows, metrics = cli.run_seed(TOPOLOGY, SCENARIO, 0, metrics=True)
+    flows = [row for row in rows if "flow" in row]
+    transfers = [row for row in rows if "connection" in row]
+    assert len(flows) == 3 and len(transfers) == 2
+    snapshot = metrics.snapshot()
+    sent = _by_flow(snapshot["counters"], "flow_sent_total")
+    delivered = _by_flow(snapshot["counters"], "flow_delivered_total")
+    latency = _by_flow(snapshot["histograms"], "flow_latency_seconds")
+    for row in flows:
+        assert sent[row["flow"]]["value"] == row["sent"]
+        assert delivered[row["flow"]]["value"] == row["delivered"]
+        assert latency[row["flow"]]["count"] == row["delivered"]
+    # Transfers get the ids after the scenario's flows, one per direction
+    transfer_ids = set(sent) - {row["flow"] for row in flows}
+    assert transfer_ids == {3, 4}
+    assert {sent[flow]["labels"]["protocol"] for flow in transfer_ids} == {"TCP"}
@@ -0,0 +1,97 @@
+# TCP connection model: transfers, loss recovery and congestion control
+import json
+import os
+import pytest
+from core.link import build_links
+from core.tcp import DEFAULT_MSS, INITIAL_RTO, TcpConnection, goodput_sweep, run_transfers
+from core.topology import load_topology
+
+TOPOLOGY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "topologies", "default.json")
+
+class DropFrames:
+    # Loss model that drops the given frames (numbered from 1) of a link, in
+    # both directions
+    def __init__(self, *frames):
+        self.frames = set(frames)
+        self.count = 0
+
+    def lost(self, stream):
+        self.count += 1
+        return self.count in self.frames
+
+@pytest.fixture
+def topology(tmp_path):
+    # The default topology without loss or contention
+    with open(TOPOLOGY) as f:
+        spec = json.load(f)
+    for link in spec["links"]:
+        link.pop("loss", None)
+        link["contention"] = 0.0
+    path = tmp_path / "clean.json"
+    path.write_text(json.dumps(spec))
+    return load_topology(str(path))
+
+def _transfer(topology, size=200000, algorithm="reno", loss=None):
+    links = build_links(topology, 0)
+    if loss is not None:
+        links[topology.link_index("Client", "Switch")].channel.loss = loss
+    return run_transfers(topology, [{"src": "Client", "dst": "Server", "bytes": size, "algorithm": algorithm}], links=links)[0]
+
+def test_loss_free_transfer_delivers_everything(topology):
+    row = _transfer(topology)
+    assert row["delivered"] == 200000
+    assert row["state"] == "TIME_WAIT" and row["peer_state"] == "CLOSED"
+    assert row["retransmits"] == row["timeouts"] == 0
+
+def test_lost_data_segment_is_fast_retransmitted(topology):
+    # Frames 1-3 are the handshake; frame 5 is the second data segment, and
+    # the rest of the initial window produces the duplicate ACKs
+    row = _transfer(topology, loss=DropFrames(5))
+    assert row["delivered"] == 200000 and row["state"] == "TIME_WAIT"
+    assert row["fast_retransmits"] == 1 and row["retransmits"] == 1 and row["timeouts"] == 0
+
+def test_lost_syns_back_off_exponentially(topology):
+    # The SYN and its first two retransmissions are lost: they go out at 0,
+    # RTO and 3 * RTO, and the third retransmission at 7 * RTO gets through
+    row = _transfer(topology, loss=DropFrames(1, 2, 3))
+    assert row["timeouts"] == 3 and row["retransmits"] == 3
+    assert row["delivered"] == 200000
+    assert 7 * INITIAL_RTO < row["duration"] < 8 * INITIAL_RTO
+
+def test_goodput_does_not_increase_with_loss(topology):
+    rows = goodput_sweep(topology, "Client", "Server", [0.0, 0.01, 0.05, 0.1], size=300000)
+    goodput = [row["goodput_bps"] for row in rows]
+    assert all(row["delivered"] == 300000 for row in rows)
+    assert goodput == sorted(goodput, reverse=True)
+
+def _grow_after_loss(algorithm, seconds, rtt=0.5):
+    # A connection with 100 segments in flight loses one, then receives one
+    # ACK per segment, a window's worth per RTT, for `seconds`; returns the
+    # window in segments right after the loss and at the end
+    conn = TcpConnection(0, None, None, 10 ** 9, algorithm)
+    conn.srtt = rtt
+    conn.cwnd = 100.0 * DEFAULT_MSS
+    conn.snd_una, conn.snd_nxt = 1, 1 + 100 * DEFAULT_MSS
+    conn.cc.on_loss(conn, 0.0)
+    conn.cwnd = conn.ssthresh
+    after_loss = conn.cwnd
+    now = 0.0
+    while now < seconds:
+        now += rtt * DEFAULT_MSS / conn.cwnd
+        conn.cc.on_ack(conn, DEFAULT_MSS, now)
+    return after_loss / DEFAULT_MSS, conn.cwnd / DEFAULT_MSS
+
+def test_reno_and_cubic_respond_differently_to_loss():
+    reno_start, reno_end = _grow_after_loss("reno", 6.0)
+    cubic_start, cubic_end = _grow_after_loss("cubic", 6.0)
+    assert reno_start == pytest.approx(50) # Reno halves the window
+    assert cubic_start == pytest.approx(70) # CUBIC reduces it by beta = 0.7
+    # Reno adds about a segment per RTT (12 RTTs); CUBIC's growth depends on
+    # the time since the loss and is back above w_max once K (about 4.2 s
+    # here) has passed
+    assert reno_end - reno_start == pytest.approx(12, rel=0.25)
+    assert cubic_end > 100 > reno_end
+
+def test_unknown_congestion_control_is_rejected():
+    with pytest.raises(ValueError):
+        TcpConnection(0, None, None, 1000, "vegas")
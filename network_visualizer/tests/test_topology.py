@@ -0,0 +1,46 @@
+# Topology loading from JSON, JSON Lines and GraphML
+import json
+import pytest
+from core.devices import Router
+from core.topology import build_topology, load_topology
+
+DEVICES = [
+    {"name": "Client", "type": "client", "ip": "10.0.0.1", "mac": "00:00:00:00:00:01"},
+    {"name": "Switch", "type": "switch", "ip": "10.0.0.2", "mac": "00:00:00:00:00:02"},
+    {"name": "Router", "type": "router", "ip": "10.0.0.3", "mac": "00:00:00:00:00:03", "routes": {"10.0.0.0/24": "Switch"}},
+]
+LINKS = [{"a": "Client", "b": "Switch", "latency": 0.002}, {"a": "Switch", "b": "Router"}]
+
+def test_json_lines_links_before_devices_keep_file_order(tmp_path):
+    path = tmp_path / "topology.jsonl"
+    path.write_text("\n".join(json.dumps(record) for record in [LINKS[0]] + DEVICES + [LINKS[1]]) + "\n")
+    topology = load_topology(str(path))
+    assert [(a.name, b.name) for a, b, _ in topology.links] == [("Client", "Switch"), ("Switch", "Router")]
+    assert topology.link_attrs("Client", "Switch") == {"latency": 0.002}
+    assert topology.path("Client", "Router") == ["Client", "Switch", "Router"]
+    assert isinstance(topology.by_name["Router"], Router)
+
+def test_graphml_is_read_into_devices_and_links(tmp_path):
+    path = tmp_path / "topology.graphml"
+    nodes = "".join(f'<node id="{d["name"]}"><data key="type">{d["type"]}</data><data key="ip">{d["ip"]}</data>'
+                    f'<data key="mac">{d["mac"]}</data></node>' for d in DEVICES)
+    path.write_text('<?xml version="1.0"?><graphml xmlns="http://graphml.graphdrawing.org/xmlns">'
+                    '<key id="type" for="node" attr.name="type" attr.type="string"/>'
+                    '<key id="ip" for="node" attr.name="ip" attr.type="string"/>'
+                    '<key id="mac" for="node" attr.name="mac" attr.type="string"/>'
+                    '<key id="latency" for="edge" attr.name="latency" attr.type="double"/>'
+                    f'<graph edgedefault="undirected">{nodes}'
+                    '<edge source="Client" target="Switch"><data key="latency">0.002</data></edge>'
+                    '<edge source="Switch" target="Router"/></graph></graphml>')
+    topology = load_topology(str(path))
+    assert len(topology) == 3
+    assert topology.link_attrs("Client", "Switch") == {"latency": 0.002}
+
+def test_routes_on_a_non_router_are_rejected():
+    devices = [dict(DEVICES[0], routes={"0.0.0.0/0": "Switch"})] + DEVICES[1:]
+    with pytest.raises(ValueError, match="Client"):
+        build_topology(devices, LINKS)
+
+def test_link_to_unknown_device_is_rejected():
+    with pytest.raises(ValueError, match="Server"):
+        build_topology(DEVICES, LINKS + [{"a": "Router", "b": "Server"}])
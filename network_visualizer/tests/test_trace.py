@@ -0,0 +1,34 @@
+# Reading back a trace of scenario flows and TCP transfers sharing one run
+import os
+import numpy as np
+import cli
+from core.topology import load_topology
+from core.trace import DROP, HEADERS, HOP, TraceReader
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPOLOGY = os.path.join(ROOT, "topologies", "default.json")
+SCENARIO = os.path.join(ROOT, "scenarios", "default.json")
+
+def test_trace_flow_column_separates_flows_and_transfers(tmp_path):
+    path = str(tmp_path / "run.nvtrace")
+    rows, _ = cli.run_seed(TOPOLOGY, SCENARIO, 0, trace=path)
+    flows = [row for row in rows if "flow" in row]
+    transfers = [row for row in rows if "connection" in row]
+    topology = load_topology(TOPOLOGY)
+    with TraceReader(path) as trace:
+        events = trace.events(trace.start_time, trace.end_time + 1)
+        index = {name: i for i, name in enumerate(trace.devices)}
+    kinds, ids = events["kind"], events["flow"]
+    assert set(np.unique(ids).tolist()) == set(range(len(flows) + len(transfers)))
+    for row in flows:
+        mine = ids == row["flow"]
+        assert ((kinds == DROP) & mine).sum() == row["lost"]
+        assert ((kinds == HOP) & mine & (events["dst"] == index[row["dst"]])).sum() == row["delivered"]
+        assert ((kinds == HEADERS) & mine).sum() == 1
+    for number, row in enumerate(transfers, start=len(flows)):
+        mine = ids == number
+        assert ((kinds == HOP) & mine).any()
+        assert not ((kinds == HEADERS) & mine).any()
+        # Segments and ACKs only touch the transfer's own path
+        path_devices = {index[name] for name in topology.path(row["src"], row["dst"])}
+        assert set(events["src"][mine].tolist()) | set(events["dst"][mine].tolist()) <= path_devices
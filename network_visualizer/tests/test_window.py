@@ -0,0 +1,41 @@
+# Main window playback, run offscreen
+import pytest
+from PyQt5.QtWidgets import QApplication
+from core.metrics import REGISTRY
+from core.simulation import STEP_KINDS, simulate_collision, simulate_packet_loss
+
+@pytest.fixture
+def window():
+    from gui.window import MainWindow
+    app = QApplication.instance() or QApplication([])
+    REGISTRY.enable()
+    window = MainWindow()
+    yield window
+    window.close()
+    app.processEvents()
+    REGISTRY.disable()
+    REGISTRY.reset()
+
+def _step(text, kind):
+    return {"event": text, "kind": kind, "headers": [{"layer": "Simulation", "data": text}], "path": []}
+
+def test_played_steps_are_counted_by_kind(window):
+    window.current_simulation_steps = [_step("Collision Detected! Backing off (attempt 1)", "collision"),
+                                       _step("Collision Detected! Backing off (attempt 2)", "collision"),
+                                       _step("No route from Client to Server! Packet Dropped", "dropped")]
+    window.current_step_idx = 0
+    window._process_next_simulation_step()
+    counts = {tuple(row["labels"].items()): row["value"] for row in REGISTRY.snapshot()["counters"] if row["name"] == "gui_steps_total"}
+    assert counts == {(("kind", "collision"),): 2, (("kind", "dropped"),): 1}
+
+def test_simulation_steps_have_a_kind():
+    from core.channel import BernoulliLoss, LinkChannel
+    from core.scheduler import EventScheduler
+    scheduler = EventScheduler()
+    channel = LinkChannel(BernoulliLoss(1.0), seed=0, contention=1.0, max_attempts=2)
+    simulate_collision(channel, 100, scheduler=scheduler)
+    scheduler.run() # As the worker does, so the loss is posted after the collisions
+    simulate_packet_loss(object(), channel, scheduler=scheduler)
+    scheduler.run()
+    assert [event.data["kind"] for event in scheduler.drain_log()] == ["collision", "collision", "dropped", "lost"]
+    assert {"collision", "dropped", "lost"} <= set(STEP_KINDS)
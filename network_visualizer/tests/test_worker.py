@@ -0,0 +1,51 @@
+# Simulation worker sends, run without a window
+import json
+import os
+from core.devices import Client, Server
+from core.packet import POOL
+from core.topology import load_topology
+from gui.worker import SimulationWorker, SnapshotQueue
+
+TOPOLOGY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "topologies", "default.json")
+
+def _worker(topology):
+    snapshots = SnapshotQueue()
+    return SimulationWorker(topology, topology.devices_of_type(Client)[0], topology.devices_of_type(Server)[0], snapshots), snapshots
+
+def _events(snapshots):
+    return [step["event"] for snapshot in snapshots.get_all() for step in snapshot["steps"]]
+
+def test_udp_send_to_unreachable_server_reports_a_drop(tmp_path):
+    with open(TOPOLOGY) as f:
+        spec = json.load(f)
+    spec["links"] = [link for link in spec["links"] if "Server" not in (link["a"], link["b"])]
+    path = tmp_path / "cut.json"
+    path.write_text(json.dumps(spec))
+    worker, snapshots = _worker(load_topology(str(path)))
+    worker.simulate_send("Hello", "UDP")
+    assert _events(snapshots) == ["No route from Client to Server! Packet Dropped"]
+
+def test_tcp_send_posts_the_handshake():
+    worker, snapshots = _worker(load_topology(TOPOLOGY))
+    worker.simulate_send("Hello", "TCP")
+    assert _events(snapshots) == ["Client sends SYN", "Server sends SYN-ACK", "Client sends ACK"]
+
+def test_repeated_sends_on_an_idle_link_never_collide(tmp_path):
+    with open(TOPOLOGY) as f:
+        spec = json.load(f)
+    for link in spec["links"]:
+        link["contention"] = 0.0
+        link.pop("loss", None)
+    path = tmp_path / "idle.json"
+    path.write_text(json.dumps(spec))
+    worker, snapshots = _worker(load_topology(str(path)))
+    for _ in range(6):
+        worker.simulate_send("Hello", "UDP")
+    assert _events(snapshots) == ["Packet Sent"] * 6
+    assert worker.links[0].channel.mac.collisions == worker.links[0].channel.mac.deferrals == 0
+
+def test_sends_do_not_accumulate_payloads():
+    worker, _ = _worker(load_topology(TOPOLOGY))
+    for i in range(20):
+        worker.simulate_send(f"Message {i} " * 50, "UDP")
+    assert len(POOL.arena) == len("Message 19 " * 50)